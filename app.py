@@ -1,6 +1,8 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from flask import Flask, Blueprint, current_app, has_app_context, has_request_context, g, render_template, request, redirect, url_for, session, flash, abort, Response, send_from_directory
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import func, or_, MetaData
+from sqlalchemy import func, or_, and_, case, literal, tuple_, MetaData, event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, undefer, Session
 from flask_migrate import Migrate
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, SubmitField
@@ -11,36 +13,68 @@ from flask_mail import Mail, Message
 from dotenv import load_dotenv
 from functools import wraps
 from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import is_resource_modified
+from werkzeug.local import LocalProxy
+from itsdangerous import URLSafeSerializer, BadSignature
+from cachetools import LRUCache, TTLCache
+import importlib
+import pickle
+import tempfile
+import hashlib
 import secrets
 import click
 import re
-
-
-# Google API imports
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
+import smtplib
+import sqlite3
+import threading
+import time
+import multiprocessing
+import gzip
+import json
+import logging
+import mimetypes
+import shutil
+import csv
+import io
+import itertools
+from collections import namedtuple
+from xml.etree import ElementTree
+from zoneinfo import ZoneInfo
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+# De Google API-bibliotheken zijn zwaar om te importeren en worden daarom pas bij
+# de eerste Calendar-actie geladen (zie get_calendar_service), niet bij elke
+# worker-start of elk `flask`-commando.
 
 load_dotenv()
 
-app = Flask(__name__)
-
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///activities.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-app.config['BANK_ACCOUNT_NUMBER'] = os.getenv('BANK_ACCOUNT_NUMBER')
-app.config['BANK_ACCOUNT_NAME'] = os.getenv('BANK_ACCOUNT_NAME')
-
-app.config['ADMIN_EMAIL'] = os.getenv('ADMIN_EMAIL')
-
-app.config['SERVER_NAME'] = os.getenv('SERVER_NAME')
-
-app.config['MAIL_SERVER'] = 'smtp.gmail.com' 
-app.config['MAIL_PORT'] = 587
-app.config['MAIL_USE_TLS'] = True
-app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME')
-app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
-app.config['MAIL_DEFAULT_SENDER'] = ('Chateau Overdruiven', os.getenv('MAIL_USERNAME'))
+# --- Database profielen ---
+# 'production' zet SQLite in WAL-modus met een busy_timeout, zodat gelijktijdige
+# gunicorn-workers niet op "database is locked" stuklopen als een schrijfactie
+# samenvalt met een leesactie.
+DATABASE_PROFILES = {
+    'default': {
+        'pragmas': {},
+        'engine_options': {},
+    },
+    'production': {
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'busy_timeout': 5000,        # ms wachten op een lock i.p.v. direct falen
+            'synchronous': 'NORMAL',     # veilig in WAL-modus, veel minder fsyncs
+            'cache_size': -20000,        # ~20 MB page cache per verbinding
+            'mmap_size': 268435456,      # 256 MB memory-mapped I/O
+            'temp_store': 'MEMORY',
+        },
+        'engine_options': {
+            'pool_size': 5,
+            'max_overflow': 5,
+            'pool_timeout': 10,
+        },
+    },
+}
 
 convention = {
     "ix": 'ix_%(column_0_label)s',
@@ -51,34 +85,656 @@ convention = {
 }
 
 metadata = MetaData(naming_convention=convention)
-db = SQLAlchemy(app, metadata=metadata)
-mail = Mail(app)
-migrate = Migrate(app, db)
 
-# ... (de rest van je app.py code)
+
+def sqlite_pragma_listener(pragmas):
+    """Connect-listener die de pragmas van het databaseprofiel op elke nieuwe SQLite-verbinding zet."""
+    def apply_sqlite_pragmas(dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+    return apply_sqlite_pragmas
+
+
+db = SQLAlchemy(metadata=metadata)
+mail = Mail()
+migrate = Migrate()
+
+# Alle routes en CLI-commando's hangen aan deze blueprint; create_app() registreert hem
+bp = Blueprint('main', __name__, cli_group=None)
+# Alleen-lezen JSON API; een volgende versie krijgt een eigen blueprint onder /api/v2
+api_v1 = Blueprint('api_v1', __name__, url_prefix='/api/v1')
+
+
+def create_app(config=None):
+    """Bouwt en configureert de app. `config` overschrijft de instellingen uit de omgeving."""
+    app = Flask(__name__)
+
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///activities.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['DATABASE_PROFILE'] = os.getenv('DATABASE_PROFILE', 'default')
+
+    app.config['BANK_ACCOUNT_NUMBER'] = os.getenv('BANK_ACCOUNT_NUMBER')
+    app.config['BANK_ACCOUNT_NAME'] = os.getenv('BANK_ACCOUNT_NAME')
+
+    app.config['ADMIN_EMAIL'] = os.getenv('ADMIN_EMAIL')
+
+    # Aantal rijen per pagina in de admin-overzichten
+    app.config['ADMIN_PAGE_SIZE'] = int(os.getenv('ADMIN_PAGE_SIZE', '50'))
+    # Hoe ver vooruit (in dagen) de activiteiten van een terugkerende serie aangemaakt worden
+    app.config['SERIES_WINDOW_DAYS'] = int(os.getenv('SERIES_WINDOW_DAYS', '365'))
+    # Aantal rijen per pagina in de JSON API
+    app.config['API_PAGE_SIZE'] = int(os.getenv('API_PAGE_SIZE', '100'))
+
+    # Hashmethode voor wachtwoorden in Werkzeug-notatie, bv. 'scrypt:32768:8:1' of
+    # 'pbkdf2:sha256:600000'. Bestaande hashes worden bij de volgende login omgezet.
+    app.config['PASSWORD_HASH_METHOD'] = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    # Hashen en controleren gebeurt in een aparte pool van processen zodat een piek
+    # aan logins de worker niet vastzet; 0 = in het eigen proces (handig voor de CLI)
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv('PASSWORD_HASH_WORKERS', '2'))
+    app.config['PASSWORD_HASH_TIMEOUT'] = float(os.getenv('PASSWORD_HASH_TIMEOUT', '10'))
+
+    app.config['SERVER_NAME'] = os.getenv('SERVER_NAME')
+
+    # Paginacache voor de publieke homepage: 'filesystem' (standaard; gedeeld tussen gunicorn-workers
+    # en de workers/CLI die dezelfde instance-map gebruiken), 'memory' (alleen binnen één proces, voor
+    # ontwikkeling en tests) of een eigen backend als 'module:Klasse'
+    app.config['PAGE_CACHE_TYPE'] = os.getenv('PAGE_CACHE_TYPE', 'filesystem')
+    app.config['PAGE_CACHE_DIR'] = os.getenv('PAGE_CACHE_DIR', os.path.join(app.instance_path, 'page-cache'))
+    app.config['PAGE_CACHE_TIMEOUT'] = int(os.getenv('PAGE_CACHE_TIMEOUT', '300'))
+
+    # Overschrijfbaar voor een lokale debug-SMTP server (bv. MAIL_SERVER=localhost MAIL_PORT=1025 MAIL_USE_TLS=false)
+    app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
+    app.config['MAIL_PORT'] = int(os.getenv('MAIL_PORT', '587'))
+    app.config['MAIL_USE_TLS'] = os.getenv('MAIL_USE_TLS', 'true').lower() == 'true'
+    app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME')
+    app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
+    app.config['MAIL_DEFAULT_SENDER'] = ('Chateau Overdruiven', os.getenv('MAIL_USERNAME'))
+    # Mailwachtrij: na zoveel mislukte pogingen gaat een mail naar de dead letters
+    app.config['MAIL_OUTBOX_MAX_ATTEMPTS'] = int(os.getenv('MAIL_OUTBOX_MAX_ATTEMPTS', '5'))
+    app.config['MAIL_OUTBOX_BACKOFF'] = float(os.getenv('MAIL_OUTBOX_BACKOFF', '60'))
+    app.config['MAIL_OUTBOX_MAX_BACKOFF'] = float(os.getenv('MAIL_OUTBOX_MAX_BACKOFF', '3600'))
+
+    # Socket-timeout (seconden) voor verbinden en lezen; httplib2 kent één timeout voor beide.
+    app.config['GOOGLE_CALENDAR_TIMEOUT'] = float(os.getenv('GOOGLE_CALENDAR_TIMEOUT', '5'))
+    # Na zoveel fouten op rij wordt Google Agenda tijdelijk overgeslagen...
+    app.config['GOOGLE_CALENDAR_BREAKER_THRESHOLD'] = int(os.getenv('GOOGLE_CALENDAR_BREAKER_THRESHOLD', '3'))
+    # ...gedurende zoveel seconden, daarna mag er één proefaanroep door.
+    app.config['GOOGLE_CALENDAR_BREAKER_RESET'] = float(os.getenv('GOOGLE_CALENDAR_BREAKER_RESET', '60'))
+    # Alternatief API-endpoint, bv. een lokale nep-Calendar server om de worker te testen
+    app.config['GOOGLE_CALENDAR_API_ENDPOINT'] = os.getenv('GOOGLE_CALENDAR_API_ENDPOINT')
+    # Outbox: maximaal aantal pogingen en exponentiële backoff (seconden) tussen pogingen
+    app.config['CALENDAR_OUTBOX_MAX_ATTEMPTS'] = int(os.getenv('CALENDAR_OUTBOX_MAX_ATTEMPTS', '8'))
+    app.config['CALENDAR_OUTBOX_BACKOFF'] = float(os.getenv('CALENDAR_OUTBOX_BACKOFF', '30'))
+    app.config['CALENDAR_OUTBOX_MAX_BACKOFF'] = float(os.getenv('CALENDAR_OUTBOX_MAX_BACKOFF', '3600'))
+
+    # SQL-instrumentatie: Server-Timing header met het aantal queries en de DB-tijd per request,
+    # optioneel een JSON-logregel per request
+    app.config['SQL_SERVER_TIMING'] = os.getenv('SQL_SERVER_TIMING', 'true').lower() == 'true'
+    app.config['SQL_LOG_REQUESTS'] = os.getenv('SQL_LOG_REQUESTS', 'false').lower() == 'true'
+    # Strikte modus (voor tests en ontwikkeling): een fout zodra een request meer dan
+    # SQL_QUERY_BUDGET queries doet of dezelfde query SQL_REPEAT_LIMIT keer herhaalt (N+1)
+    app.config['SQL_STRICT'] = os.getenv('SQL_STRICT', 'false').lower() == 'true'
+    app.config['SQL_QUERY_BUDGET'] = int(os.getenv('SQL_QUERY_BUDGET', '20'))
+    app.config['SQL_REPEAT_LIMIT'] = int(os.getenv('SQL_REPEAT_LIMIT', '5'))
+
+    if config:
+        app.config.update(config)
+
+    if app.config['DATABASE_PROFILE'] not in DATABASE_PROFILES:
+        raise RuntimeError(f"Onbekend DATABASE_PROFILE '{app.config['DATABASE_PROFILE']}'. "
+                           f"Kies uit: {', '.join(DATABASE_PROFILES)}")
+    if ':memory:' not in app.config['SQLALCHEMY_DATABASE_URI'] and app.config['SQLALCHEMY_DATABASE_URI'] != 'sqlite://':
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(DATABASE_PROFILES[app.config['DATABASE_PROFILE']]['engine_options'])
+
+    db.init_app(app)
+    mail.init_app(app)
+    migrate.init_app(app, db)
+    with app.app_context():
+        event.listen(db.engine, 'connect',
+                     sqlite_pragma_listener(DATABASE_PROFILES[app.config['DATABASE_PROFILE']]['pragmas']))
+        event.listen(db.engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(db.engine, 'after_cursor_execute', _after_cursor_execute)
+    if app.config['SQL_LOG_REQUESTS']:
+        app.logger.setLevel(logging.INFO)
+
+    calendar_breaker.configure(app.config['GOOGLE_CALENDAR_BREAKER_THRESHOLD'],
+                               app.config['GOOGLE_CALENDAR_BREAKER_RESET'])
+    if app.config['PAGE_CACHE_TYPE'] == 'memory' and int(os.getenv('WEB_CONCURRENCY', '1')) > 1:
+        app.logger.warning("PAGE_CACHE_TYPE=memory met meerdere workers: andere workers zien invalidaties niet.")
+    app.extensions['page_cache'] = make_page_cache(app.config)
+    app.extensions['asset_manifest'] = load_asset_manifest(app.static_folder)
+    app.register_blueprint(bp)
+    app.register_blueprint(api_v1)
+    return app
+
 
 # --- Google Calendar API Configuration ---
 SERVICE_ACCOUNT_FILE = 'credentials/service_account.json' 
 SCOPES = ['https://www.googleapis.com/auth/calendar']
 CALENDAR_ID = os.getenv('GOOGLE_CALENDAR_ID')
 
+class CalendarUnavailable(Exception):
+    """Google Agenda wordt overgeslagen omdat de circuit breaker open staat."""
+
+
+class CircuitBreaker:
+    """Weigert aanroepen direct zodra een externe dienst herhaaldelijk faalt.
+
+    Na `failure_threshold` fouten op rij gaat de breaker open. Na `reset_timeout`
+    seconden mag er één proefaanroep door; slaagt die, dan sluit de breaker weer.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.configure(failure_threshold, reset_timeout)
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def configure(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                # Half-open: deze aanroep is de proef, de rest blijft geweigerd
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+# Drempel en wachttijd komen uit de config zodra create_app() draait
+calendar_breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+
+# Credentials worden per proces gedeeld (het access token wordt hergebruikt tot het verloopt);
+# de client zelf per thread, omdat httplib2.Http niet thread-safe is.
+_calendar_credentials = None
+_calendar_credentials_pid = None
+_calendar_local = threading.local()
+_calendar_lock = threading.Lock()
+
+
+def _get_calendar_credentials():
+    global _calendar_credentials, _calendar_credentials_pid
+    with _calendar_lock:
+        # Na een fork (gunicorn) bouwt elke worker zijn eigen credentials op
+        if _calendar_credentials is None or _calendar_credentials_pid != os.getpid():
+            if current_app.config['GOOGLE_CALENDAR_API_ENDPOINT'] and not os.path.exists(SERVICE_ACCOUNT_FILE):
+                # Lokale nep-server: geen service account nodig
+                from google.auth.credentials import AnonymousCredentials
+                _calendar_credentials = AnonymousCredentials()
+                _calendar_credentials_pid = os.getpid()
+                return _calendar_credentials
+            if not os.path.exists(SERVICE_ACCOUNT_FILE):
+                current_app.logger.error("Service account-bestand niet gevonden op '%s'", SERVICE_ACCOUNT_FILE)
+                raise FileNotFoundError(f"Service account file is missing. Expected at: {SERVICE_ACCOUNT_FILE}")
+            from google.oauth2 import service_account
+            _calendar_credentials = service_account.Credentials.from_service_account_file(
+                SERVICE_ACCOUNT_FILE, scopes=SCOPES)
+            _calendar_credentials_pid = os.getpid()
+        return _calendar_credentials
+
+
 def get_calendar_service():
-    """Retrieves the Google Calendar service client."""
-    if not os.path.exists(SERVICE_ACCOUNT_FILE):
-        print(f"Error: Service account file not found at '{SERVICE_ACCOUNT_FILE}'")
-        raise FileNotFoundError(f"Service account file is missing. Expected at: {SERVICE_ACCOUNT_FILE}")
-        
-    creds = service_account.Credentials.from_service_account_file(
-        SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-    service = build('calendar', 'v3', credentials=creds)
+    """Retrieves the cached Google Calendar service client, building it on first use."""
+    creds = _get_calendar_credentials()
+    service = getattr(_calendar_local, 'service', None)
+    if service is None or _calendar_local.credentials is not creds:
+        from googleapiclient.discovery import build
+        import google_auth_httplib2
+        import httplib2
+        http = google_auth_httplib2.AuthorizedHttp(
+            creds, http=httplib2.Http(timeout=current_app.config['GOOGLE_CALENDAR_TIMEOUT']))
+        # Het meegeleverde discovery-document gebruiken i.p.v. het bij Google op te halen
+        client_options = None
+        if current_app.config['GOOGLE_CALENDAR_API_ENDPOINT']:
+            client_options = {'api_endpoint': current_app.config['GOOGLE_CALENDAR_API_ENDPOINT']}
+        service = build('calendar', 'v3', http=http, static_discovery=True, cache_discovery=False,
+                        client_options=client_options)
+        _calendar_local.service = service
+        _calendar_local.credentials = creds
     return service
 
+
+def execute_calendar_request(calendar_request):
+    """Voert een Calendar API-request uit via de circuit breaker.
+
+    Gooit CalendarUnavailable zonder netwerkverkeer als de breaker open staat.
+    Alleen netwerkfouten, 429 en 5xx tellen als storing; een 404 op een
+    verwijderd event zegt niets over de beschikbaarheid van Google.
+    """
+    from googleapiclient.errors import HttpError
+
+    if not calendar_breaker.allow():
+        raise CalendarUnavailable('Google Agenda is tijdelijk niet bereikbaar.')
+    try:
+        result = calendar_request.execute()
+    except HttpError as e:
+        if e.resp.status == 429 or e.resp.status >= 500:
+            calendar_breaker.record_failure()
+        else:
+            calendar_breaker.record_success()
+        raise
+    except Exception:
+        calendar_breaker.record_failure()
+        raise
+    calendar_breaker.record_success()
+    return result
+
+def retry_delay(attempts, base, maximum):
+    """Exponentiële backoff in seconden voor de zoveelste mislukte poging."""
+    return min(base * 2 ** (attempts - 1), maximum)
+
+
+def activity_event_body(activity):
+    """Bouwt de Google Agenda-eventvelden voor een activiteit."""
+    date_str = activity.date.strftime('%Y-%m-%d')
+    event_body = {
+        'summary': activity.name, 'location': activity.location, 'description': activity.description,
+        'status': 'confirmed',
+        'start': {'timeZone': 'Europe/Amsterdam'}, 'end': {'timeZone': 'Europe/Amsterdam'},
+    }
+    if activity.start_time and activity.end_time:
+        event_body['start'].update(dateTime=f"{date_str}T{activity.start_time}:00", date=None)
+        event_body['end'].update(dateTime=f"{date_str}T{activity.end_time}:00", date=None)
+    else:
+        # Bij hele-dag events is de einddatum exclusief
+        end_date = activity.date + datetime.timedelta(days=1)
+        event_body['start'].update(date=date_str, dateTime=None)
+        event_body['end'].update(date=end_date.strftime('%Y-%m-%d'), dateTime=None)
+    return event_body
+
+
+def new_google_event_id():
+    """Eigen event-id (base32hex) zodat een herhaalde insert geen dubbel event oplevert."""
+    return secrets.token_hex(16)
+
+
+def series_event_body(series):
+    """Het terugkerende hoofd-event van een serie: de eerste keer plus de RRULE."""
+    return dict(activity_event_body(series), recurrence=[f'RRULE:{series.rrule}'])
+
+
+def series_instance_id(series, day):
+    """Het id dat Google aan één keer van een terugkerend event geeft.
+
+    Dat is het id van het hoofd-event plus de oorspronkelijke starttijd in UTC
+    (of alleen de datum bij hele-dag events). Een patch of delete op dit id
+    wordt in Google een uitzondering op de serie.
+    """
+    if series.start_time and series.end_time:
+        start = datetime.datetime.combine(day, datetime.time.fromisoformat(series.start_time[:5]),
+                                          tzinfo=ZoneInfo('Europe/Amsterdam'))
+        return f"{series.google_event_id}_{_ical_utc(start)}"
+    return f"{series.google_event_id}_{day.strftime('%Y%m%d')}"
+
+
+def enqueue_calendar_sync(activity, operation):
+    """Zet een Google Agenda-wijziging in de outbox; commit gebeurt door de aanroeper."""
+    db.session.add(CalendarOutbox(
+        activity_id=activity.id,
+        operation=operation,
+        google_event_id=activity.google_event_id,
+    ))
+
+
+def enqueue_series_sync(series):
+    """Zet het (bijgewerkte) hoofd-event van een serie in de outbox."""
+    db.session.add(CalendarOutbox(
+        activity_id=series.id,
+        operation='series_upsert',
+        google_event_id=series.google_event_id,
+    ))
+
+
+def _sync_calendar_entry(service, entry):
+    """Voert één outbox-rij uit tegen Google Agenda."""
+    from googleapiclient.errors import HttpError
+
+    if entry.operation == 'delete':
+        if not entry.google_event_id:
+            return
+        try:
+            execute_calendar_request(service.events().delete(calendarId=CALENDAR_ID, eventId=entry.google_event_id))
+        except HttpError as e:
+            # Al verwijderd is ook goed
+            if e.resp.status not in (404, 410):
+                raise
+        return
+
+    if entry.operation == 'series_upsert':
+        target = db.session.get(ActivitySeries, entry.activity_id)
+        body = series_event_body(target) if target else None
+    else:
+        target = db.session.get(Activity, entry.activity_id)
+        body = activity_event_body(target) if target else None
+    if target is None:
+        return
+    if not target.google_event_id:
+        # Id eerst vastleggen: mislukt de insert halverwege, dan wordt hetzelfde event later bijgewerkt
+        target.google_event_id = new_google_event_id()
+        db.session.commit()
+    try:
+        execute_calendar_request(service.events().patch(
+            calendarId=CALENDAR_ID, eventId=target.google_event_id, body=body))
+    except HttpError as e:
+        # Een keer uit een serie bestaat pas als het hoofd-event er is: later opnieuw proberen
+        if e.resp.status not in (404, 410) or getattr(target, 'series_id', None):
+            raise
+        execute_calendar_request(service.events().insert(
+            calendarId=CALENDAR_ID, body=dict(body, id=target.google_event_id)))
+
+
+def process_calendar_outbox(batch_size=100):
+    """Verwerkt de openstaande outbox-rijen die aan de beurt zijn.
+
+    Meerdere wachtende rijen voor dezelfde activiteit worden samengevoegd: alleen
+    de nieuwste wordt uitgevoerd, omdat die de actuele stand van de activiteit
+    weerspiegelt. Geeft (verwerkt, mislukt) terug.
+    """
+    now = datetime.datetime.now()
+    due = (CalendarOutbox.query
+           .filter(CalendarOutbox.status == 'pending', CalendarOutbox.next_attempt_at <= now)
+           .order_by(CalendarOutbox.id)
+           .limit(batch_size)
+           .all())
+    if not due:
+        return 0, 0
+
+    def merge_key(operation, target_id):
+        # Een serie en een activiteit kunnen hetzelfde id hebben
+        return operation == 'series_upsert', target_id
+
+    latest = {}
+    for entry in due:
+        latest[merge_key(entry.operation, entry.activity_id)] = entry
+    # Oudere wachtende rijen voor dezelfde activiteit (ook als ze nog niet aan de beurt zijn) zijn achterhaald
+    pending = (db.session.query(CalendarOutbox.id, CalendarOutbox.operation, CalendarOutbox.activity_id)
+               .filter(CalendarOutbox.status == 'pending',
+                       CalendarOutbox.activity_id.in_({target_id for _, target_id in latest}))
+               .all())
+    superseded = [row.id for row in pending
+                  if merge_key(row.operation, row.activity_id) in latest
+                  and row.id < latest[merge_key(row.operation, row.activity_id)].id]
+    if superseded:
+        CalendarOutbox.query.filter(CalendarOutbox.id.in_(superseded)).update(
+            {'status': 'done', 'last_error': 'Samengevoegd met een nieuwere wijziging'},
+            synchronize_session=False)
+        db.session.commit()
+
+    service = get_calendar_service()
+    processed = failed = 0
+    for entry in sorted(latest.values(), key=lambda e: e.id):
+        if entry.status != 'pending':
+            continue
+        try:
+            _sync_calendar_entry(service, entry)
+        except CalendarUnavailable as e:
+            # Breaker staat open: niet als poging tellen, later opnieuw
+            db.session.rollback()
+            entry.next_attempt_at = datetime.datetime.now() + datetime.timedelta(
+                seconds=current_app.config['GOOGLE_CALENDAR_BREAKER_RESET'])
+            entry.last_error = str(e)
+            db.session.commit()
+            failed += 1
+            break
+        except Exception as e:
+            db.session.rollback()
+            entry.attempts += 1
+            entry.last_error = f"{type(e).__name__}: {e}"
+            if entry.attempts >= current_app.config['CALENDAR_OUTBOX_MAX_ATTEMPTS']:
+                entry.status = 'failed'
+            else:
+                delay = retry_delay(entry.attempts, current_app.config['CALENDAR_OUTBOX_BACKOFF'],
+                                    current_app.config['CALENDAR_OUTBOX_MAX_BACKOFF'])
+                entry.next_attempt_at = datetime.datetime.now() + datetime.timedelta(seconds=delay)
+            db.session.commit()
+            failed += 1
+            continue
+        entry.status = 'done'
+        entry.last_error = None
+        db.session.commit()
+        processed += 1
+    return processed, failed
+
+CALENDAR_BATCH_SIZE = 50 # maximum aantal requests per batch volgens de Calendar API
+
+
+def new_calendar_batch(service, callback):
+    """Nieuwe batch-request; respecteert GOOGLE_CALENDAR_API_ENDPOINT (de client zelf doet dat niet)."""
+    endpoint = current_app.config['GOOGLE_CALENDAR_API_ENDPOINT']
+    if endpoint:
+        from googleapiclient.http import BatchHttpRequest
+        return BatchHttpRequest(callback=callback, batch_uri=endpoint.rstrip('/') + '/batch/calendar/v3')
+    return service.new_batch_http_request(callback=callback)
+
+
+def _event_matches(event, body):
+    """Vergelijkt een bestaand Google-event met de velden die de activiteit voorschrijft."""
+    for field in ('summary', 'location', 'description'):
+        if (event.get(field) or None) != (body.get(field) or None):
+            return False
+    if event.get('status', 'confirmed') != 'confirmed':
+        return False
+    for side in ('start', 'end'):
+        have, want = event.get(side, {}), body[side]
+        if want.get('dateTime'):
+            # Google geeft de tijd terug met offset (2030-01-02T20:00:00+01:00)
+            if (have.get('dateTime') or '')[:19] != want['dateTime']:
+                return False
+        elif have.get('date') != want['date']:
+            return False
+    return True
+
+
+def list_calendar_events(service):
+    """Haalt alle events van de agenda op, pagina voor pagina.
+
+    Verwijderde events komen mee (status 'cancelled'): hun id is bij Google
+    nog bezet, dus die moeten hersteld worden in plaats van opnieuw ingevoegd.
+    """
+    events = {}
+    page_token = None
+    while True:
+        response = execute_calendar_request(service.events().list(
+            calendarId=CALENDAR_ID, pageToken=page_token, maxResults=2500, showDeleted=True,
+            fields='nextPageToken,items(id,status,summary,location,description,start,end,recurringEventId)'))
+        for event in response.get('items', []):
+            events[event['id']] = event
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            return events
+
+
+def reconcile_calendar(service, dry_run=False, delete_orphans=True):
+    """Vergelijkt de activity-tabel met Google Agenda en herstelt de verschillen in batches.
+
+    Geeft een dict met lijsten per soort verschil ('missing', 'stale', 'orphaned')
+    en de fouten die Google teruggaf.
+    """
+    events = list_calendar_events(service)
+    activities = Activity.query.order_by(Activity.id).all()
+
+    operations = [] # (soort, omschrijving, request)
+    known_ids = set()
+    for activity in activities:
+        body = activity_event_body(activity)
+        event = events.get(activity.google_event_id) if activity.google_event_id else None
+        if activity.google_event_id:
+            known_ids.add(activity.google_event_id)
+        if activity.series_id and event is None:
+            # Ongewijzigde keer uit een serie: Google leidt die af uit het hoofd-event
+            continue
+        if event is None:
+            if not dry_run and not activity.google_event_id:
+                activity.google_event_id = new_google_event_id()
+            operations.append(('missing', f'Activiteit {activity.id} ({activity.name})',
+                               lambda a=activity, b=body: service.events().insert(
+                                   calendarId=CALENDAR_ID, body=dict(b, id=a.google_event_id))))
+        elif not _event_matches(event, body):
+            operations.append(('stale', f'Activiteit {activity.id} ({activity.name})',
+                               lambda a=activity, b=body: service.events().patch(
+                                   calendarId=CALENDAR_ID, eventId=a.google_event_id, body=b)))
+
+    for series in ActivitySeries.query.order_by(ActivitySeries.id):
+        body = series_event_body(series)
+        event = events.get(series.google_event_id)
+        known_ids.add(series.google_event_id)
+        if event is None:
+            operations.append(('missing', f'Serie {series.id} ({series.name})',
+                               lambda sr=series, b=body: service.events().insert(
+                                   calendarId=CALENDAR_ID, body=dict(b, id=sr.google_event_id))))
+        elif not _event_matches(event, body) or event.get('recurrence') != body['recurrence']:
+            operations.append(('stale', f'Serie {series.id} ({series.name})',
+                               lambda sr=series, b=body: service.events().patch(
+                                   calendarId=CALENDAR_ID, eventId=sr.google_event_id, body=b)))
+
+    if delete_orphans:
+        # Gearchiveerde activiteiten blijven in de agenda staan
+        known_ids.update(event_id for (event_id,) in db.session.query(ArchivedActivity.google_event_id)
+                         .filter(ArchivedActivity.google_event_id.isnot(None)))
+        for event_id, event in events.items():
+            # Losse instanties van een terugkerend event horen bij hun hoofd-event
+            if event_id in known_ids or event.get('recurringEventId') in known_ids:
+                continue
+            if event.get('status') == 'cancelled':
+                continue
+            operations.append(('orphaned', f"Event {event_id} ({event.get('summary')})",
+                               lambda e=event_id: service.events().delete(calendarId=CALENDAR_ID, eventId=e)))
+
+    report = {'missing': [], 'stale': [], 'orphaned': [], 'errors': []}
+    for kind, description, _ in operations:
+        report[kind].append(description)
+    if dry_run or not operations:
+        db.session.rollback()
+        return report
+
+    # Nieuwe event-ids vastleggen vóór de inserts, zodat een herhaalde sync geen dubbele events maakt
+    db.session.commit()
+
+    def callback(request_id, response, exception):
+        if exception is not None:
+            status = getattr(getattr(exception, 'resp', None), 'status', None)
+            # 409 bij insert (bestaat al) en 404/410 bij delete zijn geen echte fouten
+            if status not in (409, 404, 410):
+                report['errors'].append(f'{operations[int(request_id)][1]}: {exception}')
+
+    for start in range(0, len(operations), CALENDAR_BATCH_SIZE):
+        batch = new_calendar_batch(service, callback)
+        for index in range(start, min(start + CALENDAR_BATCH_SIZE, len(operations))):
+            batch.add(operations[index][2](), request_id=str(index))
+        execute_calendar_request(batch)
+    return report
+
+# --- Wachtwoorden ---
+class PasswordHashingUnavailable(Exception):
+    """De wachtwoordpool gaf niet binnen PASSWORD_HASH_TIMEOUT antwoord."""
+
+
+_password_pool = None
+_password_pool_pid = None
+_password_pool_lock = threading.Lock()
+
+
+def get_password_pool():
+    """Geeft de procespool voor wachtwoordhashing van dit workerproces (of None).
+
+    De pool wordt pas bij de eerste login gestart en na een fork opnieuw
+    aangemaakt. 'spawn' zorgt dat de kindprocessen geen kopie van de app,
+    databaseverbindingen of threads van de worker erven.
+    """
+    global _password_pool, _password_pool_pid
+    workers = current_app.config['PASSWORD_HASH_WORKERS']
+    if workers <= 0:
+        return None
+    with _password_pool_lock:
+        if _password_pool is None or _password_pool_pid != os.getpid():
+            _password_pool = ProcessPoolExecutor(max_workers=workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+            _password_pool_pid = os.getpid()
+        return _password_pool
+
+
+def _reset_password_pool(pool):
+    global _password_pool
+    with _password_pool_lock:
+        if _password_pool is pool:
+            _password_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def run_password_task(func, *args):
+    """Voert een Werkzeug-hashfunctie uit in de pool, met PASSWORD_HASH_TIMEOUT."""
+    pool = get_password_pool()
+    if pool is None:
+        return func(*args)
+    try:
+        future = pool.submit(func, *args)
+    except BrokenProcessPool:
+        # Een kindproces is gestorven; begin met een verse pool
+        _reset_password_pool(pool)
+        future = get_password_pool().submit(func, *args)
+    try:
+        return future.result(timeout=current_app.config['PASSWORD_HASH_TIMEOUT'])
+    except FutureTimeoutError:
+        future.cancel()
+        current_app.logger.warning("Wachtwoordcontrole duurde langer dan %ss.", current_app.config['PASSWORD_HASH_TIMEOUT'])
+        raise PasswordHashingUnavailable()
+    except BrokenProcessPool:
+        _reset_password_pool(pool)
+        raise PasswordHashingUnavailable()
+
+
+def hash_password(password):
+    return run_password_task(generate_password_hash, password, current_app.config['PASSWORD_HASH_METHOD'])
+
+
+def verify_password(password_hash, password):
+    return run_password_task(check_password_hash, password_hash, password)
+
+
+_hash_prefixes = {}
+
+def current_hash_prefix():
+    """De methode zoals die in nieuwe hashes staat, bv. 'scrypt:32768:8:1'.
+
+    Werkzeug vult ontbrekende parameters zelf aan ('scrypt' wordt
+    'scrypt:32768:8:1'), dus dit wordt eenmalig per proces uit een echte hash gehaald.
+    """
+    method = current_app.config['PASSWORD_HASH_METHOD']
+    if method not in _hash_prefixes:
+        _hash_prefixes[method] = hash_password('').split('$', 1)[0]
+    return _hash_prefixes[method]
+
+
 # --- Database Models ---
 class Activity(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=True)
-    date = db.Column(db.Date, nullable=False)
+    date = db.Column(db.Date, nullable=False, index=True)
     start_time = db.Column(db.String(50), nullable=True)
     end_time = db.Column(db.String(50), nullable=True)
     max_participants = db.Column(db.Integer, nullable=True)
@@ -88,36 +744,116 @@ class Activity(db.Model):
     cost = db.Column(db.Float, nullable=True) 
     organizer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     organizer = db.relationship('User', foreign_keys=[organizer_id])
+    updated_at = db.Column(db.DateTime, nullable=True, default=datetime.datetime.now, onupdate=datetime.datetime.now)
+    series_id = db.Column(db.Integer, db.ForeignKey('activity_series.id'), nullable=True, index=True)
+    series = db.relationship('ActivitySeries')
     signups = db.relationship('Signup', backref='activity', lazy=True, cascade="all, delete-orphan")
 
-    @property
-    def signups_count(self):
-        """Telt het totaal aantal aanmeldingen voor deze activiteit."""
-        return len(self.signups)
+    __table_args__ = (
+        # Publieke homepage en feed: is_public = 1 AND date >= vandaag
+        db.Index('ix_activity_is_public_date', 'is_public', 'date'),
+    )
 
     def __repr__(self):
         return f'<Activity {self.name}>'
 
+class ActivitySeries(db.Model):
+    """Terugkerende activiteit. De losse activiteiten worden vooruit aangemaakt tot
+    `materialized_until`; in Google Agenda is de serie één event met een RRULE.
+    """
+    __tablename__ = 'activity_series'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    description = db.Column(db.Text, nullable=True)
+    date = db.Column(db.Date, nullable=False) # eerste keer
+    start_time = db.Column(db.String(50), nullable=True)
+    end_time = db.Column(db.String(50), nullable=True)
+    max_participants = db.Column(db.Integer, nullable=True)
+    location = db.Column(db.String(200), nullable=True)
+    is_public = db.Column(db.Boolean, nullable=False, server_default='0')
+    cost = db.Column(db.Float, nullable=True)
+    organizer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    frequency = db.Column(db.String(10), nullable=False) # 'DAILY', 'WEEKLY' of 'MONTHLY'
+    interval = db.Column(db.Integer, nullable=False, default=1)
+    until = db.Column(db.Date, nullable=True) # None = loopt door
+    materialized_until = db.Column(db.Date, nullable=True)
+    google_event_id = db.Column(db.String(255), nullable=True, unique=True)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.now)
+
+    @property
+    def rrule(self):
+        """De herhaling als RFC 5545 RRULE, zoals Google Agenda hem verwacht."""
+        rule = f'FREQ={self.frequency};INTERVAL={self.interval}'
+        if self.until:
+            # Bij events met een tijd moet UNTIL in UTC; einde van de dag dekt de laatste keer
+            timed = self.start_time and self.end_time
+            rule += f";UNTIL={self.until.strftime('%Y%m%d')}{'T235959Z' if timed else ''}"
+        return rule
+
+    def __repr__(self):
+        return f'<ActivitySeries {self.name} ({self.rrule})>'
+
 class Signup(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     activity_id = db.Column(db.Integer, db.ForeignKey('activity.id'), nullable=False)
     participant_name = db.Column(db.String(100), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True, index=True)
+    user = db.relationship('User')
+
+    __table_args__ = (
+        # Uniek: één aanmelding per gebruiker per activiteit (oude aanmeldingen zonder user_id tellen niet mee)
+        db.Index('ix_signup_activity_id_user_id', 'activity_id', 'user_id', unique=True),
+    )
+
+    @property
+    def display_name(self):
+        """Actuele gebruikersnaam; valt terug op de opgeslagen naam voor oude aanmeldingen."""
+        return self.user.username if self.user else self.participant_name
 
     def __repr__(self):
         return f'<Signup {self.participant_name} for Activity {self.activity_id}>'
 
+# Telt het totaal aantal aanmeldingen in SQL; overzichten laden dit mee via undefer()
+# zodat er niet per activiteit alle Signup-rijen opgehaald worden.
+Activity.signups_count = db.column_property(
+    db.select(func.count(Signup.id))
+    .where(Signup.activity_id == Activity.id)
+    .correlate_except(Signup)
+    .scalar_subquery(),
+    deferred=True,
+)
+
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(128), nullable=False)
+    password_hash = db.Column(db.String(256), nullable=False)
     role = db.Column(db.String(20), nullable=False, server_default='user') # bv. 'user', 'organizer', 'admin'
 
+    __table_args__ = (
+        # Inloggen en registreren zoeken hoofdletterongevoelig op gebruikersnaam
+        db.Index('ix_user_username_lower', func.lower(username)),
+    )
+
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
+
+    @property
+    def is_admin(self):
+        # Een gebruiker is admin als de username 'admin' is OF als de rol 'admin' is.
+        return self.username == 'admin' or self.role == 'admin'
+
+    @property
+    def is_organizer(self):
+        # Admins mogen alles wat een organizer mag
+        return self.is_admin or self.role == 'organizer'
+
+    def password_needs_rehash(self):
+        """True als de hash met andere parameters gemaakt is dan PASSWORD_HASH_METHOD."""
+        return self.password_hash.split('$', 1)[0] != current_hash_prefix()
 
     def __repr__(self):
         return f'<User {self.username} - {self.email}>'
@@ -127,7 +863,7 @@ class InvitationCode(db.Model):
     code = db.Column(db.String(50), unique=True, nullable=False)
     is_used = db.Column(db.Boolean, default=False)
     used_by_user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
-    created_at = db.Column(db.DateTime, default=datetime.datetime.now)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.now, index=True)
     role = db.Column(db.String(20), nullable=False, server_default='user')
 
     def __repr__(self):
@@ -139,11 +875,117 @@ class Payment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     activity_id = db.Column(db.Integer, db.ForeignKey('activity.id'), nullable=False)
-    status = db.Column(db.String(30), nullable=False, default='unpaid')
-    db.UniqueConstraint('user_id', 'activity_id', name='uq_user_activity_payment')
+    status = db.Column(db.String(30), nullable=False, default='unpaid', index=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'activity_id', name='uq_user_activity_payment'),
+        # Dekt zowel 'betalingen van een activiteit' als het tellen per status (financieel overzicht)
+        db.Index('ix_payment_activity_id_status', 'activity_id', 'status'),
+    )
 
     def __repr__(self):
         return f'<Payment {self.id} - Status: {self.status}>'
+
+
+class CalendarOutbox(db.Model):
+    """Openstaande Google Agenda-wijziging, geschreven in dezelfde transactie als de Activity.
+
+    `flask calendar-worker` verwerkt deze rijen op de achtergrond.
+    """
+    __tablename__ = 'calendar_outbox'
+    id = db.Column(db.Integer, primary_key=True)
+    # Geen foreign key: bij een 'delete' bestaat de activiteit al niet meer
+    activity_id = db.Column(db.Integer, nullable=False, index=True)
+    # 'upsert', 'delete' of 'series_upsert'; bij die laatste is activity_id het id van de ActivitySeries
+    operation = db.Column(db.String(20), nullable=False)
+    google_event_id = db.Column(db.String(255), nullable=True)
+    status = db.Column(db.String(10), nullable=False, default='pending') # 'pending', 'done', 'failed'
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.now)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.now)
+
+    __table_args__ = (
+        db.Index('ix_calendar_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+
+    def __repr__(self):
+        return f'<CalendarOutbox {self.operation} Activity {self.activity_id} ({self.status})>'
+
+
+class MailOutbox(db.Model):
+    """E-mail in de wachtrij; `flask mail-worker` verstuurt deze op de achtergrond."""
+    __tablename__ = 'mail_outbox'
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(255), nullable=False)
+    recipients = db.Column(db.Text, nullable=False) # komma-gescheiden
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='pending') # 'pending', 'sent', 'dead'
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.now)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.now)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_mail_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+
+    def to_message(self):
+        return Message(self.subject, recipients=self.recipients.split(','), body=self.body)
+
+    def __repr__(self):
+        return f'<MailOutbox {self.id} {self.subject!r} ({self.status})>'
+
+
+class ArchivedActivity(db.Model):
+    """Afgeronde activiteit die met `flask archive-activities` uit de activity-tabel verplaatst is.
+
+    Het id blijft gelijk, zodat betalingskenmerken (ACT{id}-...) herkenbaar blijven.
+    Geen foreign keys: gebruikers kunnen na het archiveren nog verwijderd worden.
+    """
+    __tablename__ = 'archived_activity'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(100), nullable=False)
+    description = db.Column(db.Text, nullable=True)
+    date = db.Column(db.Date, nullable=False, index=True)
+    start_time = db.Column(db.String(50), nullable=True)
+    end_time = db.Column(db.String(50), nullable=True)
+    max_participants = db.Column(db.Integer, nullable=True)
+    location = db.Column(db.String(200), nullable=True)
+    google_event_id = db.Column(db.String(255), nullable=True)
+    is_public = db.Column(db.Boolean, nullable=False, server_default='0')
+    cost = db.Column(db.Float, nullable=True)
+    organizer_id = db.Column(db.Integer, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=True)
+    # Vastgelegd bij het archiveren, zodat het overzicht geen aanmeldingen hoeft te tellen
+    signups_count = db.Column(db.Integer, nullable=False, default=0)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.now)
+
+    def __repr__(self):
+        return f'<ArchivedActivity {self.name}>'
+
+
+class ArchivedSignup(db.Model):
+    __tablename__ = 'archived_signup'
+    id = db.Column(db.Integer, primary_key=True)
+    activity_id = db.Column(db.Integer, nullable=False, index=True)
+    user_id = db.Column(db.Integer, nullable=True, index=True)
+    participant_name = db.Column(db.String(100), nullable=False)
+
+    def __repr__(self):
+        return f'<ArchivedSignup {self.participant_name} for Activity {self.activity_id}>'
+
+
+class ArchivedPayment(db.Model):
+    __tablename__ = 'archived_payment'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    activity_id = db.Column(db.Integer, nullable=False, index=True)
+    status = db.Column(db.String(30), nullable=False)
+
+    def __repr__(self):
+        return f'<ArchivedPayment {self.id} - Status: {self.status}>'
     
 class RegistrationForm(FlaskForm):
     username = StringField('Gebruikersnaam', validators=[DataRequired()])
@@ -161,48 +1003,1207 @@ class RegistrationForm(FlaskForm):
     invite_code = StringField('Uitnodigingscode', validators=[DataRequired()])
     submit = SubmitField('Registreer')
 
+# --- Aanmeldingen ---
+
+def reserve_signup(activity_id, user):
+    """Meldt een gebruiker aan als er nog plek is, in één INSERT ... SELECT.
+
+    De telling van de bestaande aanmeldingen en de insert zitten in hetzelfde
+    statement. Een schrijvend statement pakt in SQLite meteen de schrijflock, dus
+    twee gelijktijdige aanmeldingen kunnen niet allebei de laatste plek zien.
+    De unieke index op (activity_id, user_id) vangt dubbele aanmeldingen af.
+    Geeft True terug als er een aanmelding is toegevoegd; commit gebeurt door de aanroeper.
+    Roep dit aan vóór andere wijzigingen in de sessie: bij een conflict wordt teruggedraaid.
+    """
+    signup = Signup.__table__
+    activity = Activity.__table__
+    taken = (db.select(func.count())
+             .select_from(signup)
+             .where(signup.c.activity_id == activity.c.id)
+             .scalar_subquery())
+    already_signed_up = (db.select(signup.c.id)
+                         .where(signup.c.activity_id == activity.c.id, signup.c.user_id == user.id)
+                         .exists())
+    stmt = db.insert(signup).from_select(
+        ['activity_id', 'participant_name', 'user_id'],
+        db.select(activity.c.id, literal(user.username), literal(user.id))
+        .where(activity.c.id == activity_id,
+               or_(activity.c.max_participants.is_(None), taken < activity.c.max_participants),
+               ~already_signed_up),
+    )
+    try:
+        result = db.session.execute(stmt)
+    except IntegrityError:
+        # Dezelfde gebruiker meldde zich in een gelijktijdig request al aan
+        db.session.rollback()
+        return False
+    return result.rowcount == 1
+
+
+# --- Series ---
+
+SERIES_FREQUENCIES = {'DAILY': 'Dagelijks', 'WEEKLY': 'Wekelijks', 'MONTHLY': 'Maandelijks'}
+
+
+def series_dates(series, start, end):
+    """De datums van de serie tussen `start` en `end` (inclusief).
+
+    Volgt de RRULE: elke `interval` dagen, weken of maanden vanaf de eerste
+    datum, tot en met `until`. Maanden zonder die dag (31 februari) worden
+    overgeslagen, net als Google Agenda doet.
+    """
+    last = min(end, series.until) if series.until else end
+    step = 0
+    while True:
+        if series.frequency == 'MONTHLY':
+            months = series.date.month - 1 + step * series.interval
+            try:
+                day = series.date.replace(year=series.date.year + months // 12, month=months % 12 + 1)
+            except ValueError:
+                step += 1
+                continue
+        else:
+            days = 7 if series.frequency == 'WEEKLY' else 1
+            day = series.date + datetime.timedelta(days=days * step * series.interval)
+        if day > last:
+            return
+        if day >= start:
+            yield day
+        step += 1
+
+
+def materialize_series(series, until):
+    """Maakt de nog ontbrekende activiteiten van de serie t/m `until` aan met één bulk-INSERT.
+
+    Ze krijgen meteen het id van hun keer in het terugkerende Google-event, zodat
+    een latere wijziging of verwijdering alleen die keer aanpast; voor het aanmaken
+    zelf is geen Calendar-aanroep per activiteit nodig. Commit gebeurt door de aanroeper.
+    """
+    start = series.materialized_until + datetime.timedelta(days=1) if series.materialized_until else series.date
+    rows = [{
+        'name': series.name, 'description': series.description, 'date': day,
+        'start_time': series.start_time, 'end_time': series.end_time,
+        'max_participants': series.max_participants, 'location': series.location,
+        'is_public': series.is_public, 'cost': series.cost, 'organizer_id': series.organizer_id,
+        'series_id': series.id, 'google_event_id': series_instance_id(series, day),
+    } for day in series_dates(series, start, until)]
+    if rows:
+        db.session.execute(db.insert(Activity), rows)
+    series.materialized_until = min(until, series.until) if series.until else until
+    return len(rows)
+
+
+def series_window_end():
+    return datetime.date.today() + datetime.timedelta(days=current_app.config['SERIES_WINDOW_DAYS'])
+
+
+# --- Mail Queue ---
+
+def enqueue_mail(subject, recipients, body):
+    """Zet een e-mail in de wachtrij; commit gebeurt door de aanroeper."""
+    db.session.add(MailOutbox(subject=subject, recipients=','.join(recipients), body=body))
+
+
+def enqueue_mails(mails):
+    """Zet meerdere (onderwerp, ontvangers, tekst)-mails in één INSERT in de wachtrij."""
+    if mails:
+        db.session.execute(db.insert(MailOutbox), [
+            {'subject': subject, 'recipients': ','.join(recipients), 'body': body}
+            for subject, recipients, body in mails])
+
+
+def send_mail_batch(connection, batch_size=50):
+    """Verstuurt de openstaande mails die aan de beurt zijn over een open SMTP-verbinding.
+
+    Geeft (verstuurd, mislukt) terug. Valt de verbinding zelf weg, dan wordt
+    de exceptie doorgegeven zodat de aanroeper opnieuw kan verbinden.
+    """
+    due = (MailOutbox.query
+           .filter(MailOutbox.status == 'pending', MailOutbox.next_attempt_at <= datetime.datetime.now())
+           .order_by(MailOutbox.id)
+           .limit(batch_size)
+           .all())
+    sent = failed = 0
+    for item in due:
+        try:
+            connection.send(item.to_message())
+        except Exception as e:
+            item.attempts += 1
+            item.last_error = f"{type(e).__name__}: {e}"
+            # Geweigerde ontvangers worden niet beter van opnieuw proberen
+            if isinstance(e, smtplib.SMTPRecipientsRefused) or item.attempts >= current_app.config['MAIL_OUTBOX_MAX_ATTEMPTS']:
+                item.status = 'dead'
+            else:
+                item.next_attempt_at = datetime.datetime.now() + datetime.timedelta(
+                    seconds=retry_delay(item.attempts, current_app.config['MAIL_OUTBOX_BACKOFF'],
+                                        current_app.config['MAIL_OUTBOX_MAX_BACKOFF']))
+            db.session.commit()
+            failed += 1
+            # Verbindingsfouten (SMTPException is zelf ook een OSError) breken de batch af
+            if isinstance(e, smtplib.SMTPServerDisconnected) or (
+                    isinstance(e, OSError) and not isinstance(e, smtplib.SMTPException)):
+                raise
+            continue
+        item.status = 'sent'
+        item.sent_at = datetime.datetime.now()
+        item.last_error = None
+        db.session.commit()
+        sent += 1
+    return sent, failed
+
+
+def has_due_mail():
+    return db.session.query(
+        MailOutbox.query
+        .filter(MailOutbox.status == 'pending', MailOutbox.next_attempt_at <= datetime.datetime.now())
+        .exists()
+    ).scalar()
+
+
+# --- iCalendar Feeds ---
+
+ICAL_TIMEZONE = [
+    'BEGIN:VTIMEZONE',
+    'TZID:Europe/Amsterdam',
+    'BEGIN:DAYLIGHT',
+    'TZOFFSETFROM:+0100',
+    'TZOFFSETTO:+0200',
+    'TZNAME:CEST',
+    'DTSTART:19700329T020000',
+    'RRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=-1SU',
+    'END:DAYLIGHT',
+    'BEGIN:STANDARD',
+    'TZOFFSETFROM:+0200',
+    'TZOFFSETTO:+0100',
+    'TZNAME:CET',
+    'DTSTART:19701025T030000',
+    'RRULE:FREQ=YEARLY;BYMONTH=10;BYDAY=-1SU',
+    'END:STANDARD',
+    'END:VTIMEZONE',
+]
+# Hoe ver terug de feeds activiteiten tonen
+ICAL_HISTORY_DAYS = 180
+# Gerenderde feeds per (soort, etag); een gewijzigde activiteit levert een nieuwe etag op
+_ical_cache = LRUCache(maxsize=8)
+_ical_cache_lock = threading.Lock()
+
+
+def _ical_escape(value):
+    return (value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def _ical_fold(line):
+    """Vouwt een regel op 75 octets, zoals RFC 5545 voorschrijft."""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line
+    parts = []
+    while len(encoded) > 75:
+        cut = 75 if not parts else 74
+        # Niet midden in een UTF-8 teken knippen
+        while cut > 0 and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+    parts.append(encoded.decode('utf-8'))
+    return '\r\n '.join(parts)
+
+
+def _ical_utc(moment):
+    return moment.astimezone(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _ical_event_lines(activity):
+    stamp = _ical_utc(activity.updated_at or datetime.datetime(2025, 1, 1))
+    yield 'BEGIN:VEVENT'
+    yield f'UID:activity-{activity.id}@overdruiven'
+    yield f'DTSTAMP:{stamp}'
+    yield f'LAST-MODIFIED:{stamp}'
+    day = activity.date.strftime('%Y%m%d')
+    if activity.start_time:
+        yield f"DTSTART;TZID=Europe/Amsterdam:{day}T{activity.start_time.replace(':', '')[:4]}00"
+        if activity.end_time:
+            yield f"DTEND;TZID=Europe/Amsterdam:{day}T{activity.end_time.replace(':', '')[:4]}00"
+    else:
+        yield f'DTSTART;VALUE=DATE:{day}'
+        yield f"DTEND;VALUE=DATE:{(activity.date + datetime.timedelta(days=1)).strftime('%Y%m%d')}"
+    yield f'SUMMARY:{_ical_escape(activity.name)}'
+    if activity.location:
+        yield f'LOCATION:{_ical_escape(activity.location)}'
+    details = []
+    if activity.description:
+        details.append(activity.description)
+    if activity.max_participants:
+        details.append(f'Max. deelnemers: {activity.max_participants}')
+    details.append(f'Kosten: €{activity.cost:.2f}' if activity.cost else 'Kosten: Gratis')
+    yield f"DESCRIPTION:{_ical_escape(chr(10).join(details))}"
+    yield f"URL:{url_for('main.view_activity', activity_id=activity.id, _external=True)}"
+    yield 'END:VEVENT'
+
+
+def render_ical_feed(name, activities):
+    """Rendert een iCalendar-feed (RFC 5545) regel voor regel."""
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//Chateau Overdruiven//Activiteiten//NL',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{_ical_escape(name)}',
+        'X-WR-TIMEZONE:Europe/Amsterdam',
+    ]
+    lines.extend(ICAL_TIMEZONE)
+    for activity in activities:
+        lines.extend(_ical_event_lines(activity))
+    lines.append('END:VCALENDAR')
+    return '\r\n'.join(_ical_fold(line) for line in lines) + '\r\n'
+
+
+def ical_response(kind, name, public_only, cache_control):
+    """Geeft de feed terug met een sterke ETag en Last-Modified, of 304 als er niets veranderd is.
+
+    De versie van de feed volgt uit één aggregaat-query (aantal en laatste
+    wijziging van de activiteiten in de feed); pas bij een nieuwe versie wordt
+    er opnieuw gerenderd. Zo werkt de validatie ook over gunicorn-workers heen.
+    """
+    cutoff = datetime.date.today() - datetime.timedelta(days=ICAL_HISTORY_DAYS)
+    filters = [Activity.date >= cutoff]
+    if public_only:
+        filters.append(Activity.is_public == True)
+    count, last_change = db.session.query(func.count(Activity.id), func.max(Activity.updated_at)).filter(*filters).one()
+    etag = hashlib.sha1(f'{kind}:{cutoff}:{count}:{last_change}'.encode()).hexdigest()
+    last_modified = (last_change or datetime.datetime(2025, 1, 1)).astimezone(datetime.timezone.utc)
+
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = Response(status=304)
+    else:
+        with _ical_cache_lock:
+            body = _ical_cache.get((kind, etag))
+        if body is None:
+            activities = Activity.query.filter(*filters).order_by(Activity.date, Activity.id).all()
+            body = render_ical_feed(name, activities)
+            with _ical_cache_lock:
+                _ical_cache[(kind, etag)] = body
+        response = Response(body, mimetype='text/calendar')
+        response.charset = 'utf-8'
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def agenda_feed_serializer():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='agenda-feed')
+
+
+# --- Bankafschriften ---
+
+# Betalingskenmerk zoals getoond op de activiteitspagina: ACT{activity_id}-{user_id}-{ddmm}.
+# Banken vervangen streepjes soms door spaties, dus beide worden geaccepteerd.
+PAYMENT_REFERENCE_PATTERN = re.compile(r'\bACT\s*(\d+)[\s-]+(\d+)[\s-]+(\d{4})\b', re.IGNORECASE)
+BANK_IMPORT_UPDATE_CHUNK = 500
+
+StatementLine = namedtuple('StatementLine', 'line_no amount text')
+
+
+class BankImportReport:
+    """Resultaat van een import: gekoppelde, niet-gekoppelde en dubbelzinnige regels."""
+
+    def __init__(self):
+        self.matched = []      # (StatementLine, payment_id)
+        self.unmatched = []    # (StatementLine, reden) – regels mét kenmerk die niet te koppelen zijn
+        self.ambiguous = []    # (StatementLine, reden)
+        self.without_reference = 0
+        self.debits = 0
+        self.lines = 0
+
+
+def parse_bank_amount(value):
+    """'1.234,56', '-12.50' of '€ 7,00' als float; None als het geen bedrag is."""
+    value = re.sub(r'[^\d,.\-+]', '', value or '')
+    if not re.search(r'\d', value):
+        return None
+    # Het laatste scheidingsteken is het decimaalteken
+    if value.rfind(',') > value.rfind('.'):
+        value = value.replace('.', '').replace(',', '.')
+    else:
+        value = value.replace(',', '')
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def iter_csv_statement(stream):
+    """Leest een CSV-export regel voor regel en levert StatementLines op.
+
+    Het scheidingsteken wordt uit de eerste regel afgeleid. Met een kopregel
+    worden de kolommen 'bedrag'/'amount' en 'af bij'/'debet/credit' herkend;
+    de omschrijving wordt in alle kolommen gezocht.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', errors='replace', newline='')
+    first = text.readline()
+    if not first:
+        return
+    try:
+        dialect = csv.Sniffer().sniff(first, delimiters=',;\t|')
+    except csv.Error:
+        dialect = csv.excel
+    header = next(csv.reader([first], dialect))
+    amount_col = sign_col = None
+    if any(parse_bank_amount(cell) is not None for cell in header):
+        # Geen kopregel: de eerste regel is al een transactie
+        rows = csv.reader(io.StringIO(first), dialect)
+        line_offset = 1
+    else:
+        rows = iter(())
+        line_offset = 2
+        for index, name in enumerate(cell.strip().lower() for cell in header):
+            if amount_col is None and name.startswith(('bedrag', 'amount')):
+                amount_col = index
+            elif sign_col is None and name in ('af bij', 'af/bij', 'debet/credit', 'debit/credit'):
+                sign_col = index
+
+    def rows_with_rest():
+        yield from rows
+        yield from csv.reader(text, dialect)
+
+    for line_no, row in enumerate(rows_with_rest(), start=line_offset):
+        if not row:
+            continue
+        amount = parse_bank_amount(row[amount_col]) if amount_col is not None and amount_col < len(row) else None
+        if amount is not None and sign_col is not None and sign_col < len(row):
+            if row[sign_col].strip().lower() in ('af', 'd', 'debet', 'debit'):
+                amount = -abs(amount)
+        yield StatementLine(line_no, amount, ' '.join(row))
+
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _camt_amount(element, credit_debit):
+    amount = next((parse_bank_amount(child.text) for child in element.iter()
+                   if _local_name(child.tag) == 'Amt'), None)
+    if amount is not None and credit_debit == 'DBIT':
+        amount = -amount
+    return amount
+
+
+def _camt_remittance(element):
+    return ' '.join(child.text.strip() for child in element.iter()
+                    if _local_name(child.tag) in ('Ustrd', 'Ref', 'AddtlNtryInf', 'AddtlTxInf') and child.text)
+
+
+def iter_camt_statement(stream):
+    """Leest een CAMT.053-bestand met iterparse en levert per boeking een StatementLine op.
+
+    Een verzamelboeking met meerdere TxDtls levert één regel per transactie op.
+    Verwerkte <Ntry>-elementen worden direct opgeruimd, zodat het geheugengebruik
+    niet met de grootte van het afschrift meegroeit.
+    """
+    entry_no = 0
+    for _, element in ElementTree.iterparse(stream, events=('end',)):
+        if _local_name(element.tag) != 'Ntry':
+            continue
+        entry_no += 1
+        credit_debit = next((child.text for child in element if _local_name(child.tag) == 'CdtDbtInd'), 'CRDT')
+        details = [child for child in element.iter() if _local_name(child.tag) == 'TxDtls']
+        if len(details) > 1:
+            for detail in details:
+                yield StatementLine(entry_no, _camt_amount(detail, credit_debit), _camt_remittance(detail))
+        else:
+            yield StatementLine(entry_no, _camt_amount(element, credit_debit), _camt_remittance(element))
+        element.clear()
+
+
+def statement_format(filename):
+    """'camt' voor XML-bestanden, anders 'csv'."""
+    return 'camt' if filename.lower().endswith(('.xml', '.053', '.camt')) else 'csv'
+
+
+def open_payments_lookup():
+    """Alle betalingen die op verificatie wachten, op (activity_id, user_id)."""
+    rows = (db.session.query(Payment.id, Payment.activity_id, Payment.user_id,
+                             Activity.date, Activity.cost, User.username, User.email)
+            .join(Activity, Activity.id == Payment.activity_id)
+            .join(User, User.id == Payment.user_id)
+            .filter(Payment.status == 'pending_verification')
+            .all())
+    return {(row.activity_id, row.user_id): row for row in rows}
+
+
+def match_bank_statement(lines, open_payments):
+    """Koppelt afschriftregels aan openstaande betalingen via het betalingskenmerk."""
+    report = BankImportReport()
+    matched_lines = {}
+    for line in lines:
+        report.lines += 1
+        if line.amount is not None and line.amount < 0:
+            report.debits += 1
+            continue
+        references = set(PAYMENT_REFERENCE_PATTERN.findall(line.text))
+        if not references:
+            report.without_reference += 1
+            continue
+        if len(references) > 1:
+            report.ambiguous.append((line, 'meerdere betalingskenmerken in één regel'))
+            continue
+        activity_id, user_id, ddmm = references.pop()
+        key = (int(activity_id), int(user_id))
+        payment = open_payments.get(key)
+        if payment is None:
+            report.unmatched.append((line, 'geen openstaande betaling voor dit kenmerk'))
+        elif payment.date.strftime('%d%m') != ddmm:
+            report.unmatched.append((line, 'datum in het kenmerk hoort niet bij de activiteit'))
+        elif payment.cost and line.amount is not None and line.amount + 0.005 < payment.cost:
+            report.unmatched.append((line, f'bedrag lager dan de kosten (€{payment.cost:.2f})'))
+        elif key in matched_lines:
+            report.ambiguous.append((line, f'kenmerk komt vaker voor (ook regel {matched_lines[key]})'))
+        else:
+            matched_lines[key] = line.line_no
+            report.matched.append((line, payment.id))
+    return report
+
+
+def import_bank_statement(stream, fmt, dry_run=False):
+    """Importeert een afschrift en zet gekoppelde betalingen op 'paid'.
+
+    De betalingen gaan in blokken van BANK_IMPORT_UPDATE_CHUNK per UPDATE naar
+    'paid' en de bevestigingsmails in één INSERT in de wachtrij. Commit gebeurt
+    door de aanroeper.
+    """
+    parse = iter_camt_statement if fmt == 'camt' else iter_csv_statement
+    open_payments = open_payments_lookup()
+    report = match_bank_statement(parse(stream), open_payments)
+    if dry_run or not report.matched:
+        return report
+
+    payment_ids = [payment_id for _, payment_id in report.matched]
+    for start in range(0, len(payment_ids), BANK_IMPORT_UPDATE_CHUNK):
+        (Payment.query
+         .filter(Payment.id.in_(payment_ids[start:start + BANK_IMPORT_UPDATE_CHUNK]),
+                 Payment.status == 'pending_verification')
+         .update({'status': 'paid'}, synchronize_session=False))
+
+    by_id = {row.id: row for row in open_payments.values()}
+    rows = [by_id[payment_id] for payment_id in payment_ids]
+    activities = {activity.id: activity for activity in
+                  Activity.query.filter(Activity.id.in_({row.activity_id for row in rows}))}
+    enqueue_mails([payment_approved_mail(row.username, row.email, activities[row.activity_id])
+                   for row in rows if row.email])
+    return report
+
+
+# --- Archief ---
+# Afgeronde activiteiten verhuizen met hun aanmeldingen en betalingen naar de
+# archived_*-tabellen, zodat de tabellen en indexen die elke pagina raakt klein blijven.
+
+def archivable_activities_query(before):
+    """Ids van activiteiten vóór `before` zonder betalingen die nog geverifieerd moeten worden.
+
+    De activiteit met het hoogste id blijft altijd staan: SQLite geeft een nieuw
+    record anders hetzelfde id, dat dan al in het archief bestaat.
+    """
+    open_payments = (db.select(Payment.id)
+                     .where(Payment.activity_id == Activity.id, Payment.status == 'pending_verification')
+                     .exists())
+    newest_id = db.select(func.max(Activity.id)).scalar_subquery()
+    return (db.session.query(Activity.id)
+            .filter(Activity.date < before, ~open_payments, Activity.id < newest_id)
+            .order_by(Activity.date, Activity.id))
+
+
+def archive_activities(activity_ids):
+    """Kopieert de activiteiten, aanmeldingen en betalingen met INSERT ... SELECT naar het
+    archief en verwijdert ze daarna uit de actieve tabellen. Commit gebeurt door de aanroeper.
+    """
+    now = datetime.datetime.now()
+    activity_columns = ['id', 'name', 'description', 'date', 'start_time', 'end_time', 'max_participants',
+                        'location', 'google_event_id', 'is_public', 'cost', 'organizer_id', 'updated_at']
+    db.session.execute(db.insert(ArchivedActivity).from_select(
+        activity_columns + ['signups_count', 'archived_at'],
+        db.select(*[getattr(Activity, name) for name in activity_columns],
+                  Activity.signups_count, literal(now))
+        .where(Activity.id.in_(activity_ids))))
+    db.session.execute(db.insert(ArchivedSignup).from_select(
+        ['activity_id', 'user_id', 'participant_name'],
+        db.select(Signup.activity_id, Signup.user_id, Signup.participant_name)
+        .where(Signup.activity_id.in_(activity_ids))))
+    db.session.execute(db.insert(ArchivedPayment).from_select(
+        ['user_id', 'activity_id', 'status'],
+        db.select(Payment.user_id, Payment.activity_id, Payment.status)
+        .where(Payment.activity_id.in_(activity_ids))))
+
+    db.session.execute(db.delete(Payment).where(Payment.activity_id.in_(activity_ids)))
+    db.session.execute(db.delete(Signup).where(Signup.activity_id.in_(activity_ids)))
+    db.session.execute(db.delete(Activity).where(Activity.id.in_(activity_ids)))
+
+
+# --- Import en export ---
+# `flask import` en `flask export` verwerken bestanden als stroom: regels worden
+# in blokken gelezen, per blok met één query per controle gevalideerd en met één
+# INSERT weggeschreven. JSON is JSON Lines (één object per regel), zodat ook dat
+# formaat regel voor regel gelezen kan worden.
+
+TRANSFER_KINDS = ('users', 'activities', 'signups')
+USER_ROLES = ('user', 'organizer', 'admin')
+TIME_PATTERN = re.compile(r'^([01]\d|2[0-3]):[0-5]\d$')
+# SQLite vóór 3.32 (de Docker-image heeft 3.27) staat hoogstens 999 parameters per
+# statement toe; een IN-lijst van paren telt twee parameters per waarde
+IMPORT_IN_BATCH = 400
+
+
+class ImportReport:
+    """Resultaat van `flask import`: aantal toegevoegde regels en fouten per regel."""
+
+    def __init__(self):
+        self.inserted = 0
+        self.rows = 0
+        self.errors = []  # (regelnummer, reden)
+
+
+def transfer_format(filename):
+    """'json' voor .json/.jsonl-bestanden, anders 'csv'."""
+    return 'json' if filename.lower().endswith(('.json', '.jsonl', '.ndjson')) else 'csv'
+
+
+def iter_import_records(stream, fmt):
+    """Levert (regelnummer, record, fout) op; record is een dict met tekstwaarden."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record, None
+        return
+    for line_no, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_no, None, f'ongeldige JSON ({e})'
+            continue
+        if not isinstance(record, dict):
+            yield line_no, None, 'verwacht een JSON-object per regel'
+        else:
+            yield line_no, record, None
+
+
+def rows_in_batches(make_query, values):
+    """Voert make_query(stuk) uit per IMPORT_IN_BATCH waarden en levert alle rijen op."""
+    values = list(values)
+    for start in range(0, len(values), IMPORT_IN_BATCH):
+        yield from make_query(values[start:start + IMPORT_IN_BATCH])
+
+
+def _field(record, name):
+    value = record.get(name)
+    return '' if value is None else str(value).strip()
+
+
+def _parse_bool(value):
+    return value.lower() in ('1', 'true', 'ja', 'yes', 'y')
+
+
+def _import_users(records, report, seen, pool, dry_run):
+    """Valideert en voegt een blok gebruikers toe; wachtwoorden worden parallel gehasht."""
+    candidates = []
+    for line_no, record in records:
+        username, email = _field(record, 'username'), _field(record, 'email')
+        password, role = _field(record, 'password'), _field(record, 'role') or 'user'
+        if not username or not email or not password:
+            report.errors.append((line_no, 'username, email en password zijn verplicht'))
+        elif '@' not in email:
+            report.errors.append((line_no, f"ongeldig e-mailadres '{email}'"))
+        elif role not in USER_ROLES:
+            report.errors.append((line_no, f"onbekende rol '{role}'"))
+        elif username.lower() in seen['usernames']:
+            report.errors.append((line_no, f"gebruikersnaam '{username}' staat al eerder in het bestand"))
+        elif email.lower() in seen['emails']:
+            report.errors.append((line_no, f"e-mailadres '{email}' staat al eerder in het bestand"))
+        else:
+            seen['usernames'].add(username.lower())
+            seen['emails'].add(email.lower())
+            candidates.append((line_no, {'username': username, 'email': email, 'role': role}, password))
+    if not candidates:
+        return []
+
+    # Eén query per controle voor het hele blok, niet per regel
+    taken_names = {name for (name,) in rows_in_batches(
+        lambda names: db.session.query(func.lower(User.username)).filter(func.lower(User.username).in_(names)),
+        [row['username'].lower() for _, row, _ in candidates])}
+    taken_emails = {email.lower() for (email,) in rows_in_batches(
+        lambda emails: db.session.query(User.email).filter(User.email.in_(emails)),
+        [row['email'] for _, row, _ in candidates])}
+    valid = []
+    for line_no, row, password in candidates:
+        if row['username'].lower() in taken_names:
+            report.errors.append((line_no, f"gebruiker '{row['username']}' bestaat al"))
+        elif row['email'].lower() in taken_emails:
+            report.errors.append((line_no, f"e-mailadres '{row['email']}' is al in gebruik"))
+        else:
+            valid.append((row, password))
+    if not valid:
+        return []
+
+    method = current_app.config['PASSWORD_HASH_METHOD']
+    passwords = [password for _, password in valid]
+    if dry_run:
+        # Wordt toch teruggedraaid; hashen zou alleen tijd kosten
+        hashes = ['!'] * len(passwords)
+    elif pool is None:
+        hashes = [generate_password_hash(password, method) for password in passwords]
+    else:
+        # Per 8 wachtwoorden naar een kindproces: genoeg werk per bericht, en toch verdeeld
+        hashes = pool.map(generate_password_hash, passwords, [method] * len(passwords), chunksize=8)
+    rows = []
+    for (row, _), password_hash in zip(valid, hashes):
+        row['password_hash'] = password_hash
+        rows.append(row)
+    db.session.execute(db.insert(User), rows)
+    return rows
+
+
+def _import_activities(records, report, seen, pool, dry_run):
+    """Valideert en voegt een blok activiteiten toe, met een outbox-rij per activiteit."""
+    candidates = []
+    for line_no, record in records:
+        name = _field(record, 'name')
+        try:
+            date = datetime.date.fromisoformat(_field(record, 'date'))
+        except ValueError:
+            date = None
+        start_time, end_time = _field(record, 'start_time'), _field(record, 'end_time')
+        max_participants, cost = _field(record, 'max_participants'), _field(record, 'cost')
+        if not name or date is None:
+            report.errors.append((line_no, 'name en date (JJJJ-MM-DD) zijn verplicht'))
+        elif any(value and not TIME_PATTERN.match(value) for value in (start_time, end_time)):
+            report.errors.append((line_no, 'start_time en end_time moeten UU:MM zijn'))
+        elif max_participants and not max_participants.isdigit():
+            report.errors.append((line_no, f"ongeldig max_participants '{max_participants}'"))
+        elif cost and parse_bank_amount(cost) is None:
+            report.errors.append((line_no, f"ongeldige kosten '{cost}'"))
+        elif (name, date) in seen['activities']:
+            report.errors.append((line_no, f"'{name}' op {date} staat al eerder in het bestand"))
+        else:
+            seen['activities'].add((name, date))
+            candidates.append((line_no, _field(record, 'organizer'), {
+                'name': name, 'description': _field(record, 'description') or None, 'date': date,
+                'start_time': start_time or None, 'end_time': end_time or None,
+                'location': _field(record, 'location') or None,
+                'max_participants': int(max_participants) if max_participants else None,
+                'cost': parse_bank_amount(cost) if cost else None,
+                'is_public': _parse_bool(_field(record, 'is_public')),
+                'updated_at': datetime.datetime.now(),
+            }))
+    if not candidates:
+        return []
+
+    organizer_names = {organizer.lower() for _, organizer, _ in candidates if organizer}
+    organizers = dict(rows_in_batches(
+        lambda names: db.session.query(func.lower(User.username), User.id).filter(func.lower(User.username).in_(names)),
+        organizer_names))
+    # Een tweede import van hetzelfde bestand voegt niets dubbel toe
+    existing = set(rows_in_batches(
+        lambda keys: db.session.query(Activity.name, Activity.date).filter(tuple_(Activity.name, Activity.date).in_(keys)),
+        [(row['name'], row['date']) for _, _, row in candidates]))
+    rows = []
+    for line_no, organizer, row in candidates:
+        if organizer and organizer.lower() not in organizers:
+            report.errors.append((line_no, f"organisator '{organizer}' bestaat niet"))
+        elif (row['name'], row['date']) in existing:
+            report.errors.append((line_no, f"'{row['name']}' op {row['date']} bestaat al"))
+        else:
+            row['organizer_id'] = organizers.get(organizer.lower()) if organizer else None
+            rows.append(row)
+    if not rows:
+        return []
+
+    db.session.execute(db.insert(Activity), rows)
+    # Zonder RETURNING (pas vanaf SQLite 3.35): de outbox-rijen komen met INSERT ... SELECT
+    # op (naam, datum), die hierboven uniek is gemaakt binnen het bestand en de database
+    for start in range(0, len(rows), IMPORT_IN_BATCH):
+        keys = [(row['name'], row['date']) for row in rows[start:start + IMPORT_IN_BATCH]]
+        db.session.execute(db.insert(CalendarOutbox).from_select(
+            ['activity_id', 'operation'],
+            db.select(Activity.id, literal('upsert')).where(tuple_(Activity.name, Activity.date).in_(keys))))
+    return rows
+
+
+def _import_signups(records, report, seen, pool, dry_run):
+    """Valideert en voegt een blok aanmeldingen toe, binnen max_participants."""
+    candidates = []
+    for line_no, record in records:
+        activity_id, username = _field(record, 'activity_id'), _field(record, 'username')
+        if not activity_id.isdigit() or not username:
+            report.errors.append((line_no, 'activity_id en username zijn verplicht'))
+        else:
+            candidates.append((line_no, int(activity_id), username))
+    if not candidates:
+        return []
+
+    users = {name: (user_id, username) for name, user_id, username in rows_in_batches(
+        lambda names: db.session.query(func.lower(User.username), User.id, User.username)
+        .filter(func.lower(User.username).in_(names)),
+        {username.lower() for _, _, username in candidates})}
+    activity_ids = {activity_id for _, activity_id, _ in candidates}
+    capacity = dict(rows_in_batches(
+        lambda ids: db.session.query(Activity.id, Activity.max_participants).filter(Activity.id.in_(ids)),
+        activity_ids))
+    taken = dict(rows_in_batches(
+        lambda ids: db.session.query(Signup.activity_id, func.count(Signup.id))
+        .filter(Signup.activity_id.in_(ids)).group_by(Signup.activity_id),
+        activity_ids))
+    pairs = [(activity_id, users[username.lower()][0]) for _, activity_id, username in candidates
+             if username.lower() in users]
+    existing = set(rows_in_batches(
+        lambda keys: db.session.query(Signup.activity_id, Signup.user_id)
+        .filter(tuple_(Signup.activity_id, Signup.user_id).in_(keys)),
+        pairs))
+
+    rows = []
+    for line_no, activity_id, username in candidates:
+        user = users.get(username.lower())
+        if activity_id not in capacity:
+            report.errors.append((line_no, f"activiteit {activity_id} bestaat niet"))
+        elif user is None:
+            report.errors.append((line_no, f"gebruiker '{username}' bestaat niet"))
+        elif (activity_id, user[0]) in existing or (activity_id, user[0]) in seen['signups']:
+            report.errors.append((line_no, f"'{username}' is al aangemeld voor activiteit {activity_id}"))
+        elif capacity[activity_id] is not None and taken.get(activity_id, 0) >= capacity[activity_id]:
+            report.errors.append((line_no, f"activiteit {activity_id} is vol"))
+        else:
+            seen['signups'].add((activity_id, user[0]))
+            taken[activity_id] = taken.get(activity_id, 0) + 1
+            rows.append({'activity_id': activity_id, 'user_id': user[0], 'participant_name': user[1]})
+    if rows:
+        db.session.execute(db.insert(Signup), rows)
+    return rows
+
+
+IMPORTERS = {'users': _import_users, 'activities': _import_activities, 'signups': _import_signups}
+
+
+def import_records(kind, stream, fmt, chunk_size=500, dry_run=False, pool=None):
+    """Importeert `kind` uit een CSV- of JSON Lines-stroom, in blokken van `chunk_size`.
+
+    Elk blok is één transactie: foute regels komen in het rapport, de goede
+    regels van het blok worden toegevoegd. Met `pool` (een ProcessPoolExecutor)
+    worden wachtwoorden van gebruikers parallel gehasht.
+    """
+    importer = IMPORTERS[kind]
+    report = ImportReport()
+    seen = {'usernames': set(), 'emails': set(), 'activities': set(), 'signups': set()}
+    records = iter_import_records(stream, fmt)
+    while True:
+        batch = list(itertools.islice(records, chunk_size))
+        if not batch:
+            break
+        report.rows += len(batch)
+        chunk = []
+        for line_no, record, error in batch:
+            if error:
+                report.errors.append((line_no, error))
+            else:
+                chunk.append((line_no, record))
+        if not chunk:
+            continue
+        inserted = importer(chunk, report, seen, pool, dry_run)
+        if dry_run:
+            db.session.rollback()
+        else:
+            db.session.commit()
+        report.inserted += len(inserted)
+    report.errors.sort()
+    return report
+
+
+EXPORT_COLUMNS = {
+    # Wachtwoordhashes worden nooit geëxporteerd
+    'users': lambda: [User.id, User.username, User.email, User.role],
+    'activities': lambda: [Activity.id, Activity.name, Activity.description, Activity.date, Activity.start_time,
+                           Activity.end_time, Activity.location, Activity.max_participants, Activity.cost,
+                           Activity.is_public, User.username.label('organizer')],
+    'signups': lambda: [Signup.id, Signup.activity_id, User.username, Signup.participant_name],
+}
+
+
+def export_query(kind):
+    columns = EXPORT_COLUMNS[kind]()
+    query = db.select(*columns)
+    if kind == 'activities':
+        query = query.outerjoin(User, User.id == Activity.organizer_id).order_by(Activity.id)
+    elif kind == 'signups':
+        query = query.select_from(Signup).outerjoin(User, User.id == Signup.user_id).order_by(Signup.id)
+    else:
+        query = query.order_by(User.id)
+    return query
+
+
+def export_records(kind, stream, fmt, batch_size=1000):
+    """Schrijft `kind` als CSV of JSON Lines naar `stream` en geeft het aantal rijen terug.
+
+    De rijen worden met yield_per per `batch_size` uit de database gehaald, dus
+    het geheugengebruik hangt niet af van de grootte van de tabel.
+    """
+    query = export_query(kind)
+    names = [column.name for column in query.selected_columns]
+    result = db.session.execute(query.execution_options(yield_per=batch_size))
+    if fmt == 'csv':
+        writer = csv.writer(stream)
+        writer.writerow(names)
+    count = 0
+    for row in result:
+        values = [value.isoformat() if isinstance(value, datetime.date) else value for value in row]
+        if fmt == 'csv':
+            writer.writerow(values)
+        else:
+            stream.write(json.dumps(dict(zip(names, values)), ensure_ascii=False) + '\n')
+        count += 1
+    return count
+
+
+# --- Page Cache ---
+
+class MemoryPageCache:
+    """Paginacache in het geheugen van het huidige proces.
+
+    Een backend heeft `get(key)`, `set(key, value)` en `clear()` nodig. Andere
+    processen merken een invalidatie hier niet, dus alleen bedoeld voor
+    ontwikkeling en tests met één proces.
+    """
+
+    def __init__(self, timeout):
+        self._cache = TTLCache(maxsize=64, ttl=timeout)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._cache.get(key)
+
+    def set(self, key, value):
+        with self._lock:
+            self._cache[key] = value
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+class FileSystemPageCache:
+    """Paginacache in een map, gedeeld door alle processen die de map zien."""
+
+    def __init__(self, timeout, directory):
+        self.timeout = timeout
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                expires, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        return value if expires > time.time() else None
+
+    def set(self, key, value):
+        # Eerst naar een tijdelijk bestand, zodat andere workers nooit een half bestand lezen
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((time.time() + self.timeout, value), f)
+        os.replace(tmp_path, self._path(key))
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+
+def make_page_cache(config):
+    cache_type = config['PAGE_CACHE_TYPE']
+    if cache_type == 'memory':
+        return MemoryPageCache(config['PAGE_CACHE_TIMEOUT'])
+    if cache_type == 'filesystem':
+        return FileSystemPageCache(config['PAGE_CACHE_TIMEOUT'], config['PAGE_CACHE_DIR'])
+    module_name, _, class_name = cache_type.partition(':')
+    backend = getattr(importlib.import_module(module_name), class_name)
+    return backend(config['PAGE_CACHE_TIMEOUT'])
+
+
+def get_page_cache():
+    return current_app.extensions['page_cache']
+
+
+@event.listens_for(Session, 'before_flush')
+def _track_activity_changes(session, flush_context, instances):
+    if any(isinstance(obj, Activity) for obj in (*session.new, *session.dirty, *session.deleted)):
+        session.info['activities_changed'] = True
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _track_activity_bulk_changes(orm_execute_state):
+    if (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete) and \
+            orm_execute_state.bind_mapper is not None and orm_execute_state.bind_mapper.class_ is Activity:
+        orm_execute_state.session.info['activities_changed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_page_cache(session):
+    # Sessies buiten een app-context (bv. in een losse thread) hebben geen cache om te legen
+    if session.info.pop('activities_changed', False) and has_app_context():
+        get_page_cache().clear()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_activity_changes(session):
+    session.info.pop('activities_changed', None)
+
+
+# --- SQL-instrumentatie ---
+class QueryBudgetExceeded(RuntimeError):
+    """Strikte modus: een request doet te veel queries of herhaalt dezelfde query (N+1)."""
+
+
+class RequestQueryStats:
+    """Aantal queries, totale DB-tijd en de traagste query van één request."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.slowest = 0.0
+        self.slowest_statement = None
+        self.shapes = {}
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.duration += duration
+        if duration > self.slowest:
+            self.slowest, self.slowest_statement = duration, statement
+        # De statements zijn geparametriseerd, dus dezelfde tekst is dezelfde 'vorm'
+        self.shapes[statement] = self.shapes.get(statement, 0) + 1
+        return self.shapes[statement]
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info['query_start'].pop()
+    if not has_request_context() or 'sql_stats' not in g:
+        return
+    repeats = g.sql_stats.record(statement, duration)
+    config = current_app.config
+    if config['SQL_STRICT']:
+        if g.sql_stats.count > config['SQL_QUERY_BUDGET']:
+            raise QueryBudgetExceeded(
+                f"{request.endpoint}: meer dan {config['SQL_QUERY_BUDGET']} queries in één request")
+        if repeats >= config['SQL_REPEAT_LIMIT']:
+            raise QueryBudgetExceeded(
+                f"{request.endpoint}: dezelfde query {repeats} keer uitgevoerd (N+1?): {statement}")
+
+
+@bp.before_app_request
+def _start_query_stats():
+    g.sql_stats = RequestQueryStats()
+    g.request_started = time.perf_counter()
+
+
+@bp.after_app_request
+def _report_query_stats(response):
+    stats = g.get('sql_stats')
+    if stats is None:
+        return response
+    total = time.perf_counter() - g.request_started
+    if current_app.config['SQL_SERVER_TIMING']:
+        response.headers.add('Server-Timing', f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries"')
+        response.headers.add('Server-Timing', f'db-slowest;dur={stats.slowest * 1000:.1f}')
+        response.headers.add('Server-Timing', f'app;dur={total * 1000:.1f}')
+    if current_app.config['SQL_LOG_REQUESTS']:
+        current_app.logger.info(json.dumps({
+            'event': 'request',
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'duration_ms': round(total * 1000, 2),
+            'sql_count': stats.count,
+            'sql_ms': round(stats.duration * 1000, 2),
+            'sql_slowest_ms': round(stats.slowest * 1000, 2),
+            'sql_slowest': stats.slowest_statement,
+        }))
+    return response
+
+
+# --- Statische bestanden ---
+# `flask build-assets` schrijft kopieën met een hash van de inhoud in de naam naar
+# static/dist, plus .gz/.br-varianten en WebP/AVIF-versies van de afbeeldingen. Omdat
+# de naam verandert zodra de inhoud verandert, mogen browsers ze een jaar bewaren.
+ASSET_DIR = 'dist'
+ASSET_MANIFEST = 'manifest.json'
+ASSET_MAX_AGE = 365 * 24 * 3600
+ASSET_COMPRESSIBLE = ('.css', '.js', '.svg', '.txt')
+ASSET_IMAGE_FORMATS = { # mimetype: (Pillow-formaat, extensie, opslagopties)
+    'image/avif': ('AVIF', '.avif', {'quality': 60}),
+    'image/webp': ('WEBP', '.webp', {'quality': 85, 'method': 6}),
+}
+
+
+def load_asset_manifest(static_folder):
+    """Leest static/dist/manifest.json; zonder build zijn er gewoon geen fingerprints."""
+    try:
+        with open(os.path.join(static_folder, ASSET_DIR, ASSET_MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def asset_url(filename):
+    """Zoals url_for('static', ...), maar naar de versie met fingerprint als die gebouwd is."""
+    entry = current_app.extensions['asset_manifest'].get(filename)
+    if entry is None:
+        return url_for('static', filename=filename)
+    return url_for('main.asset', filename=entry['file'])
+
+
+def asset_sources(filename):
+    """(mimetype, url) van de kleinere beeldformaten, voor <source> in een <picture>."""
+    entry = current_app.extensions['asset_manifest'].get(filename, {})
+    return [(mimetype, url_for('main.asset', filename=entry[mimetype]))
+            for mimetype in ASSET_IMAGE_FORMATS if mimetype in entry]
+
+
+def _fingerprinted_name(relative_path, digest, extension=None):
+    stem, ext = os.path.splitext(relative_path)
+    return f'{stem}.{digest}{extension or ext}'.replace(os.sep, '/')
+
+
+def build_assets(static_folder):
+    """Bouwt static/dist en het manifest. Geeft het manifest terug.
+
+    Brotli en Pillow zijn optioneel: ontbreken ze, dan worden de .br-bestanden
+    respectievelijk de WebP/AVIF-versies overgeslagen.
+    """
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+    try:
+        from PIL import Image, features
+    except ImportError:
+        Image = None
+
+    output = os.path.join(static_folder, ASSET_DIR)
+    manifest = {}
+    for root, dirs, files in os.walk(static_folder):
+        # Eerder gebouwde bestanden niet opnieuw verwerken
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != output]
+        for name in sorted(files):
+            source = os.path.join(root, name)
+            relative = os.path.relpath(source, static_folder).replace(os.sep, '/')
+            with open(source, 'rb') as f:
+                content = f.read()
+            digest = hashlib.sha256(content).hexdigest()[:12]
+            target_name = _fingerprinted_name(relative, digest)
+            target = os.path.join(output, target_name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(source, target)
+            entry = {'file': target_name}
+
+            if name.endswith(ASSET_COMPRESSIBLE):
+                with open(target + '.gz', 'wb') as f:
+                    # mtime=0 zodat dezelfde invoer altijd hetzelfde bestand oplevert
+                    f.write(gzip.compress(content, compresslevel=9, mtime=0))
+                if brotli is not None:
+                    with open(target + '.br', 'wb') as f:
+                        f.write(brotli.compress(content, quality=11))
+
+            if Image is not None and mimetypes.guess_type(name)[0] in ('image/png', 'image/jpeg'):
+                with Image.open(source) as image:
+                    for mimetype, (image_format, extension, options) in ASSET_IMAGE_FORMATS.items():
+                        if not features.check(image_format.lower()):
+                            continue
+                        variant_name = _fingerprinted_name(relative, digest, extension)
+                        variant = os.path.join(output, variant_name)
+                        image.save(variant, image_format, **options)
+                        # Alleen aanbieden als het echt kleiner is dan het origineel
+                        if os.path.getsize(variant) < len(content):
+                            entry[mimetype] = variant_name
+                        else:
+                            os.remove(variant)
+            manifest[relative] = entry
+
+    with open(os.path.join(output, ASSET_MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
 # --- Helper Functions and Decorators ---
 
 
-@app.context_processor
+def get_current_user():
+    """De ingelogde gebruiker van dit request, of None.
+
+    Wordt op flask.g bewaard, dus hoogstens één query per request. Naam en rol
+    komen uit de database en niet uit de cookie, zodat een rolwijziging door een
+    admin meteen doorwerkt.
+    """
+    user_id = session.get('user_id') if session.get('logged_in') else None
+    # Ook op user_id controleren: in tests en CLI-commando's delen requests soms één app-context
+    if 'current_user' not in g or g.current_user_id != user_id:
+        g.current_user_id = user_id
+        g.current_user = db.session.get(User, user_id) if user_id else None
+        if user_id and g.current_user is None:
+            # Account is intussen verwijderd: behandel als uitgelogd
+            session.clear()
+    return g.current_user
+
+@bp.app_context_processor
 def inject_is_admin():
     return dict(is_admin=is_admin)
 
+@bp.app_context_processor
+def inject_asset_helpers():
+    return dict(asset_url=asset_url, asset_sources=asset_sources)
+
 def is_admin():
-    if not session.get('logged_in'):
-        return False
-    # Een gebruiker is admin als de username 'admin' is OF als de rol 'admin' is.
-    return session.get('username') == 'admin' or session.get('role') == 'admin'
+    user = get_current_user()
+    return user is not None and user.is_admin
 
 # In app.py (bij de andere helper functions)
 
 # Helper om te checken of iemand admin OF organizer is
 def is_organizer():
-    if not session.get('logged_in'):
-        return False
-    # Admins mogen alles wat een organizer mag
-    return is_admin() or session.get('role') == 'organizer'
+    user = get_current_user()
+    return user is not None and user.is_organizer
 
 def organizer_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if not is_organizer():
             flash('Je hebt geen rechten om activiteiten aan te maken.', 'danger')
-            return redirect(url_for('activiteiten'))
+            return redirect(url_for('main.activiteiten'))
         return f(*args, **kwargs)
     return decorated_function
 
 # Voeg de nieuwe helper toe aan de context voor gebruik in templates
-@app.context_processor
+@bp.app_context_processor
 def inject_permissions():
-    return dict(is_admin=is_admin, is_organizer=is_organizer)
+    # Lui: de gebruiker wordt pas opgehaald als een template current_user echt gebruikt
+    return dict(is_admin=is_admin, is_organizer=is_organizer, current_user=LocalProxy(get_current_user))
 
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'logged_in' not in session or not session['logged_in']:
+        if get_current_user() is None:
             flash('Meld je aan om toegang te krijgen tot deze pagina.', 'warning')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
         return f(*args, **kwargs)
     return decorated_function
 
@@ -211,32 +2212,135 @@ def admin_required(f):
     def decorated_function(*args, **kwargs):
         if not is_admin():
             flash('Je hebt geen rechten om deze pagina te bekijken.', 'danger')
-            return redirect(url_for('index'))
+            return redirect(url_for('main.activiteiten'))
         return f(*args, **kwargs)
     return decorated_function
 
+def keyset_page(query, columns, cursor, parsers, descending=True, page_size=None):
+    """Haalt één pagina op met keyset-paginatie over `columns` (bv. datum + id).
+
+    `cursor` is de sleutel van de laatste rij van de vorige pagina, als string
+    ('2030-01-02_15'); `parsers` zetten de delen weer om naar waarden. In plaats
+    van OFFSET wordt er verder gezocht vanaf die sleutel, zodat elke pagina via
+    de index even snel is, hoe ver je ook bladert.
+    Geeft (rijen, cursor voor de volgende pagina of None) terug.
+    """
+    page_size = page_size or current_app.config['ADMIN_PAGE_SIZE']
+    values = parse_keyset_cursor(cursor, parsers)
+    if values:
+        key = tuple_(*columns)
+        query = query.filter(key < tuple_(*values) if descending else key > tuple_(*values))
+    query = query.order_by(*[c.desc() if descending else c.asc() for c in columns])
+    rows = query.limit(page_size + 1).all()
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    last = rows[-1]
+    next_cursor = '_'.join(
+        value.isoformat() if hasattr(value, 'isoformat') else str(value)
+        for value in (getattr(last, column.key) for column in columns))
+    return rows, next_cursor
+
+
+def parse_keyset_cursor(cursor, parsers):
+    """Zet een cursor als '2030-01-02_15' om naar waarden; None zonder cursor, 400 bij een ongeldige."""
+    if not cursor:
+        return None
+    parts = cursor.split('_')
+    if len(parts) != len(parsers):
+        abort(400)
+    try:
+        return [parse(part) for parse, part in zip(parsers, parts)]
+    except ValueError:
+        abort(400)
+
+
+def parse_date_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        return None
+
+
 # --- Routes (Website URLs) ---
-@app.route('/')
+@bp.route('/static/dist/<path:filename>')
+def asset(filename):
+    """Serveert gebouwde assets, voorgecomprimeerd als de browser dat aankan."""
+    directory = os.path.join(current_app.static_folder, ASSET_DIR)
+    mimetype = mimetypes.guess_type(filename)[0]
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if request.accept_encodings[encoding] and os.path.isfile(os.path.join(directory, filename + suffix)):
+            response = send_from_directory(directory, filename + suffix, mimetype=mimetype, max_age=ASSET_MAX_AGE)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(directory, filename, max_age=ASSET_MAX_AGE)
+    response.vary.add('Accept-Encoding')
+    # De naam bevat een hash van de inhoud, dus hij verandert nooit
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@bp.route('/')
 def public_home():
     today = datetime.date.today()
+    # Alleen anonieme bezoekers zonder flash-meldingen krijgen dezelfde pagina te zien
+    cacheable = get_current_user() is None and not session.get('_flashes')
+    cache_key = f'public_home:{today.isoformat()}'
+    if cacheable:
+        page = get_page_cache().get(cache_key)
+        if page is not None:
+            return page
     public_activities = Activity.query.filter(Activity.is_public == True, Activity.date >= today).order_by(Activity.date).all()
-    return render_template('public_home.html', activities=public_activities)
+    page = render_template('public_home.html', activities=public_activities)
+    if cacheable:
+        get_page_cache().set(cache_key, page)
+    return page
 
-@app.route('/agenda')
+@bp.route('/agenda')
 @login_required
 def agenda():
-    return render_template('agenda.html')
+    token = agenda_feed_serializer().dumps(session['user_id'])
+    feed_url = url_for('main.member_agenda_feed', token=token, _external=True)
+    return render_template('agenda.html', feed_url=feed_url)
+
 
+@bp.route('/agenda.ics')
+def public_agenda_feed():
+    """Openbare activiteiten als iCalendar-feed."""
+    return ical_response('public', 'Chateau Overdruiven', public_only=True,
+                         cache_control='public, max-age=300')
 
-@app.route('/activiteiten')
+
+@bp.route('/agenda/<token>.ics')
+def member_agenda_feed(token):
+    """Alle activiteiten voor leden; agenda-apps sturen geen cookies mee, dus de link zelf is de sleutel."""
+    try:
+        user_id = agenda_feed_serializer().loads(token)
+    except BadSignature:
+        abort(404)
+    if db.session.get(User, user_id) is None:
+        abort(404)
+    return ical_response('members', 'Chateau Overdruiven (leden)', public_only=False,
+                         cache_control='private, max-age=300')
+
+
+@bp.route('/activiteiten')
 @login_required
 def activiteiten():
     today = datetime.date.today()
-    activities = Activity.query.filter(Activity.date >= today).order_by(Activity.date).all()
+    activities = (Activity.query
+                  .options(undefer(Activity.signups_count))
+                  .filter(Activity.date >= today)
+                  .order_by(Activity.date)
+                  .all())
     return render_template('index.html', activities=activities)
 
 
-@app.route('/add_activity', methods=['GET', 'POST'])
+@bp.route('/add_activity', methods=['GET', 'POST'])
 @login_required
 @organizer_required
 def add_activity():
@@ -256,7 +2360,30 @@ def add_activity():
         
         max_participants = int(max_participants_str) if max_participants_str else None
         date_obj = datetime.datetime.strptime(date_str, '%Y-%m-%d').date()
-        
+
+        frequency = request.form.get('repeat')
+        if frequency in SERIES_FREQUENCIES:
+            until_str = request.form.get('repeat_until')
+            until = datetime.datetime.strptime(until_str, '%Y-%m-%d').date() if until_str else None
+            if until and until < date_obj:
+                flash('De einddatum van de herhaling ligt vóór de eerste datum.', 'danger')
+                return render_template('add_activity.html', organizers=organizers, series_frequencies=SERIES_FREQUENCIES)
+            series = ActivitySeries(
+                name=name, description=description, date=date_obj, start_time=start_time,
+                end_time=end_time, location=location, max_participants=max_participants,
+                is_public=is_public, cost=cost, organizer_id=organizer_id,
+                frequency=frequency, interval=max(request.form.get('repeat_interval', 1, type=int), 1),
+                until=until, google_event_id=new_google_event_id(),
+            )
+            db.session.add(series)
+            db.session.flush()
+            # Alle keren in één INSERT en één terugkerend event in Google Agenda
+            created = materialize_series(series, series_window_end())
+            enqueue_series_sync(series)
+            db.session.commit()
+            flash(f'Terugkerende activiteit toegevoegd: {created} keer ingepland.', 'success')
+            return redirect(url_for('main.activiteiten'))
+
         new_activity = Activity(
             name=name, 
             description=description, 
@@ -269,55 +2396,31 @@ def add_activity():
             cost=cost,
             organizer_id=organizer_id
         )
-        try:
-            service = get_calendar_service()
-            start_datetime_str = f"{date_str}T{start_time}:00" if start_time else f"{date_str}"
-            end_datetime_str = f"{date_str}T{end_time}:00" if end_time else f"{date_str}"
-            event_body = {
-                'summary': name, 'location': location, 'description': description,
-                'start': {'timeZone': 'Europe/Amsterdam'}, 'end': {'timeZone': 'Europe/Amsterdam'},
-            }
-            if start_time and end_time:
-                event_body['start']['dateTime'] = start_datetime_str
-                event_body['end']['dateTime'] = end_datetime_str
-            else:
-                event_body['start']['date'] = date_str
-                event_body['end']['date'] = date_str
-            created_event = service.events().insert(calendarId=CALENDAR_ID, body=event_body).execute()
-            new_activity.google_event_id = created_event['id']
-            flash(f"Activiteit '{name}' ook toegevoegd aan Google Agenda!", 'info')
-        except FileNotFoundError:
-            flash(f"Fout: Service account bestand niet gevonden. Google Agenda niet bijgewerkt.", 'warning')
-            print(f"Google Calendar Error: Service account file not found at {SERVICE_ACCOUNT_FILE}")
-        except Exception as e:
-            flash(f"Fout bij toevoegen aan Google Agenda: {e}", 'warning')
-            print(f"Google Calendar Error: {e}")
         db.session.add(new_activity)
-        # ... code om de activiteit te verwijderen ...
+        db.session.flush()
+        # Google Agenda wordt op de achtergrond bijgewerkt door `flask calendar-worker`
+        enqueue_calendar_sync(new_activity, 'upsert')
         db.session.commit()
         flash('Activiteit succesvol toegevoegd!', 'success') # Changed message
-        return redirect(url_for('activiteiten'))
-    return render_template('add_activity.html', organizers=organizers)
+        return redirect(url_for('main.activiteiten'))
+    return render_template('add_activity.html', organizers=organizers, series_frequencies=SERIES_FREQUENCIES)
 
-@app.route('/activity/<int:activity_id>')
+@bp.route('/activity/<int:activity_id>')
 def view_activity(activity_id):
-    activity = Activity.query.get_or_404(activity_id)
-    signups = Signup.query.filter_by(activity_id=activity.id).all()
-    
-    user = None # Begin met user als None voor gasten
-    user_payment = None
-    if 'logged_in' in session:
-        user = User.query.filter_by(username=session['username']).first()
-        if user: # Alleen als de gebruiker daadwerkelijk gevonden is
-            user_payment = Payment.query.filter_by(user_id=user.id, activity_id=activity.id).first()
+    activity = Activity.query.options(joinedload(Activity.organizer), joinedload(Activity.series)).get_or_404(activity_id)
+    # Aanmeldingen en hun gebruikers in één query (i.p.v. één User-query per aanmelding)
+    signups = (Signup.query
+               .options(joinedload(Signup.user))
+               .filter_by(activity_id=activity.id)
+               .order_by(Signup.id)
+               .all())
+
+    user = get_current_user() # None voor gasten
 
     # Haal alle betalingen voor deze activiteit op voor de admin-weergave
     payments_list = Payment.query.filter_by(activity_id=activity.id).all()
     payments_by_user = {p.user_id: p for p in payments_list}
-    
-    # Voeg de user objecten toe aan de signups (nodig voor admin-weergave)
-    for signup in signups:
-        signup.user = User.query.filter_by(username=signup.participant_name).first()
+    user_payment = payments_by_user.get(user.id) if user else None
 
     # Geef alle benodigde data, INCLUSIEF 'user', mee aan de template
     return render_template(
@@ -326,27 +2429,25 @@ def view_activity(activity_id):
         signups=signups, 
         user_payment=user_payment, 
         payments_by_user=payments_by_user,
-        user=user  # <-- DEZE VARIABELE ONTBRAK
+        user=user,  # <-- DEZE VARIABELE ONTBRAK
+        series_frequencies=SERIES_FREQUENCIES
     )
 
 
 # In app.py
-@app.route('/confirm_payment/<int:activity_id>', methods=['POST'])
+@bp.route('/confirm_payment/<int:activity_id>', methods=['POST'])
 @login_required
 def confirm_payment(activity_id):
     activity = Activity.query.get_or_404(activity_id)
-    user = User.query.filter_by(username=session['username']).first()
-
-    # Meld de gebruiker aan als dat nog niet is gebeurd.
-    existing_signup = Signup.query.filter_by(activity_id=activity.id, participant_name=user.username).first()
-    if not existing_signup:
-        if activity.max_participants is not None and activity.signups_count >= activity.max_participants:
-            flash(f'Helaas, de activiteit "{activity.name}" is zojuist vol geraakt.', 'warning')
-            return redirect(url_for('view_activity', activity_id=activity.id))
-            
-        new_signup = Signup(activity_id=activity.id, participant_name=user.username)
-        db.session.add(new_signup)
+    user = get_current_user()
+
+    # Meld de gebruiker aan als dat nog niet is gebeurd; de capaciteit wordt in de database bewaakt.
+    if reserve_signup(activity.id, user):
         flash(f'Je bent succesvol aangemeld voor {activity.name}!', 'success')
+    elif not Signup.query.filter_by(activity_id=activity.id, user_id=user.id).first():
+        db.session.rollback()
+        flash(f'Helaas, de activiteit "{activity.name}" is zojuist vol geraakt.', 'warning')
+        return redirect(url_for('main.view_activity', activity_id=activity.id))
 
     # Alleen betalingslogica uitvoeren als er kosten zijn
     if activity.cost and activity.cost > 0:
@@ -358,26 +2459,44 @@ def confirm_payment(activity_id):
         payment.status = 'pending_verification'
         flash('Bedankt! Je betaling wordt zo snel mogelijk geverifieerd.', 'info')
 
-    db.session.commit()
-    return redirect(url_for('view_activity', activity_id=activity.id))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Dubbele klik: een gelijktijdig request heeft de betaling al vastgelegd
+        db.session.rollback()
+    return redirect(url_for('main.view_activity', activity_id=activity.id))
 
-@app.route('/delete_activity/<int:activity_id>', methods=['POST'])
+@bp.route('/delete_activity/<int:activity_id>', methods=['POST'])
 @admin_required
 def delete_activity(activity_id):
     activity = Activity.query.get_or_404(activity_id)
-    if activity.google_event_id:
-        try:
-            service = get_calendar_service()
-            service.events().delete(calendarId=CALENDAR_ID, eventId=activity.google_event_id).execute()
-            flash(f"Activiteit '{activity.name}' ook verwijderd uit Google Agenda!", 'info')
-        except Exception as e:
-            flash(f"Fout bij verwijderen uit Google Agenda: {e}", 'warning')
+    # Ook zonder event-id: de delete maakt eventuele nog wachtende upserts overbodig
+    enqueue_calendar_sync(activity, 'delete')
     db.session.delete(activity)
     db.session.commit()
     flash('Activiteit succesvol verwijderd!', 'success')
-    return redirect(url_for('activiteiten'))
+    return redirect(url_for('main.activiteiten'))
+
+@bp.route('/series/<int:series_id>/stop', methods=['POST'])
+@admin_required
+def stop_series(series_id):
+    """Laat een serie na vandaag stoppen; de komende keren verdwijnen, eerdere blijven staan.
+
+    In Google Agenda krijgt het hoofd-event een UNTIL, zodat ook daar de komende
+    keren in één aanroep verdwijnen.
+    """
+    series = ActivitySeries.query.get_or_404(series_id)
+    series.until = max(datetime.date.today(), series.date)
+    series.materialized_until = series.until
+    upcoming = Activity.query.filter(Activity.series_id == series.id, Activity.date > series.until).all()
+    for activity in upcoming:
+        db.session.delete(activity)
+    enqueue_series_sync(series)
+    db.session.commit()
+    flash(f'Serie "{series.name}" gestopt; {len(upcoming)} komende activiteit(en) verwijderd.', 'success')
+    return redirect(url_for('main.activiteiten'))
 
-@app.route('/edit_activity/<int:activity_id>', methods=['GET', 'POST'])
+@bp.route('/edit_activity/<int:activity_id>', methods=['GET', 'POST'])
 @login_required
 @organizer_required
 def edit_activity(activity_id):
@@ -400,78 +2519,147 @@ def edit_activity(activity_id):
         activity.cost = float(cost_str) if cost_str else None
         activity.organizer_id = request.form.get('organizer_id')
 
-        # Update Google Calendar Event
-        if activity.google_event_id:
-            try:
-                service = get_calendar_service()
-                event = service.events().get(calendarId=CALENDAR_ID, eventId=activity.google_event_id).execute()
-
-                event['summary'] = activity.name
-                event['description'] = activity.description
-                event['location'] = activity.location
-                
-                if activity.start_time and activity.end_time:
-                    event['start']['dateTime'] = f"{date_str}T{activity.start_time}:00"
-                    event['end']['dateTime'] = f"{date_str}T{activity.end_time}:00"
-                else:
-                    event['start']['date'] = date_str
-                    event['end']['date'] = date_str
-
-                service.events().update(calendarId=CALENDAR_ID, eventId=activity.google_event_id, body=event).execute()
-                flash('Google Agenda-evenement succesvol bijgewerkt!', 'info')
-            except Exception as e:
-                flash(f"Fout bij bijwerken van Google Agenda: {e}", 'warning')
+        # Google Agenda wordt op de achtergrond bijgewerkt door `flask calendar-worker`
+        enqueue_calendar_sync(activity, 'upsert')
         
         db.session.commit()
         flash('Activiteit succesvol bijgewerkt!', 'success')
-        return redirect(url_for('view_activity', activity_id=activity.id))
+        return redirect(url_for('main.view_activity', activity_id=activity.id))
 
     # GET request: toon het formulier met de huidige data
     return render_template('edit_activity.html', activity=activity, organizers=organizers)
 
-@app.route('/delete_signup/<int:signup_id>', methods=['POST'])
+@bp.route('/delete_signup/<int:signup_id>', methods=['POST'])
 @admin_required
 def delete_signup(signup_id):
     signup = Signup.query.get_or_404(signup_id)
     activity_id = signup.activity_id
-    participant_name = signup.participant_name
+    participant_name = signup.display_name
     db.session.delete(signup)
     db.session.commit()
     flash(f'Aanmelding van {participant_name} verwijderd!', 'success')
-    return redirect(url_for('view_activity', activity_id=activity_id))
+    return redirect(url_for('main.view_activity', activity_id=activity_id))
 
-@app.route('/admin/activities')
+@bp.route('/admin/activities')
 @admin_required
 def admin_activities():
-    """Toont een overzicht van alle activiteiten, inclusief die in het verleden."""
+    """Toont een overzicht van alle activiteiten, inclusief die in het verleden.
+
+    Met ?archive=1 komen de gearchiveerde activiteiten er via een UNION ALL bij;
+    standaard blijft de query bij de (kleine) actieve tabel.
+    """
     # Voeg 'today' toe voor gebruik in de template
     today = datetime.date.today() 
-    activities = Activity.query.order_by(Activity.date.desc()).all()
+    date_from = parse_date_arg('date_from')
+    date_to = parse_date_arg('date_to')
+    include_archive = request.args.get('archive') == '1'
+
+    def date_filters(model):
+        filters = []
+        if date_from:
+            filters.append(model.date >= date_from)
+        if date_to:
+            filters.append(model.date <= date_to)
+        return filters
+
+    if include_archive:
+        cursor = parse_keyset_cursor(request.args.get('after'), [datetime.date.fromisoformat, int])
+
+        def branch(model, *columns):
+            # Elke tak haalt via zijn eigen datumindex hoogstens één pagina op, zodat
+            # alleen die rijen samengevoegd en gesorteerd worden en niet beide tabellen
+            filters = date_filters(model)
+            if cursor:
+                filters.append(tuple_(model.date, model.id) < tuple_(*cursor))
+            return db.select(db.select(model.id, model.name, model.date, model.max_participants, *columns)
+                             .where(*filters)
+                             .order_by(model.date.desc(), model.id.desc())
+                             .limit(current_app.config['ADMIN_PAGE_SIZE'] + 1)
+                             .subquery())
+
+        listing = db.union_all(
+            branch(Activity, Activity.signups_count.label('signups_count'), literal(False).label('archived')),
+            branch(ArchivedActivity, ArchivedActivity.signups_count, literal(True).label('archived')),
+        ).subquery()
+        query, columns = db.session.query(listing), [listing.c.date, listing.c.id]
+    else:
+        query = Activity.query.options(undefer(Activity.signups_count)).filter(*date_filters(Activity))
+        columns = [Activity.date, Activity.id]
+    activities, next_cursor = keyset_page(query, columns, request.args.get('after'),
+                                          [datetime.date.fromisoformat, int])
+    filters = {k: v for k, v in (('date_from', date_from), ('date_to', date_to),
+                                 ('archive', '1' if include_archive else None)) if v}
     # Geef 'today' mee aan de render_template functie
-    return render_template('admin_activities.html', activities=activities, today=today)
+    return render_template('admin_activities.html', activities=activities, today=today,
+                           filters=filters, next_cursor=next_cursor)
 
-# --- app.py ---
+def activity_finance_query():
+    """Per activiteit het aantal aanmeldingen en betalingen per status, in één GROUP BY."""
+    def count_status(status):
+        return func.coalesce(func.sum(case((Payment.status == status, 1), else_=0)), 0).label(status)
 
+    return (db.session.query(Activity.id, Activity.name, Activity.date, Activity.cost, Activity.max_participants,
+                             Activity.signups_count.label('signups'),
+                             count_status('paid'), count_status('pending_verification'), count_status('unpaid'))
+            .outerjoin(Payment, Payment.activity_id == Activity.id)
+            .group_by(Activity.id))
 
-@app.route('/approve_payment/<int:payment_id>', methods=['POST'])
+
+@bp.route('/admin/finance')
 @admin_required
-def approve_payment(payment_id):
-    payment = Payment.query.get_or_404(payment_id)
-    user_to_notify = User.query.get_or_404(payment.user_id)
-    activity = Activity.query.get_or_404(payment.activity_id)
+def admin_finance():
+    """Verwachte en ontvangen inkomsten en opkomst per activiteit, plus de totalen.
+
+    Eerst wordt via keyset-paginatie de pagina activiteiten bepaald; de GROUP BY
+    draait dan alleen over die activiteiten. De totalen zijn één query over alle
+    gefilterde activiteiten en hun betalingen.
+    """
+    date_from = parse_date_arg('date_from')
+    date_to = parse_date_arg('date_to')
+    filters = []
+    if date_from:
+        filters.append(Activity.date >= date_from)
+    if date_to:
+        filters.append(Activity.date <= date_to)
+
+    page, next_cursor = keyset_page(db.session.query(Activity.id, Activity.date).filter(*filters),
+                                    [Activity.date, Activity.id], request.args.get('after'),
+                                    [datetime.date.fromisoformat, int])
+    rows = (activity_finance_query()
+            .filter(Activity.id.in_([row.id for row in page]))
+            .order_by(Activity.date.desc(), Activity.id.desc())
+            .all())
+
+    # Zonder GROUP BY, zodat SQLite de datumfilter via ix_activity_date kan gebruiken
+    cost = func.coalesce(Activity.cost, 0)
+
+    def paid_with_status(status):
+        return func.coalesce(func.sum(case((Payment.status == status, cost), else_=0)), 0)
+
+    activity_totals = db.select(
+        func.count(Activity.id).label('activities'),
+        func.coalesce(func.sum(Activity.signups_count), 0).label('signups'),
+        func.coalesce(func.sum(Activity.signups_count * cost), 0).label('expected'),
+    ).where(*filters).subquery()
+    payment_totals = db.select(
+        paid_with_status('paid').label('received'),
+        paid_with_status('pending_verification').label('pending'),
+    ).select_from(Payment).join(Activity, Activity.id == Payment.activity_id).where(*filters).subquery()
+    totals = (db.session.query(activity_totals, payment_totals)
+              .join(payment_totals, literal(True)).one())
+
+    filters = {k: v for k, v in (('date_from', date_from), ('date_to', date_to)) if v}
+    return render_template('admin_finance.html', rows=rows, totals=totals, today=datetime.date.today(),
+                           filters=filters, next_cursor=next_cursor)
 
-    if payment.status == 'paid':
-        flash('Betaling is al goedgekeurd.', 'info')
-        return redirect(url_for('view_activity', activity_id=payment.activity_id))
+# --- app.py ---
 
-    payment.status = 'paid'
-    db.session.commit()
 
-    try:
-        if user_to_notify.email:
-            subject = f"Je betaling voor '{activity.name}' is goedgekeurd!"
-            body = f"""
-Beste {user_to_notify.username},
+def payment_approved_mail(username, email, activity):
+    """(onderwerp, ontvangers, tekst) van de mail bij een goedgekeurde betaling."""
+    subject = f"Je betaling voor '{activity.name}' is goedgekeurd!"
+    body = f"""
+Beste {username},
 
 Geweldig nieuws! Je betaling voor de activiteit '{activity.name}' is ontvangen en goedgekeurd.
 Je aanmelding is nu definitief.
@@ -479,30 +2667,72 @@ Je aanmelding is nu definitief.
 Activiteit: {activity.name}
 Datum: {activity.date.strftime('%d-%m-%Y')}
 """
-            if activity.start_time:
-                body += f"Tijd: {activity.start_time}\n"
-            if activity.location:
-                body += f"Locatie: {activity.location}\n"
+    if activity.start_time:
+        body += f"Tijd: {activity.start_time}\n"
+    if activity.location:
+        body += f"Locatie: {activity.location}\n"
 
-            body += """
+    body += """
 We kijken ernaar uit je te zien!
 
 Met vriendelijke groet,
 Het team van Chateau Overdruiven
 """
-            msg = Message(subject, recipients=[user_to_notify.email], body=body)
-            mail.send(msg)
-            flash(f'Betaling goedgekeurd en bevestigingsmail verstuurd naar {user_to_notify.username}.', 'success')
-        else:
-            flash(f'Betaling goedgekeurd, maar geen e-mail verstuurd: gebruiker {user_to_notify.username} heeft geen e-mailadres.', 'warning')
+    return subject, [email], body
 
-    except Exception as e:
-        print(f"Fout bij versturen goedkeuringsmail: {e}")
-        flash('Betaling goedgekeurd, maar er ging iets mis bij het versturen van de e-mail.', 'danger')
 
-    return redirect(url_for('view_activity', activity_id=payment.activity_id))
+def payment_rejected_mail(username, email, activity):
+    """(onderwerp, ontvangers, tekst) van de mail bij een afgewezen betaling."""
+    subject = f"Status van je betaling voor '{activity.name}'"
+    # De kosten worden correct geformatteerd met f-string syntax
+    kosten_str = f"€{activity.cost:.2f}" if activity.cost else "Gratis"
+
+    body = f"""
+Beste {username},
+
+We moeten je helaas informeren dat je betaling voor de activiteit '{activity.name}' niet kon worden geverifieerd of is afgewezen.
+Dit kan verschillende redenen hebben (bijv. onjuiste omschrijving, bedrag klopt niet, of de betaling is nog niet verwerkt).
+
+Controleer alsjeblieft je betalingsgegevens en probeer het opnieuw via de activiteitspagina:
+{url_for('main.view_activity', activity_id=activity.id, _external=True)}
+
+Activiteit: {activity.name}
+Datum: {activity.date.strftime('%d-%m-%Y')}
+Kosten: {kosten_str}
+
+Onze excuses voor het ongemak.
+
+Met vriendelijke groet,
+Het bestuur van Chateau Overdruiven
+"""
+    return subject, [email], body
+
 
-@app.route('/reject_payment/<int:payment_id>', methods=['POST'])
+@bp.route('/approve_payment/<int:payment_id>', methods=['POST'])
+@admin_required
+def approve_payment(payment_id):
+    payment = Payment.query.get_or_404(payment_id)
+    user_to_notify = User.query.get_or_404(payment.user_id)
+    activity = Activity.query.get_or_404(payment.activity_id)
+
+    if payment.status == 'paid':
+        flash('Betaling is al goedgekeurd.', 'info')
+        return redirect(url_for('main.view_activity', activity_id=payment.activity_id))
+
+    payment.status = 'paid'
+
+    # De mail gaat via de wachtrij mee in dezelfde transactie; `flask mail-worker` verstuurt hem
+    if user_to_notify.email:
+        enqueue_mail(*payment_approved_mail(user_to_notify.username, user_to_notify.email, activity))
+        flash(f'Betaling goedgekeurd; bevestigingsmail naar {user_to_notify.username} staat klaar om verstuurd te worden.', 'success')
+    else:
+        flash(f'Betaling goedgekeurd, maar geen e-mail verstuurd: gebruiker {user_to_notify.username} heeft geen e-mailadres.', 'warning')
+
+    db.session.commit()
+
+    return redirect(url_for('main.view_activity', activity_id=payment.activity_id))
+
+@bp.route('/reject_payment/<int:payment_id>', methods=['POST'])
 @admin_required
 def reject_payment(payment_id):
     payment = Payment.query.get_or_404(payment_id)
@@ -511,75 +2741,122 @@ def reject_payment(payment_id):
 
     if payment.status == 'unpaid':
         flash('Betaling is al afgewezen of nog niet betaald.', 'info')
-        return redirect(url_for('view_activity', activity_id=payment.activity_id))
+        return redirect(url_for('main.view_activity', activity_id=payment.activity_id))
 
     payment.status = 'unpaid' 
+
+    if user_to_notify.email:
+        enqueue_mail(*payment_rejected_mail(user_to_notify.username, user_to_notify.email, activity))
+        flash(f'Betaling afgewezen; e-mail naar {user_to_notify.username} staat klaar om verstuurd te worden.', 'success')
+    else:
+        flash(f'Betaling afgewezen, maar geen e-mail verstuurd: gebruiker {user_to_notify.username} heeft geen e-mailadres.', 'warning')
+
     db.session.commit()
-    
-    try:
-        if user_to_notify.email:
-            subject = f"Status van je betaling voor '{activity.name}'"
-            
-            # --- HIER ZIT DE CORRECTIE ---
-            # De kosten worden nu correct geformatteerd met f-string syntax
-            kosten_str = f"€{activity.cost:.2f}" if activity.cost else "Gratis"
 
-            body = f"""
-Beste {user_to_notify.username},
+    return redirect(url_for('main.view_activity', activity_id=payment.activity_id))
 
-We moeten je helaas informeren dat je betaling voor de activiteit '{activity.name}' niet kon worden geverifieerd of is afgewezen.
-Dit kan verschillende redenen hebben (bijv. onjuiste omschrijving, bedrag klopt niet, of de betaling is nog niet verwerkt).
+@bp.route('/activity/<int:activity_id>/payments', methods=['POST'])
+@admin_required
+def bulk_update_payments(activity_id):
+    """Keurt de geselecteerde betalingen van een activiteit in één keer goed of af.
 
-Controleer alsjeblieft je betalingsgegevens en probeer het opnieuw via de activiteitspagina:
-{url_for('view_activity', activity_id=activity.id, _external=True)}
+    Eén query om ze te laden, één UPDATE, één INSERT voor alle mails en één commit.
+    """
+    activity = Activity.query.get_or_404(activity_id)
+    action = request.form.get('action')
+    if action not in ('approve', 'reject'):
+        abort(400)
+    new_status = 'paid' if action == 'approve' else 'unpaid'
+    payment_ids = request.form.getlist('payment_ids', type=int)
+
+    # Betalingen die al de gewenste status hebben worden overgeslagen (en krijgen geen mail)
+    selection = (Payment.activity_id == activity.id, Payment.id.in_(payment_ids), Payment.status != new_status)
+    rows = (db.session.query(Payment.id, User.username, User.email)
+            .join(User, User.id == Payment.user_id)
+            .filter(*selection)
+            .all())
+    if not rows:
+        flash('Geen betalingen geselecteerd die nog gewijzigd moeten worden.', 'info')
+        return redirect(url_for('main.view_activity', activity_id=activity.id))
+
+    Payment.query.filter(*selection).update({'status': new_status}, synchronize_session=False)
+    make_mail = payment_approved_mail if action == 'approve' else payment_rejected_mail
+    mails = [make_mail(row.username, row.email, activity) for row in rows if row.email]
+    enqueue_mails(mails)
+    db.session.commit()
 
-Activiteit: {activity.name}
-Datum: {activity.date.strftime('%d-%m-%Y')}
-Kosten: {kosten_str}
+    done = 'goedgekeurd' if action == 'approve' else 'afgewezen'
+    flash(f'{len(rows)} betaling(en) {done}; {len(mails)} e-mail(s) staan klaar om verstuurd te worden.', 'success')
+    if len(mails) < len(rows):
+        flash(f'{len(rows) - len(mails)} gebruiker(s) hebben geen e-mailadres en krijgen geen bericht.', 'warning')
+    return redirect(url_for('main.view_activity', activity_id=activity_id))
 
-Onze excuses voor het ongemak.
 
-Met vriendelijke groet,
-Het bestuur van Chateau Overdruiven
-"""
-            msg = Message(subject, recipients=[user_to_notify.email], body=body)
-            mail.send(msg)
-            flash(f'Betaling afgewezen en e-mail verstuurd naar {user_to_notify.username}.', 'success')
+@bp.route('/admin/bank_import', methods=['GET', 'POST'])
+@admin_required
+def admin_bank_import():
+    """Upload van een bankafschrift (CSV of CAMT.053) om betalingen automatisch te koppelen."""
+    report = None
+    if request.method == 'POST':
+        statement = request.files.get('statement')
+        if not statement or not statement.filename:
+            flash('Kies een afschrift om te importeren.', 'warning')
+            return redirect(url_for('main.admin_bank_import'))
+        dry_run = bool(request.form.get('dry_run'))
+        try:
+            report = import_bank_statement(statement.stream, statement_format(statement.filename), dry_run=dry_run)
+        except (ElementTree.ParseError, csv.Error) as e:
+            db.session.rollback()
+            flash(f'Het afschrift kon niet gelezen worden: {e}', 'danger')
+            return redirect(url_for('main.admin_bank_import'))
+        if dry_run:
+            db.session.rollback()
+            flash(f'Proefimport: {len(report.matched)} betaling(en) zouden gekoppeld worden.', 'info')
         else:
-            flash(f'Betaling afgewezen, maar geen e-mail verstuurd: gebruiker {user_to_notify.username} heeft geen e-mailadres.', 'warning')
-    except Exception as e:
-        print(f"Fout bij versturen afwijsmail: {e}")
-        flash('Betaling afgewezen, maar er ging iets mis bij het versturen van de e-mail.', 'danger')
-
-    return redirect(url_for('view_activity', activity_id=payment.activity_id))
+            db.session.commit()
+            flash(f'{len(report.matched)} betaling(en) op betaald gezet; de bevestigingsmails staan klaar om verstuurd te worden.', 'success')
+    return render_template('admin_bank_import.html', report=report)
 
 
 # --- Login, Logout, Register, Admin Routes... ---
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if 'logged_in' in session and session['logged_in']:
-        return redirect(url_for('activiteiten'))
+        return redirect(url_for('main.activiteiten'))
         
     if request.method == 'POST':
         username_input = request.form['username']
         password = request.form['password']
         
         user = User.query.filter(func.lower(User.username) == func.lower(username_input)).first()
-        
-        if user and user.check_password(password):
+
+        try:
+            password_ok = user is not None and user.check_password(password)
+        except PasswordHashingUnavailable:
+            flash('Het is op dit moment erg druk. Probeer het over een paar seconden opnieuw.', 'warning')
+            return render_template('login.html'), 503
+
+        if password_ok:
+            # Oude hashes meteen omzetten naar de huidige methode en kosten
+            try:
+                if user.password_needs_rehash():
+                    user.set_password(password)
+                    db.session.commit()
+            except PasswordHashingUnavailable:
+                pass # dan bij een volgende login
+
+            # Naam en rol staan niet in de cookie; get_current_user() haalt ze per request op
             session['logged_in'] = True
-            session['username'] = user.username 
-            session['role'] = user.role
             session['user_id'] = user.id
             
             flash('Succesvol ingelogd!', 'success')
-            return redirect(url_for('activiteiten'))
+            return redirect(url_for('main.activiteiten'))
         else:
             flash('Ongeldige gebruikersnaam of wachtwoord', 'danger')
             
     return render_template('login.html')
 
-@app.route('/logout')
+@bp.route('/logout')
 @login_required
 def logout():
     session.pop('logged_in', None)
@@ -587,13 +2864,13 @@ def logout():
     session.pop('role', None)
     session.pop('user_id', None)
     flash('Succesvol uitgelogd!', 'success')
-    return redirect(url_for('public_home'))
+    return redirect(url_for('main.public_home'))
 
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
 def register():
     if session.get('logged_in'):
         flash('Je bent al ingelogd. Log uit om een nieuw account te registreren.', 'info')
-        return redirect(url_for('activiteiten'))
+        return redirect(url_for('main.activiteiten'))
     
     form = RegistrationForm() # Create an instance of the form
 
@@ -606,20 +2883,24 @@ def register():
         existing_user = User.query.filter(func.lower(User.username) == func.lower(username)).first()
         if existing_user:
             flash('Deze gebruikersnaam is al bezet. Kies een andere.', 'danger')
-            return redirect(url_for('register'))
+            return redirect(url_for('main.register'))
             
         existing_email = User.query.filter_by(email=email).first()
         if existing_email:
             flash('Dit e-mailadres is al in gebruik. Kies een andere.', 'danger')
-            return redirect(url_for('register'))
+            return redirect(url_for('main.register'))
             
         invite_code = InvitationCode.query.filter_by(code=invite_code_str).first()
         if not invite_code or invite_code.is_used:
             flash('Ongeldige of reeds gebruikte uitnodigingscode.', 'danger')
-            return redirect(url_for('register'))
+            return redirect(url_for('main.register'))
             
         new_user = User(username=username, email=email, role=invite_code.role) 
-        new_user.set_password(password)
+        try:
+            new_user.set_password(password)
+        except PasswordHashingUnavailable:
+            flash('Het is op dit moment erg druk. Probeer het over een paar seconden opnieuw.', 'warning')
+            return render_template('register.html', form=form), 503
         db.session.add(new_user)
         db.session.flush()
         
@@ -628,31 +2909,40 @@ def register():
         db.session.commit()
         
         flash('Registratie succesvol! Je kunt nu inloggen.', 'success')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
         
     # Pass the form to the template for both GET and failed POST requests
     return render_template('register.html', form=form)
 
-@app.route('/admin/users')
+@bp.route('/admin/users')
 @admin_required
 def admin_users():
-    users = User.query.all()
-    return render_template('admin_users.html', users=users)
-
-@app.route('/admin/delete_user/<int:user_id>', methods=['POST'])
+    query = User.query
+    role = request.args.get('role')
+    search = request.args.get('q', '').strip()
+    if role:
+        query = query.filter(User.role == role)
+    if search:
+        pattern = f'%{search}%'
+        query = query.filter(or_(User.username.ilike(pattern), User.email.ilike(pattern)))
+    users, next_cursor = keyset_page(query, [User.id], request.args.get('after'), [int], descending=False)
+    filters = {k: v for k, v in (('role', role), ('q', search)) if v}
+    return render_template('admin_users.html', users=users, filters=filters, next_cursor=next_cursor)
+
+@bp.route('/admin/delete_user/<int:user_id>', methods=['POST'])
 @admin_required
 def admin_delete_user(user_id):
     user_to_delete = User.query.get_or_404(user_id)
     if user_to_delete.username == 'admin':
         flash('Het hoofd-admin account kan niet worden verwijderd.', 'danger')
-        return redirect(url_for('admin_users'))
+        return redirect(url_for('main.admin_users'))
     
     db.session.delete(user_to_delete)
     db.session.commit()
     flash(f'Gebruiker "{user_to_delete.username}" succesvol verwijderd.', 'success')
-    return redirect(url_for('admin_users'))
+    return redirect(url_for('main.admin_users'))
 
-@app.route('/admin/edit_user/<int:user_id>', methods=['GET', 'POST'])
+@bp.route('/admin/edit_user/<int:user_id>', methods=['GET', 'POST'])
 @admin_required
 def admin_edit_user(user_id):
     user_to_edit = User.query.get_or_404(user_id)
@@ -676,8 +2966,7 @@ def admin_edit_user(user_id):
                 flash('Deze gebruikersnaam is al in gebruik.', 'danger')
                 return render_template('edit_user.html', user=user_to_edit)
             
-            # Update signups with the new username
-            Signup.query.filter_by(participant_name=original_username).update({'participant_name': new_username})
+            # Aanmeldingen verwijzen via user_id naar de gebruiker, dus hoeven niet mee te veranderen
             user_to_edit.username = new_username
 
 
@@ -708,12 +2997,12 @@ def admin_edit_user(user_id):
 
         db.session.commit()
         flash('Gebruikersgegevens succesvol bijgewerkt.', 'success')
-        return redirect(url_for('admin_users'))
+        return redirect(url_for('main.admin_users'))
 
     # GET request: toon het formulier met de huidige data
     return render_template('edit_user.html', user=user_to_edit)
 
-@app.route('/admin/generate_code', methods=['GET', 'POST'])
+@bp.route('/admin/generate_code', methods=['GET', 'POST'])
 @admin_required
 def generate_code_web():
     if request.method == 'POST':
@@ -723,28 +3012,37 @@ def generate_code_web():
         db.session.add(new_invite_code)
         db.session.commit()
         flash(f"Nieuwe uitnodigingscode gegenereerd voor rol '{role}': '{code}'", 'success')
-        return redirect(url_for('admin_invite_codes'))
+        return redirect(url_for('main.admin_invite_codes'))
     return render_template('generate_code.html')
 
-@app.route('/admin/invite_codes')
+@bp.route('/admin/invite_codes')
 @admin_required
 def admin_invite_codes():
-    codes = InvitationCode.query.order_by(InvitationCode.created_at.desc()).all()
-    return render_template('admin_invite_codes.html', codes=codes)
-
-@app.route('/admin/delete_invite_code/<int:code_id>', methods=['POST'])
+    query = InvitationCode.query
+    status = request.args.get('status')
+    role = request.args.get('role')
+    if status in ('used', 'unused'):
+        query = query.filter(InvitationCode.is_used == (status == 'used'))
+    if role:
+        query = query.filter(InvitationCode.role == role)
+    codes, next_cursor = keyset_page(query, [InvitationCode.created_at, InvitationCode.id], request.args.get('after'),
+                                     [datetime.datetime.fromisoformat, int])
+    filters = {k: v for k, v in (('status', status), ('role', role)) if v}
+    return render_template('admin_invite_codes.html', codes=codes, filters=filters, next_cursor=next_cursor)
+
+@bp.route('/admin/delete_invite_code/<int:code_id>', methods=['POST'])
 @admin_required
 def delete_invite_code(code_id):
     code_to_delete = InvitationCode.query.get_or_404(code_id)
     db.session.delete(code_to_delete)
     db.session.commit()
     flash(f"Uitnodigingscode succesvol verwijderd.", 'success')
-    return redirect(url_for('admin_invite_codes'))
+    return redirect(url_for('main.admin_invite_codes'))
 
 
 
 # In app.py
-@app.route('/contact', methods=['POST'])
+@bp.route('/contact', methods=['POST'])
 def contact():
     # Haal de data uit het formulier
     name = request.form.get('name')
@@ -753,8 +3051,7 @@ def contact():
 
     # Stel de e-mail samen
     subject = f"Nieuwe aanvraag lidmaatschap van {name}"
-    sender = app.config['MAIL_DEFAULT_SENDER']
-    recipients = [app.config['ADMIN_EMAIL']]
+    recipients = [current_app.config['ADMIN_EMAIL']]
     
     body = f"""
 Je hebt een nieuwe aanvraag voor lidmaatschap ontvangen.
@@ -766,18 +3063,170 @@ Bericht:
 {message}
 """
     try:
-        msg = Message(subject, sender=sender, recipients=recipients, body=body)
-        mail.send(msg)
+        enqueue_mail(subject, recipients, body)
+        db.session.commit()
         flash('Bedankt voor je aanvraag! We nemen zo snel mogelijk contact met je op.', 'success')
     except Exception as e:
+        db.session.rollback()
         flash('Er ging iets mis bij het versturen van je aanvraag. Probeer het later opnieuw.', 'danger')
-        print(f"Fout bij versturen van contactmail: {e}") # Voor debugging
+        print(f"Fout bij opslaan van contactmail: {e}") # Voor debugging
+
+    return redirect(url_for('main.public_home'))
+
+# --- JSON API ---
+# Velden die de API kan teruggeven; `fields=` kiest hieruit en alleen die kolommen
+# worden opgevraagd, zonder ORM-objecten op te bouwen.
+API_ACTIVITY_FIELDS = {
+    'id': Activity.id,
+    'name': Activity.name,
+    'description': Activity.description,
+    'date': Activity.date,
+    'start_time': Activity.start_time,
+    'end_time': Activity.end_time,
+    'location': Activity.location,
+    'max_participants': Activity.max_participants,
+    'cost': Activity.cost,
+    'is_public': Activity.is_public,
+    'signups_count': Activity.signups_count,
+}
+# De omschrijving kan lang zijn en gaat in lijsten alleen mee als erom gevraagd wordt
+API_ACTIVITY_LIST_FIELDS = [name for name in API_ACTIVITY_FIELDS if name != 'description']
+API_SIGNUP_FIELDS = dict(API_ACTIVITY_FIELDS, payment_status=Payment.status)
+API_SIGNUP_LIST_FIELDS = API_ACTIVITY_LIST_FIELDS + ['payment_status']
+API_GZIP_MIN_BYTES = 1024
+
+
+def api_fields(available, default):
+    """De velden uit `?fields=a,b`, of `default`; onbekende velden geven een 400."""
+    requested = request.args.get('fields')
+    if not requested:
+        return list(default)
+    names = [name.strip() for name in requested.split(',') if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown or not names:
+        abort(400, description=f"Onbekende velden: {', '.join(unknown)}. Beschikbaar: {', '.join(available)}.")
+    return names
+
+
+def api_columns(available, names, required=('id', 'date')):
+    """Gelabelde kolommen voor `names`, plus de kolommen die de view zelf nodig heeft (cursor)."""
+    return [available[name].label(name) for name in dict.fromkeys([*required, *names])]
+
+
+def api_row(row, names):
+    return {name: _api_value(getattr(row, name)) for name in names}
+
+
+def _api_value(value):
+    return value.isoformat() if isinstance(value, (datetime.date, datetime.datetime)) else value
+
+
+def api_page_size():
+    """`?limit=` begrensd door API_PAGE_SIZE."""
+    maximum = current_app.config['API_PAGE_SIZE']
+    return max(1, min(request.args.get('limit', maximum, type=int), maximum))
+
+
+def api_response(payload, user):
+    """Compacte JSON met een zwakke ETag, of 304 als de client deze versie al heeft.
+
+    De ETag is een hash van de JSON zelf en verandert dus precies als de inhoud
+    verandert. Grotere antwoorden gaan gzip-gecomprimeerd als de client dat
+    accepteert. Antwoorden voor ingelogde leden mogen alleen privé gecachet worden.
+    """
+    body = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode()
+    etag = hashlib.sha1(body).hexdigest()
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+        if len(body) >= API_GZIP_MIN_BYTES and request.accept_encodings['gzip']:
+            response.set_data(gzip.compress(body, compresslevel=6))
+            response.headers['Content-Encoding'] = 'gzip'
+    response.set_etag(etag, weak=True)
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = 'private, no-cache' if user else 'public, max-age=60'
+    return response
+
+
+@api_v1.errorhandler(HTTPException)
+def api_error(error):
+    body = json.dumps({'error': error.name, 'message': error.description}, ensure_ascii=False)
+    return Response(body, status=error.code, mimetype='application/json')
+
+
+@api_v1.route('/activities')
+def api_activities():
+    """Komende activiteiten op datum, per pagina via `?cursor=`; gasten zien alleen de publieke."""
+    user = get_current_user()
+    names = api_fields(API_ACTIVITY_FIELDS, API_ACTIVITY_LIST_FIELDS)
+    query = (db.session.query(*api_columns(API_ACTIVITY_FIELDS, names))
+             .filter(Activity.date >= datetime.date.today()))
+    if user is None:
+        query = query.filter(Activity.is_public == True)
+    rows, next_cursor = keyset_page(query, [Activity.date, Activity.id], request.args.get('cursor'),
+                                    [datetime.date.fromisoformat, int], descending=False,
+                                    page_size=api_page_size())
+    return api_response({'data': [api_row(row, names) for row in rows], 'next_cursor': next_cursor}, user)
+
+
+@api_v1.route('/activities/<int:activity_id>')
+def api_activity(activity_id):
+    """Eén activiteit met een samenvatting van de aanmeldingen en, voor leden, hun eigen status.
+
+    Organisatoren en admins krijgen ook het aantal betalingen per status.
+    """
+    user = get_current_user()
+    names = api_fields(API_ACTIVITY_FIELDS, API_ACTIVITY_FIELDS)
+    row = (db.session.query(*api_columns(API_ACTIVITY_FIELDS, names,
+                                         required=('id', 'is_public', 'max_participants', 'signups_count')))
+           .filter(Activity.id == activity_id)
+           .one_or_none())
+    if row is None or (user is None and not row.is_public):
+        abort(404, description='Activiteit niet gevonden.')
+
+    data = api_row(row, names)
+    spots_left = max(row.max_participants - row.signups_count, 0) if row.max_participants else None
+    data['signups'] = {'count': row.signups_count, 'spots_left': spots_left}
+    if user is not None:
+        # Eigen aanmelding en betaling in één query
+        me = db.session.query(
+            Signup.query.filter_by(activity_id=activity_id, user_id=user.id).exists().label('signed_up'),
+            db.select(Payment.status).filter_by(activity_id=activity_id, user_id=user.id)
+            .scalar_subquery().label('payment_status'),
+        ).one()
+        data['me'] = {'signed_up': me.signed_up, 'payment_status': me.payment_status}
+        if user.is_organizer:
+            data['payments'] = dict(db.session.query(Payment.status, func.count(Payment.id))
+                                    .filter(Payment.activity_id == activity_id)
+                                    .group_by(Payment.status)
+                                    .all())
+    return api_response({'data': data}, user)
+
+
+@api_v1.route('/me/signups')
+def api_my_signups():
+    """De aanmeldingen van de ingelogde gebruiker met betaalstatus; `?upcoming=1` voor alleen komende."""
+    user = get_current_user()
+    if user is None:
+        abort(401, description='Log in om je aanmeldingen op te vragen.')
+    names = api_fields(API_SIGNUP_FIELDS, API_SIGNUP_LIST_FIELDS)
+    query = (db.session.query(*api_columns(API_SIGNUP_FIELDS, names))
+             .select_from(Signup)
+             .join(Activity, Activity.id == Signup.activity_id)
+             .outerjoin(Payment, and_(Payment.activity_id == Signup.activity_id, Payment.user_id == Signup.user_id))
+             .filter(Signup.user_id == user.id))
+    if request.args.get('upcoming'):
+        query = query.filter(Activity.date >= datetime.date.today())
+    rows, next_cursor = keyset_page(query, [Activity.date, Activity.id], request.args.get('cursor'),
+                                    [datetime.date.fromisoformat, int], descending=False,
+                                    page_size=api_page_size())
+    return api_response({'data': [api_row(row, names) for row in rows], 'next_cursor': next_cursor}, user)
 
-    return redirect(url_for('public_home'))
 
 # --- CLI Commands ---
 # --- DEZE FUNCTIE IS NU BIJGEWERKT ---
-@app.cli.command("create-user")
+@bp.cli.command("create-user")
 @click.argument("username")
 @click.argument("email")
 @click.argument("password")
@@ -798,7 +3247,7 @@ def create_user_command(username, email, password):
     print(f"Gebruiker '{username}' met e-mail '{email}' succesvol aangemaakt.")
 
 
-@app.cli.command("generate-invite-code")
+@bp.cli.command("generate-invite-code")
 def generate_invite_code_command():
     """Genereert en voegt een nieuwe uitnodigingscode toe aan de database."""
     code = secrets.token_urlsafe(16)
@@ -807,7 +3256,7 @@ def generate_invite_code_command():
     db.session.commit()
     print(f"Nieuwe uitnodigingscode gegenereerd: '{code}'")
 
-@app.cli.command("list-invite-codes")
+@bp.cli.command("list-invite-codes")
 def list_invite_codes_command():
     """Toont alle uitnodigingscodes en hun status."""
     codes = InvitationCode.query.all()
@@ -821,7 +3270,752 @@ def list_invite_codes_command():
         print(f"Code: {c.code} | Status: {status} {used_by} | Aangemaakt: {c.created_at.strftime('%Y-%m-%d %H:%M')}")
     print("---------------------------\n")
 
+@bp.cli.command("calendar-worker")
+@click.option("--once", is_flag=True, help="Verwerk de huidige outbox en stop.")
+@click.option("--interval", default=5.0, show_default=True, help="Seconden tussen polls.")
+@click.option("--batch-size", default=100, show_default=True)
+def calendar_worker_command(once, interval, batch_size):
+    """Synchroniseert de calendar_outbox met Google Agenda."""
+    print("Calendar worker gestart.")
+    while True:
+        try:
+            processed, failed = process_calendar_outbox(batch_size)
+        except FileNotFoundError as e:
+            print(f"Google Calendar Error: {e}")
+            processed, failed = 0, 0
+        if processed or failed:
+            print(f"Outbox: {processed} verwerkt, {failed} mislukt.")
+            # Meteen door met de volgende batch
+            continue
+        if once:
+            return
+        time.sleep(interval)
+
+
+@bp.cli.command("sync-calendar")
+@click.option("--dry-run", is_flag=True, help="Toon alleen de verschillen, wijzig niets.")
+@click.option("--keep-orphans", is_flag=True, help="Verwijder geen events zonder bijbehorende activiteit.")
+def sync_calendar_command(dry_run, keep_orphans):
+    """Herstelt verschillen tussen de activiteiten en Google Agenda."""
+    from googleapiclient.errors import HttpError
+
+    try:
+        service = get_calendar_service()
+        report = reconcile_calendar(service, dry_run=dry_run, delete_orphans=not keep_orphans)
+    except (FileNotFoundError, CalendarUnavailable, HttpError) as e:
+        print(f"Google Calendar Error: {e}")
+        return
+
+    labels = {'missing': 'Ontbreekt in Google Agenda', 'stale': 'Verouderd', 'orphaned': 'Zonder activiteit'}
+    for kind, label in labels.items():
+        print(f"{label}: {len(report[kind])}")
+        if dry_run:
+            for description in report[kind]:
+                print(f"  - {description}")
+    if dry_run:
+        print("Dry run: er is niets gewijzigd.")
+    for error in report['errors']:
+        print(f"Fout: {error}")
+
+
+@bp.cli.command("mail-worker")
+@click.option("--once", is_flag=True, help="Verstuur de huidige wachtrij en stop.")
+@click.option("--interval", default=5.0, show_default=True, help="Seconden tussen polls.")
+@click.option("--batch-size", default=50, show_default=True)
+def mail_worker_command(once, interval, batch_size):
+    """Verstuurt de mailwachtrij over één SMTP-verbinding."""
+    print("Mail worker gestart.")
+    while True:
+        if has_due_mail():
+            # Eén verbinding (TLS + login) zolang er mail klaarstaat
+            try:
+                with mail.connect() as connection:
+                    while True:
+                        sent, failed = send_mail_batch(connection, batch_size)
+                        if sent or failed:
+                            print(f"Mail: {sent} verstuurd, {failed} mislukt.")
+                        if not sent and not failed:
+                            break
+            except (smtplib.SMTPException, OSError) as e:
+                print(f"SMTP-fout, verbinding wordt opnieuw opgebouwd: {e}")
+                db.session.rollback()
+        if once:
+            return
+        time.sleep(interval)
+
+
+@bp.cli.command("mail-dead-letters")
+@click.option("--requeue", is_flag=True, help="Zet alle dead letters opnieuw in de wachtrij.")
+def mail_dead_letters_command(requeue):
+    """Toont mails die definitief niet verstuurd konden worden."""
+    dead = MailOutbox.query.filter_by(status='dead').order_by(MailOutbox.id).all()
+    if not dead:
+        print("Geen dead letters.")
+        return
+    for item in dead:
+        print(f"#{item.id} | {item.recipients} | {item.subject} | {item.attempts} pogingen | {item.last_error}")
+    if requeue:
+        for item in dead:
+            item.status = 'pending'
+            item.attempts = 0
+            item.next_attempt_at = datetime.datetime.now()
+        db.session.commit()
+        print(f"{len(dead)} mail(s) opnieuw in de wachtrij gezet.")
+
+
+@bp.cli.command("import-bank-statement")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "fmt", type=click.Choice(['csv', 'camt']), default=None,
+              help="Bestandsformaat; standaard afgeleid van de extensie.")
+@click.option("--dry-run", is_flag=True, help="Toon alleen wat er gekoppeld zou worden.")
+def import_bank_statement_command(path, fmt, dry_run):
+    """Koppelt een bankafschrift (CSV of CAMT.053) aan openstaande betalingen."""
+    started = time.perf_counter()
+    with open(path, 'rb') as stream:
+        report = import_bank_statement(stream, fmt or statement_format(path), dry_run=dry_run)
+    if dry_run:
+        db.session.rollback()
+    else:
+        db.session.commit()
+    elapsed = time.perf_counter() - started
+
+    for line, reason in report.unmatched:
+        print(f"Niet gekoppeld, regel {line.line_no}: {reason} | {line.text[:100]}")
+    for line, reason in report.ambiguous:
+        print(f"Dubbelzinnig, regel {line.line_no}: {reason} | {line.text[:100]}")
+    done = "zouden gekoppeld worden" if dry_run else "op betaald gezet"
+    print(f"{report.lines} regels in {elapsed:.2f}s: {len(report.matched)} betaling(en) {done}, "
+          f"{len(report.unmatched)} niet gekoppeld, {len(report.ambiguous)} dubbelzinnig, "
+          f"{report.without_reference} zonder kenmerk, {report.debits} afschrijvingen overgeslagen.")
+
+
+@bp.cli.command("import")
+@click.argument("kind", type=click.Choice(TRANSFER_KINDS))
+@click.argument("path", type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.option("--format", "fmt", type=click.Choice(['csv', 'json']), default=None,
+              help="csv (met kopregel) of json (JSON Lines); standaard afgeleid van de extensie.")
+@click.option("--chunk-size", default=500, show_default=True, help="Aantal regels per INSERT en transactie.")
+@click.option("--workers", default=os.cpu_count() or 1, show_default=True,
+              help="Processen voor het hashen van wachtwoorden (alleen users).")
+@click.option("--dry-run", is_flag=True, help="Controleer alleen; er wordt niets opgeslagen.")
+def import_command(kind, path, fmt, chunk_size, workers, dry_run):
+    """Importeert users, activities of signups uit CSV of JSON Lines ('-' leest stdin).
+
+    Kolommen: users: username, email, password, role; activities: name, date,
+    start_time, end_time, location, description, max_participants, cost, is_public,
+    organizer (gebruikersnaam); signups: activity_id, username.
+    """
+    fmt = fmt or transfer_format(path)
+    started = time.perf_counter()
+    pool = None
+    if kind == 'users' and workers > 1 and not dry_run:
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    try:
+        with click.open_file(path, 'r', encoding='utf-8-sig') as stream:
+            report = import_records(kind, stream, fmt, chunk_size=chunk_size, dry_run=dry_run, pool=pool)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    elapsed = time.perf_counter() - started
+
+    for line_no, reason in report.errors:
+        click.echo(f"Regel {line_no}: {reason}", err=True)
+    done = "zouden toegevoegd worden" if dry_run else "toegevoegd"
+    print(f"{report.rows} regels in {elapsed:.2f}s: {report.inserted} {kind} {done}, {len(report.errors)} fout(en).")
+    if report.errors:
+        raise SystemExit(1)
+
+
+@bp.cli.command("export")
+@click.argument("kind", type=click.Choice(TRANSFER_KINDS))
+@click.argument("path", default='-', type=click.Path(dir_okay=False, allow_dash=True))
+@click.option("--format", "fmt", type=click.Choice(['csv', 'json']), default=None,
+              help="csv of json (JSON Lines); standaard afgeleid van de extensie, anders csv.")
+@click.option("--batch-size", default=1000, show_default=True, help="Rijen per fetch (yield_per).")
+def export_command(kind, path, fmt, batch_size):
+    """Exporteert users, activities of signups naar CSV of JSON Lines ('-' schrijft naar stdout)."""
+    fmt = fmt or transfer_format(path)
+    started = time.perf_counter()
+    with click.open_file(path, 'w', encoding='utf-8', atomic=path != '-') as stream:
+        count = export_records(kind, stream, fmt, batch_size=batch_size)
+    if path != '-':
+        print(f"{count} {kind} geëxporteerd naar {path} in {time.perf_counter() - started:.2f}s.")
+
+
+@bp.cli.command("extend-series")
+def extend_series_command():
+    """Maakt de activiteiten van terugkerende series aan tot SERIES_WINDOW_DAYS vooruit (dagelijks draaien)."""
+    window_end = series_window_end()
+    open_series = ActivitySeries.query.filter(
+        or_(ActivitySeries.materialized_until.is_(None), ActivitySeries.materialized_until < window_end),
+        or_(ActivitySeries.until.is_(None), ActivitySeries.materialized_until.is_(None),
+            ActivitySeries.materialized_until < ActivitySeries.until),
+    ).all()
+    created = sum(materialize_series(series, window_end) for series in open_series)
+    db.session.commit()
+    print(f"{created} activiteit(en) aangemaakt voor {len(open_series)} serie(s), tot en met {window_end}.")
+
+
+@bp.cli.command("archive-activities")
+@click.option("--before", required=True, type=click.DateTime(formats=['%Y-%m-%d']),
+              help="Archiveer activiteiten vóór deze datum (JJJJ-MM-DD).")
+@click.option("--batch-size", default=200, show_default=True, help="Aantal activiteiten per transactie.")
+@click.option("--dry-run", is_flag=True, help="Toon alleen hoeveel activiteiten gearchiveerd zouden worden.")
+def archive_activities_command(before, batch_size, dry_run):
+    """Verplaatst afgeronde activiteiten met aanmeldingen en betalingen naar het archief."""
+    before = before.date()
+    if before > datetime.date.today():
+        raise SystemExit("--before mag niet in de toekomst liggen.")
+    candidates = archivable_activities_query(before)
+    if dry_run:
+        print(f"{candidates.count()} activiteit(en) vóór {before} kunnen gearchiveerd worden.")
+        return
+
+    started = time.perf_counter()
+    archived = 0
+    while True:
+        # Elke batch is een eigen transactie; gearchiveerde rijen vallen uit de volgende query
+        activity_ids = [activity_id for (activity_id,) in candidates.limit(batch_size)]
+        if not activity_ids:
+            break
+        archive_activities(activity_ids)
+        db.session.commit()
+        archived += len(activity_ids)
+        print(f"{archived} activiteit(en) gearchiveerd...")
+    skipped = Activity.query.filter(Activity.date < before).count()
+    print(f"Klaar: {archived} activiteit(en) gearchiveerd in {time.perf_counter() - started:.1f}s.")
+    if skipped:
+        print(f"{skipped} activiteit(en) vóór {before} blijven staan (betalingen nog te verifiëren of nieuwste record).")
+
+
+def hot_routes(activity_id, user_id):
+    """De veelgebruikte routes als (naam, methode, url, formulier, als gast), met voorbeeldwaarden."""
+    today = datetime.date.today().isoformat()
+    token = agenda_feed_serializer().dumps(user_id)
+    return [
+        ('public_home', 'GET', url_for('main.public_home'), None, True),
+        ('activiteiten', 'GET', url_for('main.activiteiten'), None, False),
+        ('view_activity', 'GET', url_for('main.view_activity', activity_id=activity_id), None, False),
+        ('confirm_payment', 'POST', url_for('main.confirm_payment', activity_id=activity_id), {}, False),
+        ('agenda.ics', 'GET', url_for('main.public_agenda_feed'), None, True),
+        ('agenda/<token>.ics', 'GET', url_for('main.member_agenda_feed', token=token), None, True),
+        ('admin_activities', 'GET', url_for('main.admin_activities'), None, False),
+        ('admin_activities (volgende pagina)', 'GET', url_for('main.admin_activities', after=f'{today}_{activity_id}'), None, False),
+        ('admin_activities (periode)', 'GET', url_for('main.admin_activities', date_from=today, date_to=today), None, False),
+        ('admin_activities (met archief)', 'GET', url_for('main.admin_activities', archive=1), None, False),
+        ('admin_activities (met archief, volgende pagina)', 'GET',
+         url_for('main.admin_activities', archive=1, after=f'{today}_{activity_id}'), None, False),
+        ('admin_finance', 'GET', url_for('main.admin_finance'), None, False),
+        ('admin_finance (volgende pagina)', 'GET', url_for('main.admin_finance', after=f'{today}_{activity_id}'), None, False),
+        ('admin_finance (periode)', 'GET', url_for('main.admin_finance', date_from=today, date_to=today), None, False),
+        ('admin_users', 'GET', url_for('main.admin_users'), None, False),
+        ('admin_users (rol)', 'GET', url_for('main.admin_users', role='organizer'), None, False),
+        ('admin_users (zoeken)', 'GET', url_for('main.admin_users', q='plan'), None, False),
+        ('admin_users (volgende pagina)', 'GET', url_for('main.admin_users', after=user_id), None, False),
+        ('admin_invite_codes', 'GET', url_for('main.admin_invite_codes', status='unused'), None, False),
+        ('login', 'POST', url_for('main.login'), {'username': 'plan-check-onbekend', 'password': 'x'}, True),
+        ('api activities', 'GET', url_for('api_v1.api_activities'), None, False),
+        ('api activities (volgende pagina)', 'GET', url_for('api_v1.api_activities', cursor=f'{today}_{activity_id}'), None, False),
+        ('api activity', 'GET', url_for('api_v1.api_activity', activity_id=activity_id), None, False),
+        ('api me/signups', 'GET', url_for('api_v1.api_my_signups', upcoming=1), None, False),
+    ]
+
+
+# Bewust geaccepteerde scans: (route, tabel) -> reden
+ALLOWED_SCANS = {
+    ('admin_users', 'user'): 'doorloopt user op id en stopt na één pagina (LIMIT)',
+    ('admin_users (rol)', 'user'): 'doorloopt user op id en stopt na één pagina (LIMIT)',
+    ('admin_users (zoeken)', 'user'): "LIKE '%...%' kan geen index gebruiken; stopt na één pagina (LIMIT)",
+    ('admin_finance', 'activity'): 'totalen over alle activiteiten; met date_from/date_to via ix_activity_date',
+    ('admin_finance (volgende pagina)', 'activity'): 'totalen over alle activiteiten; met date_from/date_to via ix_activity_date',
+}
+
+
+def _plan_check_sample(admin_username):
+    """Voorbeeldrijen in de kopie, zodat elke route de volledige weg door de code neemt."""
+    admin = User(username=admin_username, email=f'{admin_username}@example.invalid', password_hash='!', role='admin')
+    activity = Activity(name='Plancontrole', date=datetime.date.today(), cost=5.0, max_participants=10, is_public=True)
+    db.session.add_all([admin, activity, InvitationCode(code=secrets.token_urlsafe(16))])
+    db.session.flush()
+    db.session.add(Signup(activity_id=activity.id, user_id=admin.id, participant_name=admin.username))
+    db.session.add(Payment(activity_id=activity.id, user_id=admin.id, status='pending_verification'))
+    db.session.commit()
+    return activity.id, admin.id
+
+
+def capture_hot_statements(plan_app):
+    """Voert de hot routes en worker-queries uit via de testclient en verzamelt per naam de SQL.
+
+    Geeft {naam: [(statement, parameters), ...]} terug; alleen statements met een queryplan.
+    """
+    captured = {}
+    current = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE', 'INSERT INTO', 'WITH')):
+            current.append((statement, parameters))
+
+    activity_id, user_id = _plan_check_sample(f'plan-check-{secrets.token_hex(3)}')
+    with plan_app.test_request_context():
+        routes = hot_routes(activity_id, user_id)
+    guest, member = plan_app.test_client(), plan_app.test_client()
+    with member.session_transaction() as s:
+        s.update(logged_in=True, user_id=user_id)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        for name, method, url, form, as_guest in routes:
+            current.clear()
+            response = (guest if as_guest else member).open(url, method=method, data=form)
+            if response.status_code >= 500:
+                raise SystemExit(f"{name}: HTTP {response.status_code}")
+            captured[name] = list(current)
+        # Queries van de CLI-workers; zonder werk in de wachtrij doen ze alleen hun eerste SELECT
+        for name, run in (('calendar-worker', process_calendar_outbox), ('mail-worker', has_due_mail),
+                          ('import-bank-statement', open_payments_lookup)):
+            current.clear()
+            run()
+            captured[name] = list(current)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    db.session.rollback()
+    return captured
+
+
+@bp.cli.command("check-query-plans")
+@click.option("--verbose", is_flag=True, help="Toon ook het plan van queries die een index gebruiken.")
+def check_query_plans_command(verbose):
+    """Controleert met EXPLAIN QUERY PLAN dat de SQL van de veelgebruikte routes een index gebruikt.
+
+    De routes draaien via de testclient tegen een kopie van de database (zelfde
+    schema, indexen en statistieken); de echte database wordt niet gewijzigd.
+    """
+    if db.engine.dialect.name != 'sqlite':
+        print("Deze controle werkt alleen met SQLite.")
+        return
+    with tempfile.TemporaryDirectory(prefix='query-plans-') as directory:
+        copy_path = os.path.join(directory, 'plans.db')
+        source, target = sqlite3.connect(db.engine.url.database), sqlite3.connect(copy_path)
+        with target:
+            source.backup(target)
+        source.close()
+        target.close()
+        plan_app = create_app({'SECRET_KEY': current_app.config['SECRET_KEY'],
+                               'SQLALCHEMY_DATABASE_URI': f'sqlite:///{copy_path}', 'PAGE_CACHE_TYPE': 'memory',
+                               'PASSWORD_HASH_WORKERS': 0, 'WTF_CSRF_ENABLED': False, 'SQL_STRICT': False,
+                               'SERVER_NAME': None})
+        with plan_app.app_context():
+            captured = capture_hot_statements(plan_app)
+            failures = 0
+            for name, statements in captured.items():
+                problems = []
+                unique = {statement: parameters for statement, parameters in statements}
+                for statement, parameters in unique.items():
+                    plan = [row[-1] for row in db.session.connection()
+                            .exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters)]
+                    # 'SCAN activity' zonder 'USING ... INDEX' is een volledige table scan
+                    # Alleen tabellen tellen; 'SCAN anon_1' is een subquery van hoogstens één pagina
+                    scans = [step for step in plan if re.match(r'^SCAN \S+$', step)
+                             and step.split()[1] in db.metadata.tables
+                             and (name, step.split()[1]) not in ALLOWED_SCANS]
+                    if scans:
+                        problems.append((statement, plan))
+                    elif verbose:
+                        print(f"  {name}: {' | '.join(plan)}")
+                failures += bool(problems)
+                print(f"[{'FOUT' if problems else 'OK'}] {name}: {len(unique)} queries")
+                for statement, plan in problems:
+                    print(f"    {' '.join(statement.split())[:200]}\n      -> {' | '.join(plan)}")
+            db.session.remove()
+            db.engine.dispose()
+    for (name, table), reason in ALLOWED_SCANS.items():
+        print(f"Toegestaan: {name} scant {table}: {reason}")
+    if failures:
+        raise SystemExit(f"{failures} route(s) doen een volledige table scan.")
+    print("Alle queries gebruiken een index.")
+
+
+@bp.cli.command("stress-signups")
+@click.option("--users", default=300, show_default=True, help="Aantal gelijktijdige aanmeldingen.")
+@click.option("--capacity", default=25, show_default=True, help="max_participants van de testactiviteit.")
+@click.option("--workers", default=32, show_default=True, help="Aantal parallelle threads.")
+@click.option("--database", default=None, metavar="URL",
+              help="Draai tegen deze database in plaats van een tijdelijk SQLite-bestand.")
+def stress_signups_command(users, capacity, workers, database):
+    """Vuurt gelijktijdige aanmeldingen af op één activiteit en controleert dat er niet overboekt wordt.
+
+    Standaard draait de test tegen een tijdelijk SQLite-bestand met hetzelfde
+    DATABASE_PROFILE, zodat de echte database niet geraakt wordt. Met --database
+    worden de testactiviteit en -gebruikers daar aangemaakt en daarna weer opgeruimd.
+    """
+    # Eigen paginacache: een testactiviteit hoort de cache van de site niet te legen
+    config = {'SECRET_KEY': current_app.config['SECRET_KEY'], 'PAGE_CACHE_TYPE': 'memory'}
+    if database:
+        stress_app = create_app(dict(config, SQLALCHEMY_DATABASE_URI=database))
+        with stress_app.app_context():
+            signed_up = _stress_signups(stress_app, users, capacity, workers, cleanup=True)
+    else:
+        # Een bestand en geen :memory:, want elke thread krijgt een eigen verbinding
+        with tempfile.TemporaryDirectory(prefix='stress-signups-') as directory:
+            stress_app = create_app(dict(config, SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(directory, 'stress.db')}"))
+            with stress_app.app_context():
+                db.create_all()
+                signed_up = _stress_signups(stress_app, users, capacity, workers, cleanup=False)
+                db.session.remove()
+                db.engine.dispose()
+    if signed_up != min(capacity, users):
+        raise SystemExit("FOUT: het aantal aanmeldingen klopt niet met de capaciteit.")
+    print("OK: capaciteit exact gerespecteerd.")
+
+
+def _stress_signups(app, users, capacity, workers, cleanup):
+    """Voert de stresstest uit in de app-context van `app` en geeft het aantal aanmeldingen terug."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    tag = secrets.token_hex(4)
+    activity = Activity(name=f'Stresstest {tag}', date=datetime.date.today(), max_participants=capacity)
+    db.session.add(activity)
+    test_users = [User(username=f'stress-{tag}-{i}', email=f'stress-{tag}-{i}@example.invalid', password_hash='!')
+                  for i in range(users)]
+    db.session.add_all(test_users)
+    db.session.commit()
+    activity_id = activity.id
+    user_ids = [(u.id, u.username) for u in test_users]
+    # De threads hieronder hebben geen eigen app-context
+    with app.test_request_context():
+        signup_url = url_for('main.confirm_payment', activity_id=activity_id)
+
+    def sign_up(user):
+        client = app.test_client()
+        with client.session_transaction() as s:
+            s.update(logged_in=True, user_id=user[0], username=user[1], role='user')
+        return client.post(signup_url).status_code
+
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            statuses = list(pool.map(sign_up, user_ids))
+        elapsed = time.perf_counter() - start
+        db.session.expire_all()
+        signed_up = Signup.query.filter_by(activity_id=activity_id).count()
+        print(f"{users} aanmeldingen in {elapsed:.2f}s ({users / elapsed:.0f}/s), "
+              f"HTTP-statussen: {sorted(set(statuses))}")
+        print(f"Aangemeld: {signed_up} (capaciteit {capacity})")
+    finally:
+        if cleanup:
+            Signup.query.filter_by(activity_id=activity_id).delete()
+            Activity.query.filter_by(id=activity_id).delete()
+            User.query.filter(User.id.in_([u[0] for u in user_ids])).delete(synchronize_session=False)
+            db.session.commit()
+    return signed_up
+
+
+@bp.cli.command("bench-login")
+@click.option("--logins", default=100, show_default=True, help="Totaal aantal logins.")
+@click.option("--threads", default=4, show_default=True, help="Gelijktijdige requests binnen deze worker.")
+@click.option("--method", default=None, help="Andere hashmethode dan PASSWORD_HASH_METHOD, bv. 'pbkdf2:sha256:600000'.")
+def bench_login_command(logins, threads, method):
+    """Meet hoeveel logins per seconde één worker aankan met de huidige hashinstellingen.
+
+    Draait de echte /login-route via de testclient met een tijdelijke gebruiker.
+    Vergelijk bijvoorbeeld PASSWORD_HASH_WORKERS=0 met de standaardpool, of
+    verschillende --method waarden.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    if method:
+        current_app.config['PASSWORD_HASH_METHOD'] = method
+    current_app.config['WTF_CSRF_ENABLED'] = False
+    tag = secrets.token_hex(4)
+    password = f'Bench-{tag}-1'
+    user = User(username=f'bench-{tag}', email=f'bench-{tag}@example.invalid')
+    user.set_password(password)
+    db.session.add(user)
+    db.session.commit()
+    user_id = user.id
+    app = current_app._get_current_object()
+    with app.test_request_context():
+        login_url = url_for('main.login')
+
+    def log_in(_):
+        client = app.test_client()
+        started = time.perf_counter()
+        response = client.post(login_url, data={'username': f'bench-{tag}', 'password': password})
+        return response.status_code, time.perf_counter() - started
+
+    try:
+        log_in(None) # pool opstarten valt buiten de meting
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            results = list(pool.map(log_in, range(logins)))
+        elapsed = time.perf_counter() - start
+    finally:
+        User.query.filter_by(id=user_id).delete()
+        db.session.commit()
+
+    latencies = sorted(duration for _, duration in results)
+    failed = sum(1 for status, _ in results if status != 302)
+    p50 = latencies[len(latencies) // 2]
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"Methode: {current_hash_prefix()}, hashpool: {current_app.config['PASSWORD_HASH_WORKERS']} processen, "
+          f"{threads} threads")
+    print(f"{logins} logins in {elapsed:.2f}s: {logins / elapsed:.1f} logins/s per worker, "
+          f"p50 {p50 * 1000:.0f} ms, p95 {p95 * 1000:.0f} ms, mislukt: {failed}")
+
+
+BENCHMARK_PREFIX = 'bench-'
+
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+@bp.cli.command("seed-benchmark")
+@click.option("--users", default=5000, show_default=True)
+@click.option("--activities", default=10000, show_default=True)
+@click.option("--signups", default=200000, show_default=True, help="Aanmeldingen; bij betaalde activiteiten hoort er een betaling bij.")
+@click.option("--seed", default=42, show_default=True, help="Zelfde seed geeft dezelfde dataset.")
+@click.option("--clear", is_flag=True, help="Verwijder eerst een eerder gegenereerde dataset.")
+def seed_benchmark_command(users, activities, signups, seed, clear):
+    """Vult de database met een synthetische dataset voor `flask benchmark`.
+
+    Alle gebruikers heten bench-user-N en alle activiteiten 'bench-...', zodat
+    --clear ze zonder de echte data weer kan opruimen. Gebruik bij voorkeur een
+    aparte database (DATABASE_URL).
+    """
+    import random
+
+    existing = User.query.filter(User.username.like(f'{BENCHMARK_PREFIX}user-%')).count()
+    if existing and not clear:
+        raise SystemExit(f"Er staat al een benchmarkdataset ({existing} gebruikers); gebruik --clear.")
+    if clear:
+        activity_ids = db.select(Activity.id).where(Activity.name.like(f'{BENCHMARK_PREFIX}%')).scalar_subquery()
+        user_ids = db.select(User.id).where(User.username.like(f'{BENCHMARK_PREFIX}user-%')).scalar_subquery()
+        Payment.query.filter(or_(Payment.activity_id.in_(activity_ids), Payment.user_id.in_(user_ids))).delete(synchronize_session=False)
+        Signup.query.filter(or_(Signup.activity_id.in_(activity_ids), Signup.user_id.in_(user_ids))).delete(synchronize_session=False)
+        Activity.query.filter(Activity.name.like(f'{BENCHMARK_PREFIX}%')).delete(synchronize_session=False)
+        User.query.filter(User.username.like(f'{BENCHMARK_PREFIX}user-%')).delete(synchronize_session=False)
+        db.session.commit()
+        print("Vorige benchmarkdataset verwijderd.")
+
+    rng = random.Random(seed)
+    today = datetime.date.today()
+    start = time.perf_counter()
+    chunk = 5000
+
+    # Eén hash voor iedereen: het hashen zelf is hier niet wat we meten
+    password_hash = hash_password('Benchmark1')
+    user_rows = [{'username': f'{BENCHMARK_PREFIX}user-{i}', 'email': f'{BENCHMARK_PREFIX}user-{i}@example.invalid',
+                  'password_hash': password_hash, 'role': 'organizer' if i % 50 == 0 else 'user'}
+                 for i in range(users)]
+    for offset in range(0, len(user_rows), chunk):
+        db.session.execute(db.insert(User), user_rows[offset:offset + chunk])
+    user_ids = [row.id for row in db.session.query(User.id).filter(User.username.like(f'{BENCHMARK_PREFIX}user-%'))]
+    organizer_ids = user_ids[::50]
+
+    activity_rows = []
+    for i in range(activities):
+        timed = rng.random() < 0.7
+        start_hour = rng.randint(10, 20)
+        activity_rows.append({
+            'name': f'{BENCHMARK_PREFIX}activiteit {i}',
+            'description': 'Synthetische activiteit voor benchmarks. ' * rng.randint(1, 8),
+            # Ongeveer twee jaar terug tot een jaar vooruit, zoals een club die al even bestaat
+            'date': today + datetime.timedelta(days=rng.randint(-730, 365)),
+            'start_time': f'{start_hour:02d}:00' if timed else None,
+            'end_time': f'{start_hour + 2:02d}:00' if timed else None,
+            'max_participants': rng.choice([None, 10, 20, 40, 80]),
+            'location': rng.choice(['Clubhuis', 'Wijnhuis De Druif', 'Online', 'Buiten']),
+            'is_public': rng.random() < 0.3,
+            'cost': rng.choice([None, 0.0, 7.5, 15.0, 25.0]),
+            'organizer_id': rng.choice(organizer_ids) if organizer_ids else None,
+            'updated_at': datetime.datetime.now(),
+        })
+    for offset in range(0, len(activity_rows), chunk):
+        db.session.execute(db.insert(Activity), activity_rows[offset:offset + chunk])
+    activity_costs = dict(db.session.query(Activity.id, Activity.cost).filter(Activity.name.like(f'{BENCHMARK_PREFIX}%')))
+    activity_ids = list(activity_costs)
+
+    # Unieke (activiteit, gebruiker)-paren; max_participants wordt hier bewust niet bewaakt
+    signups = min(signups, len(activity_ids) * len(user_ids))
+    pairs = set()
+    while len(pairs) < signups:
+        pairs.add((rng.choice(activity_ids), rng.choice(user_ids)))
+    usernames = {user_id: f'{BENCHMARK_PREFIX}user-{i}' for i, user_id in enumerate(user_ids)}
+    signup_rows, payment_rows = [], []
+    for activity_id, user_id in sorted(pairs):
+        signup_rows.append({'activity_id': activity_id, 'user_id': user_id, 'participant_name': usernames[user_id]})
+        if activity_costs[activity_id]:
+            payment_rows.append({'activity_id': activity_id, 'user_id': user_id,
+                                 'status': rng.choices(['paid', 'pending_verification', 'unpaid'], [8, 1, 1])[0]})
+    for offset in range(0, len(signup_rows), chunk):
+        db.session.execute(db.insert(Signup), signup_rows[offset:offset + chunk])
+    for offset in range(0, len(payment_rows), chunk):
+        db.session.execute(db.insert(Payment), payment_rows[offset:offset + chunk])
+    db.session.commit()
+    print(f"{len(user_ids)} gebruikers, {len(activity_ids)} activiteiten, {len(signup_rows)} aanmeldingen en "
+          f"{len(payment_rows)} betalingen aangemaakt in {time.perf_counter() - start:.1f}s (seed {seed}).")
+
+
+@bp.cli.command("benchmark")
+@click.option("--requests", "per_route", default=200, show_default=True, help="Requests per route.")
+@click.option("--route", "routes", multiple=True,
+              help="Alleen deze route(s): public_home, activiteiten, view_activity, confirm_payment, admin_activities.")
+@click.option("--seed", default=1, show_default=True)
+@click.option("--json", "json_path", type=click.Path(dir_okay=False), help="Schrijf de resultaten ook als JSON weg.")
+def benchmark_command(per_route, routes, seed, json_path):
+    """Meet latency (p50/p95/p99), doorvoer en SQL-queries per route via de testclient.
+
+    Draait op de dataset van `flask seed-benchmark`. Er gaat niets over het
+    netwerk: Google Agenda en mail lopen via de outbox-tabellen (die de workers
+    verwerken, niet de routes) en mail wordt hier bovendien onderdrukt.
+    confirm_payment schrijft echte aanmeldingen weg; draai --clear opnieuw voor een schone vergelijking.
+    """
+    import random
+
+    app = current_app._get_current_object()
+    app.config['MAIL_SUPPRESS_SEND'] = True
+    rng = random.Random(seed)
+
+    user_ids = [row.id for row in db.session.query(User.id).filter(User.username.like(f'{BENCHMARK_PREFIX}user-%'))]
+    activities = db.session.query(Activity.id, Activity.max_participants).filter(Activity.name.like(f'{BENCHMARK_PREFIX}%')).all()
+    admin = User.query.filter_by(role='admin').first()
+    if not user_ids or not activities:
+        raise SystemExit("Geen benchmarkdataset gevonden; draai eerst `flask seed-benchmark`.")
+    open_activity_ids = [a.id for a in activities if a.max_participants is None] or [a.id for a in activities]
+    activity_ids = [a.id for a in activities]
+    db.session.rollback()
+
+    with app.test_request_context():
+        scenarios = {
+            'public_home': lambda: (None, 'GET', url_for('main.public_home')),
+            'activiteiten': lambda: (rng.choice(user_ids), 'GET', url_for('main.activiteiten')),
+            'view_activity': lambda: (rng.choice(user_ids), 'GET',
+                                      url_for('main.view_activity', activity_id=rng.choice(activity_ids))),
+            'confirm_payment': lambda: (rng.choice(user_ids), 'POST',
+                                        url_for('main.confirm_payment', activity_id=rng.choice(open_activity_ids))),
+        }
+        if admin is not None:
+            scenarios['admin_activities'] = lambda: (admin.id, 'GET', url_for('main.admin_activities'))
+        if routes:
+            unknown = set(routes) - set(scenarios)
+            if unknown:
+                raise SystemExit(f"Onbekende route(s): {', '.join(sorted(unknown))}")
+            scenarios = {name: scenarios[name] for name in routes}
+        plans = {name: [make() for _ in range(per_route)] for name, make in scenarios.items()}
+
+    statements = []
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count_statement)
+
+    results = {}
+    clients = {}
+
+    def run_plans():
+        for name, plan in plans.items():
+            latencies, query_counts, errors = [], [], 0
+            started = time.perf_counter()
+            for user_id, method, url in plan:
+                client = clients.get(user_id)
+                if client is None:
+                    client = clients[user_id] = app.test_client()
+                    if user_id is not None:
+                        with client.session_transaction() as s:
+                            s.update(logged_in=True, user_id=user_id)
+                statements.clear()
+                request_started = time.perf_counter()
+                response = client.open(url, method=method)
+                latencies.append(time.perf_counter() - request_started)
+                query_counts.append(len(statements))
+                errors += response.status_code >= 400
+            elapsed = time.perf_counter() - started
+            latencies.sort()
+            results[name] = {
+                'requests': len(plan),
+                'errors': errors,
+                'throughput': len(plan) / elapsed,
+                'p50_ms': _percentile(latencies, 0.50) * 1000,
+                'p95_ms': _percentile(latencies, 0.95) * 1000,
+                'p99_ms': _percentile(latencies, 0.99) * 1000,
+                'queries_avg': sum(query_counts) / len(query_counts),
+                'queries_max': max(query_counts),
+            }
+
+    try:
+        # In een eigen thread, zodat elk request net als onder gunicorn een eigen
+        # app-context en databasesessie krijgt in plaats van die van dit commando
+        runner = threading.Thread(target=run_plans)
+        runner.start()
+        runner.join()
+    finally:
+        event.remove(engine, 'before_cursor_execute', count_statement)
+
+    print(f"{'route':<18}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'SQL gem.':>10}{'SQL max':>9}{'fouten':>8}")
+    for name, r in results.items():
+        print(f"{name:<18}{r['throughput']:>8.1f}{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}"
+              f"{r['queries_avg']:>10.1f}{r['queries_max']:>9}{r['errors']:>8}")
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump({'seed': seed, 'requests_per_route': per_route, 'routes': results}, f, indent=2)
+        print(f"Resultaten geschreven naar {json_path}")
+
+
+@bp.cli.command("build-assets")
+def build_assets_command():
+    """Schrijft static/dist: assets met fingerprint, .gz/.br-varianten en WebP/AVIF-afbeeldingen."""
+    manifest = build_assets(current_app.static_folder)
+    for source, entry in sorted(manifest.items()):
+        variants = ', '.join(key for key in entry if key != 'file')
+        print(f"{source} -> {entry['file']}" + (f" ({variants})" if variants else ""))
+    print(f"{len(manifest)} bestanden in static/{ASSET_DIR}; herstart de app om het nieuwe manifest te laden.")
+
+
+# Zware modules die pas bij de eerste Calendar-actie geladen mogen worden
+# Zware bibliotheken die pas bij de eerste Calendar-aanroep of `flask build-assets` geladen mogen worden
+LAZY_MODULES = ('google', 'httplib2', 'PIL', 'brotli')
+
+
+@bp.cli.command("check-import-time")
+@click.option("--budget-ms", default=3000, show_default=True, envvar='STARTUP_BUDGET_MS',
+              help="Maximale opstarttijd (import + create_app); ook via STARTUP_BUDGET_MS.")
+@click.option("--runs", default=3, show_default=True, help="Aantal metingen; de snelste telt.")
+def check_import_time_command(budget_ms, runs):
+    """Meet met `python -X importtime` hoe lang het opstarten van de app duurt.
+
+    Faalt als het budget overschreden wordt of als de Google API-bibliotheken,
+    Pillow of Brotli al bij het opstarten geladen worden, zodat regressies in de
+    CI opvallen.
+    """
+    import subprocess
+    import sys
+
+    script = ('import time; import app; start = time.perf_counter(); app.create_app(); '
+              'print((time.perf_counter() - start) * 1e6)')
+    timings = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', script], cwd=current_app.root_path,
+                                capture_output=True, text=True, check=True)
+        imported = {}
+        for line in result.stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            _, cumulative, name = line[len('import time:'):].split('|')
+            imported[name.strip()] = int(cumulative)
+        eager = sorted(name for name in imported if name.startswith(LAZY_MODULES))
+        if eager:
+            raise SystemExit(f"FOUT: deze modules worden al bij het opstarten geladen: {', '.join(eager)}")
+        timings.append((imported['app'] + float(result.stdout.strip().splitlines()[-1])) / 1000)
+
+    best = min(timings)
+    print(f"Opstarttijd (import app + create_app): {best:.0f} ms (budget {budget_ms} ms, "
+          f"metingen: {', '.join(f'{t:.0f}' for t in timings)})")
+    if best > budget_ms:
+        raise SystemExit("FOUT: de opstarttijd is boven het budget.")
+    print("OK: binnen het budget, geen zware modules bij het opstarten.")
+
 
 if __name__ == '__main__':
-    with app.app_context():
-        app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
\ No newline at end of file
@@ -0,0 +1,26 @@
+"""Index op invitation_code.created_at voor de gepagineerde codelijst
+
+Revision ID: 3c6e1f8b4d52
+Revises: f5a8c3e27d90
+Create Date: 2026-10-18 15:21:09.614872
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c6e1f8b4d52'
+down_revision = 'f5a8c3e27d90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('invitation_code', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_invitation_code_created_at'), ['created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('invitation_code', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_invitation_code_created_at'))
@@ -0,0 +1,35 @@
+"""Koppel Signup aan User via user_id
+
+Revision ID: 5b1e7c9d2a40
+Revises: dff753bc05d6
+Create Date: 2026-10-18 10:12:31.402118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b1e7c9d2a40'
+down_revision = 'dff753bc05d6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('signup', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('user_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key(batch_op.f('fk_signup_user_id_user'), 'user', ['user_id'], ['id'])
+
+    # Bestaande aanmeldingen koppelen op basis van de opgeslagen gebruikersnaam
+    op.execute(
+        'UPDATE signup SET user_id = '
+        '(SELECT "user".id FROM "user" WHERE "user".username = signup.participant_name) '
+        'WHERE user_id IS NULL'
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('signup', schema=None) as batch_op:
+        batch_op.drop_constraint(batch_op.f('fk_signup_user_id_user'), type_='foreignkey')
+        batch_op.drop_column('user_id')
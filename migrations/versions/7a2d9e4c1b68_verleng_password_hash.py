@@ -0,0 +1,40 @@
+"""Verleng user.password_hash voor hashes met hogere kosten
+
+Revision ID: 7a2d9e4c1b68
+Revises: 3c6e1f8b4d52
+Create Date: 2026-10-18 16:04:52.207431
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a2d9e4c1b68'
+down_revision = '3c6e1f8b4d52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # SQLite bouwt de tabel in batch-modus opnieuw op en neemt de index op
+    # lower(username) daarbij niet mee; daarom die er expliciet omheen
+    op.drop_index('ix_user_username_lower', table_name='user')
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.alter_column('password_hash',
+               existing_type=sa.String(length=128),
+               type_=sa.String(length=256),
+               existing_nullable=False)
+    op.create_index('ix_user_username_lower', 'user', [sa.text('lower(username)')], unique=False)
+
+
+def downgrade():
+    # SQLite bouwt de tabel in batch-modus opnieuw op en neemt de index op
+    # lower(username) daarbij niet mee; daarom die er expliciet omheen
+    op.drop_index('ix_user_username_lower', table_name='user')
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.alter_column('password_hash',
+               existing_type=sa.String(length=256),
+               type_=sa.String(length=128),
+               existing_nullable=False)
+    op.create_index('ix_user_username_lower', 'user', [sa.text('lower(username)')], unique=False)
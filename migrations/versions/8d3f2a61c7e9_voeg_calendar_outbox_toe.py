@@ -0,0 +1,42 @@
+"""Voeg calendar_outbox toe
+
+Revision ID: 8d3f2a61c7e9
+Revises: 5b1e7c9d2a40
+Create Date: 2026-10-18 11:02:47.918305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d3f2a61c7e9'
+down_revision = '5b1e7c9d2a40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('calendar_outbox',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('activity_id', sa.Integer(), nullable=False),
+    sa.Column('operation', sa.String(length=10), nullable=False),
+    sa.Column('google_event_id', sa.String(length=255), nullable=True),
+    sa.Column('status', sa.String(length=10), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id', name=op.f('pk_calendar_outbox'))
+    )
+    with op.batch_alter_table('calendar_outbox', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_calendar_outbox_activity_id'), ['activity_id'], unique=False)
+        batch_op.create_index('ix_calendar_outbox_status_next_attempt_at', ['status', 'next_attempt_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('calendar_outbox', schema=None) as batch_op:
+        batch_op.drop_index('ix_calendar_outbox_status_next_attempt_at')
+        batch_op.drop_index(batch_op.f('ix_calendar_outbox_activity_id'))
+
+    op.drop_table('calendar_outbox')
@@ -0,0 +1,26 @@
+"""Index op payment.status voor het koppelen van bankafschriften
+
+Revision ID: b6f1c3e8a245
+Revises: 7a2d9e4c1b68
+Create Date: 2026-10-18 17:42:18.305716
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6f1c3e8a245'
+down_revision = '7a2d9e4c1b68'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('payment', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_payment_status'), ['status'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('payment', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_payment_status'))
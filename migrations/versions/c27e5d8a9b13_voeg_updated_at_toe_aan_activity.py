@@ -0,0 +1,28 @@
+"""Voeg updated_at toe aan Activity
+
+Revision ID: c27e5d8a9b13
+Revises: a4c91e0b6f2d
+Create Date: 2026-10-18 12:31:40.660193
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c27e5d8a9b13'
+down_revision = 'a4c91e0b6f2d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('activity', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+    op.execute("UPDATE activity SET updated_at = CURRENT_TIMESTAMP WHERE updated_at IS NULL")
+
+
+def downgrade():
+    with op.batch_alter_table('activity', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,29 @@
+"""Index op payment (activity_id, status) voor het financieel overzicht
+
+Revision ID: c4e8a1f93d27
+Revises: b6f1c3e8a245
+Create Date: 2026-10-18 19:05:44.126093
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e8a1f93d27'
+down_revision = 'b6f1c3e8a245'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # De samengestelde index begint met activity_id en vervangt de losse index daarop
+    with op.batch_alter_table('payment', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_payment_activity_id'))
+        batch_op.create_index('ix_payment_activity_id_status', ['activity_id', 'status'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('payment', schema=None) as batch_op:
+        batch_op.drop_index('ix_payment_activity_id_status')
+        batch_op.create_index(batch_op.f('ix_payment_activity_id'), ['activity_id'], unique=False)
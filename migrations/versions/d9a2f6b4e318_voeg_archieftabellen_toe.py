@@ -0,0 +1,78 @@
+"""Voeg archieftabellen voor activiteiten, aanmeldingen en betalingen toe
+
+Revision ID: d9a2f6b4e318
+Revises: c4e8a1f93d27
+Create Date: 2026-10-18 20:14:37.552910
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9a2f6b4e318'
+down_revision = 'c4e8a1f93d27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('archived_activity',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('start_time', sa.String(length=50), nullable=True),
+    sa.Column('end_time', sa.String(length=50), nullable=True),
+    sa.Column('max_participants', sa.Integer(), nullable=True),
+    sa.Column('location', sa.String(length=200), nullable=True),
+    sa.Column('google_event_id', sa.String(length=255), nullable=True),
+    sa.Column('is_public', sa.Boolean(), server_default='0', nullable=False),
+    sa.Column('cost', sa.Float(), nullable=True),
+    sa.Column('organizer_id', sa.Integer(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('signups_count', sa.Integer(), nullable=False),
+    sa.Column('archived_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id', name=op.f('pk_archived_activity'))
+    )
+    with op.batch_alter_table('archived_activity', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_archived_activity_date'), ['date'], unique=False)
+
+    op.create_table('archived_signup',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('activity_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('participant_name', sa.String(length=100), nullable=False),
+    sa.PrimaryKeyConstraint('id', name=op.f('pk_archived_signup'))
+    )
+    with op.batch_alter_table('archived_signup', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_archived_signup_activity_id'), ['activity_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_archived_signup_user_id'), ['user_id'], unique=False)
+
+    op.create_table('archived_payment',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('activity_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=30), nullable=False),
+    sa.PrimaryKeyConstraint('id', name=op.f('pk_archived_payment'))
+    )
+    with op.batch_alter_table('archived_payment', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_archived_payment_activity_id'), ['activity_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_archived_payment_user_id'), ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('archived_payment', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_archived_payment_user_id'))
+        batch_op.drop_index(batch_op.f('ix_archived_payment_activity_id'))
+
+    op.drop_table('archived_payment')
+    with op.batch_alter_table('archived_signup', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_archived_signup_user_id'))
+        batch_op.drop_index(batch_op.f('ix_archived_signup_activity_id'))
+
+    op.drop_table('archived_signup')
+    with op.batch_alter_table('archived_activity', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_archived_activity_date'))
+
+    op.drop_table('archived_activity')
@@ -0,0 +1,66 @@
+"""Voeg terugkerende activiteiten (activity_series) toe
+
+Revision ID: e5b7c2d4f916
+Revises: d9a2f6b4e318
+Create Date: 2026-10-18 21:33:02.847561
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b7c2d4f916'
+down_revision = 'd9a2f6b4e318'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('activity_series',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('start_time', sa.String(length=50), nullable=True),
+    sa.Column('end_time', sa.String(length=50), nullable=True),
+    sa.Column('max_participants', sa.Integer(), nullable=True),
+    sa.Column('location', sa.String(length=200), nullable=True),
+    sa.Column('is_public', sa.Boolean(), server_default='0', nullable=False),
+    sa.Column('cost', sa.Float(), nullable=True),
+    sa.Column('organizer_id', sa.Integer(), nullable=True),
+    sa.Column('frequency', sa.String(length=10), nullable=False),
+    sa.Column('interval', sa.Integer(), nullable=False),
+    sa.Column('until', sa.Date(), nullable=True),
+    sa.Column('materialized_until', sa.Date(), nullable=True),
+    sa.Column('google_event_id', sa.String(length=255), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['organizer_id'], ['user.id'], name=op.f('fk_activity_series_organizer_id_user')),
+    sa.PrimaryKeyConstraint('id', name=op.f('pk_activity_series')),
+    sa.UniqueConstraint('google_event_id', name=op.f('uq_activity_series_google_event_id'))
+    )
+    with op.batch_alter_table('activity', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('series_id', sa.Integer(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_activity_series_id'), ['series_id'], unique=False)
+        batch_op.create_foreign_key(batch_op.f('fk_activity_series_id_activity_series'), 'activity_series', ['series_id'], ['id'])
+
+    with op.batch_alter_table('calendar_outbox', schema=None) as batch_op:
+        batch_op.alter_column('operation',
+               existing_type=sa.String(length=10),
+               type_=sa.String(length=20),
+               existing_nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('calendar_outbox', schema=None) as batch_op:
+        batch_op.alter_column('operation',
+               existing_type=sa.String(length=20),
+               type_=sa.String(length=10),
+               existing_nullable=False)
+
+    with op.batch_alter_table('activity', schema=None) as batch_op:
+        batch_op.drop_constraint(batch_op.f('fk_activity_series_id_activity_series'), type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_activity_series_id'))
+        batch_op.drop_column('series_id')
+
+    op.drop_table('activity_series')
@@ -0,0 +1,58 @@
+"""Indexen voor de veelgebruikte queries en unique constraint op Payment
+
+Revision ID: e9b4d0f13a77
+Revises: c27e5d8a9b13
+Create Date: 2026-10-18 13:20:12.584390
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e9b4d0f13a77'
+down_revision = 'c27e5d8a9b13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('activity', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_activity_date'), ['date'], unique=False)
+        batch_op.create_index('ix_activity_is_public_date', ['is_public', 'date'], unique=False)
+
+    with op.batch_alter_table('signup', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_signup_user_id'), ['user_id'], unique=False)
+        batch_op.create_index('ix_signup_activity_id_user_id', ['activity_id', 'user_id'], unique=False)
+
+    op.create_index('ix_user_username_lower', 'user', [sa.text('lower(username)')], unique=False)
+
+    # Dubbele betalingen opruimen voordat de unique constraint erop kan: per
+    # (user_id, activity_id) blijft een betaalde rij staan, anders de nieuwste.
+    op.execute(
+        "DELETE FROM payment WHERE EXISTS ("
+        "SELECT 1 FROM payment AS p2 "
+        "WHERE p2.user_id = payment.user_id AND p2.activity_id = payment.activity_id "
+        "AND ((p2.status = 'paid') > (payment.status = 'paid') "
+        "OR ((p2.status = 'paid') = (payment.status = 'paid') AND p2.id > payment.id)))"
+    )
+
+    with op.batch_alter_table('payment', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_user_activity_payment', ['user_id', 'activity_id'])
+        batch_op.create_index(batch_op.f('ix_payment_activity_id'), ['activity_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('payment', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_payment_activity_id'))
+        batch_op.drop_constraint('uq_user_activity_payment', type_='unique')
+
+    op.drop_index('ix_user_username_lower', table_name='user')
+
+    with op.batch_alter_table('signup', schema=None) as batch_op:
+        batch_op.drop_index('ix_signup_activity_id_user_id')
+        batch_op.drop_index(batch_op.f('ix_signup_user_id'))
+
+    with op.batch_alter_table('activity', schema=None) as batch_op:
+        batch_op.drop_index('ix_activity_is_public_date')
+        batch_op.drop_index(batch_op.f('ix_activity_date'))
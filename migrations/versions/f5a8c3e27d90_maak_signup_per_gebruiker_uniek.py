@@ -0,0 +1,35 @@
+"""Maak aanmelding per gebruiker per activiteit uniek
+
+Revision ID: f5a8c3e27d90
+Revises: e9b4d0f13a77
+Create Date: 2026-10-18 14:05:51.193027
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f5a8c3e27d90'
+down_revision = 'e9b4d0f13a77'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Eventuele dubbele aanmeldingen opruimen; de oudste blijft staan
+    op.execute(
+        "DELETE FROM signup WHERE user_id IS NOT NULL AND EXISTS ("
+        "SELECT 1 FROM signup AS s2 "
+        "WHERE s2.activity_id = signup.activity_id AND s2.user_id = signup.user_id AND s2.id < signup.id)"
+    )
+
+    with op.batch_alter_table('signup', schema=None) as batch_op:
+        batch_op.drop_index('ix_signup_activity_id_user_id')
+        batch_op.create_index('ix_signup_activity_id_user_id', ['activity_id', 'user_id'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('signup', schema=None) as batch_op:
+        batch_op.drop_index('ix_signup_activity_id_user_id')
+        batch_op.create_index('ix_signup_activity_id_user_id', ['activity_id', 'user_id'], unique=False)
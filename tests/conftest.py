@@ -0,0 +1,48 @@
+"""Gedeelde fixtures: een app met een eigen SQLite-bestand per test.
+
+Pas de configuratie in een testmodule aan door `app_config` te overschrijven:
+
+    @pytest.fixture
+    def app_config(app_config):
+        return {**app_config, 'SQL_STRICT': True}
+"""
+import pytest
+
+from app import create_app, db
+
+
+@pytest.fixture
+def app_config(tmp_path):
+    return {
+        'SECRET_KEY': 'test',
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+        'PASSWORD_HASH_WORKERS': 0,
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+        'PAGE_CACHE_TYPE': 'memory',
+        'WTF_CSRF_ENABLED': False,
+    }
+
+
+@pytest.fixture
+def app(app_config):
+    app = create_app(app_config)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def login():
+    """Logt een testclient in als `user` zonder langs /login (en de wachtwoordhash) te gaan."""
+    def login(client, user):
+        with client.session_transaction() as s:
+            s.update(logged_in=True, user_id=user.id)
+        return client
+    return login
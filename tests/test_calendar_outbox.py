@@ -0,0 +1,178 @@
+"""De Google Agenda-outbox tegen een nagebootste Calendar API.
+
+`get_calendar_service` wordt vervangen door een service die events in een dict
+bijhoudt; de requests gaan wel door het echte `execute_calendar_request` (en de
+circuit breaker).
+"""
+import datetime
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+import app as app_module
+from app import Activity, CalendarOutbox, calendar_breaker, db, enqueue_calendar_sync, process_calendar_outbox
+
+
+class FakeRequest:
+    def __init__(self, calendar, method, event_id, body=None):
+        self.calendar, self.method, self.event_id, self.body = calendar, method, event_id, body
+
+    def execute(self):
+        calendar = self.calendar
+        calendar.requests.append((self.method, self.event_id))
+        if calendar.failures:
+            calendar.failures -= 1
+            raise ConnectionError('Google Agenda reageert niet')
+        if self.method == 'insert':
+            calendar.events[self.event_id] = self.body
+        elif self.event_id not in calendar.events:
+            raise HttpError(httplib2.Response({'status': 404}), b'Not Found')
+        elif self.method == 'patch':
+            calendar.events[self.event_id].update(self.body)
+        else:
+            del calendar.events[self.event_id]
+        return {}
+
+
+class FakeCalendar:
+    """Nagebootste `service.events()` van googleapiclient: alleen patch, insert en delete."""
+
+    def __init__(self):
+        self.events = {}
+        self.requests = []
+        self.failures = 0 # zoveel volgende requests mislukken met een netwerkfout
+
+    def patch(self, calendarId, eventId, body):
+        return FakeRequest(self, 'patch', eventId, dict(body))
+
+    def insert(self, calendarId, body):
+        return FakeRequest(self, 'insert', body['id'], dict(body))
+
+    def delete(self, calendarId, eventId):
+        return FakeRequest(self, 'delete', eventId)
+
+
+@pytest.fixture
+def app_config(app_config):
+    # Alleen de outbox-logica testen; de breaker mag niet tussendoor opengaan
+    return {**app_config, 'CALENDAR_OUTBOX_MAX_ATTEMPTS': 3, 'CALENDAR_OUTBOX_BACKOFF': 30,
+            'CALENDAR_OUTBOX_MAX_BACKOFF': 45, 'GOOGLE_CALENDAR_BREAKER_THRESHOLD': 100}
+
+
+@pytest.fixture
+def calendar(app, monkeypatch):
+    calendar = FakeCalendar()
+    service = type('FakeService', (), {'events': lambda self: calendar})()
+    monkeypatch.setattr(app_module, 'get_calendar_service', lambda: service)
+    calendar_breaker.record_success()
+    yield calendar
+    calendar_breaker.record_success()
+
+
+def add_activity(name='Klimmen'):
+    activity = Activity(name=name, date=datetime.date.today() + datetime.timedelta(days=7))
+    db.session.add(activity)
+    db.session.flush()
+    enqueue_calendar_sync(activity, 'upsert')
+    db.session.commit()
+    return activity
+
+
+def make_due(entry):
+    entry.next_attempt_at = datetime.datetime.now()
+    db.session.commit()
+
+
+def test_create_update_delete_in_order(app, calendar):
+    activity = add_activity()
+    assert process_calendar_outbox() == (1, 0)
+    event_id = activity.google_event_id
+    assert calendar.events[event_id]['summary'] == 'Klimmen'
+
+    activity.name = 'Klimmen en koffie'
+    enqueue_calendar_sync(activity, 'upsert')
+    db.session.commit()
+    assert process_calendar_outbox() == (1, 0)
+    assert calendar.events[event_id]['summary'] == 'Klimmen en koffie'
+
+    enqueue_calendar_sync(activity, 'delete')
+    db.session.delete(activity)
+    db.session.commit()
+    assert process_calendar_outbox() == (1, 0)
+
+    assert calendar.events == {}
+    # Het eerste patch mislukt met 404: het event bestaat nog niet en wordt aangemaakt
+    assert calendar.requests == [('patch', event_id), ('insert', event_id),
+                                 ('patch', event_id), ('delete', event_id)]
+    assert {entry.status for entry in CalendarOutbox.query} == {'done'}
+
+
+def test_pending_changes_are_coalesced(app, calendar):
+    activity = add_activity()
+    for name in ('Klimmen 2', 'Klimmen 3'):
+        activity.name = name
+        enqueue_calendar_sync(activity, 'upsert')
+        db.session.commit()
+
+    assert process_calendar_outbox() == (1, 0)
+
+    assert [method for method, _ in calendar.requests] == ['patch', 'insert']
+    assert calendar.events[activity.google_event_id]['summary'] == 'Klimmen 3'
+    entries = CalendarOutbox.query.order_by(CalendarOutbox.id).all()
+    assert [entry.status for entry in entries] == ['done'] * 3
+    assert [entry.last_error for entry in entries] == ['Samengevoegd met een nieuwere wijziging'] * 2 + [None]
+
+
+def test_delete_supersedes_pending_update(app, calendar):
+    activity = add_activity()
+    process_calendar_outbox()
+    event_id = activity.google_event_id
+    calendar.requests.clear()
+
+    activity.name = 'Gaat niet door'
+    enqueue_calendar_sync(activity, 'upsert')
+    enqueue_calendar_sync(activity, 'delete')
+    db.session.delete(activity)
+    db.session.commit()
+
+    assert process_calendar_outbox() == (1, 0)
+    assert calendar.requests == [('delete', event_id)]
+    assert calendar.events == {}
+
+
+def test_failed_request_backs_off_exponentially(app, calendar):
+    add_activity()
+    entry = CalendarOutbox.query.one()
+    calendar.failures = 2
+
+    for attempts, delay in ((1, 30), (2, 45)): # 30 * 2 = 60, begrensd op 45
+        before = datetime.datetime.now()
+        assert process_calendar_outbox() == (0, 1)
+        assert entry.status == 'pending'
+        assert entry.attempts == attempts
+        assert 'ConnectionError' in entry.last_error
+        assert before + datetime.timedelta(seconds=delay) <= entry.next_attempt_at
+        assert entry.next_attempt_at <= datetime.datetime.now() + datetime.timedelta(seconds=delay)
+        # Nog niet aan de beurt
+        assert process_calendar_outbox() == (0, 0)
+        make_due(entry)
+
+    assert process_calendar_outbox() == (1, 0)
+    assert entry.status == 'done'
+    assert entry.last_error is None
+
+
+def test_entry_fails_after_max_attempts(app, calendar):
+    add_activity()
+    entry = CalendarOutbox.query.one()
+    calendar.failures = 10
+
+    for _ in range(3):
+        assert process_calendar_outbox() == (0, 1)
+        make_due(entry)
+
+    assert entry.status == 'failed'
+    assert entry.attempts == 3
+    assert process_calendar_outbox() == (0, 0)
+    assert len(calendar.requests) == 3
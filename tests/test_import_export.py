@@ -0,0 +1,130 @@
+"""Tests voor `flask import` en `flask export` met de mogelijkheden van SQLite 3.27.
+
+De Docker-image (python:3.9-slim-buster) heeft SQLite 3.27: geen RETURNING (pas vanaf
+3.35) en hoogstens 999 parameters per statement (vóór 3.32). SQLAlchemy leidt uit
+sqlite3.sqlite_version_info af of het RETURNING mag gebruiken; de fixture zet die
+versie terug en beperkt het aantal parameters per verbinding, zodat deze tests ook
+met een nieuwere SQLite falen op SQL die de image niet aankan. In de image zelf:
+
+    docker-compose run --rm web sh -c "pip install pytest && python -m pytest tests"
+
+Draai lokaal vanuit de hoofdmap met `python -m pytest`.
+"""
+import csv
+import json
+import sqlite3
+
+import pytest
+from sqlalchemy import event
+
+import app as app_module
+from app import Activity, CalendarOutbox, Signup, User, create_app, db
+
+IMAGE_SQLITE_VERSION = (3, 27, 2)
+IMAGE_SQLITE_MAX_VARIABLES = 999
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    if sqlite3.sqlite_version_info > IMAGE_SQLITE_VERSION:
+        monkeypatch.setattr(sqlite3, 'sqlite_version_info', IMAGE_SQLITE_VERSION)
+        monkeypatch.setattr(sqlite3.dbapi2, 'sqlite_version_info', IMAGE_SQLITE_VERSION)
+    app = create_app({
+        'SECRET_KEY': 'test',
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+        'PASSWORD_HASH_WORKERS': 0,
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+        'PAGE_CACHE_TYPE': 'memory',
+    })
+    with app.app_context():
+        assert not db.engine.dialect.insert_returning
+
+        if hasattr(sqlite3.Connection, 'setlimit'):
+            @event.listens_for(db.engine, 'connect')
+            def _limit_variables(dbapi_connection, connection_record):
+                dbapi_connection.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, IMAGE_SQLITE_MAX_VARIABLES)
+            db.engine.dispose()
+
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+def write_jsonl(path, records):
+    with open(path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record) + '\n')
+    return str(path)
+
+
+def write_csv(path, header, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+    return str(path)
+
+
+def test_import_activities_creates_outbox_rows(app, tmp_path):
+    db.session.add(User(username='Org', email='org@example.invalid', password_hash='!', role='organizer'))
+    db.session.commit()
+    # Meer dan IMPORT_IN_BATCH en meer dan één blok, zodat elke IN-lijst gesplitst moet worden
+    count = 2 * app_module.IMPORT_IN_BATCH + 50
+    path = write_jsonl(tmp_path / 'activities.jsonl', [
+        {'name': f'Proeverij {i}', 'date': f'2030-{i % 12 + 1:02d}-{i % 28 + 1:02d}', 'start_time': '20:00',
+         'cost': '7,50', 'is_public': i % 2 == 0, 'organizer': 'org'}
+        for i in range(count)])
+
+    result = app.test_cli_runner().invoke(args=['import', 'activities', path, '--chunk-size', '600'])
+
+    assert result.exit_code == 0, result.output
+    assert Activity.query.count() == count
+    outbox = CalendarOutbox.query.filter_by(operation='upsert', status='pending').all()
+    assert sorted(entry.activity_id for entry in outbox) == sorted(a.id for a in Activity.query)
+    assert {a.organizer.username for a in Activity.query} == {'Org'}
+
+
+def test_import_activities_twice_adds_nothing(app, tmp_path):
+    path = write_jsonl(tmp_path / 'activities.jsonl', [
+        {'name': 'Borrel', 'date': '2030-01-01'}, {'name': 'Borrel', 'date': '2030-01-08'}])
+    runner = app.test_cli_runner()
+    assert runner.invoke(args=['import', 'activities', path]).exit_code == 0
+
+    result = runner.invoke(args=['import', 'activities', path])
+
+    assert result.exit_code == 1
+    assert "Regel 1: 'Borrel' op 2030-01-01 bestaat al" in result.output
+    assert Activity.query.count() == 2
+    assert CalendarOutbox.query.count() == 2
+
+
+def test_import_users_and_signups_then_export(app, tmp_path):
+    users = write_csv(tmp_path / 'users.csv', ['username', 'email', 'password', 'role'], [
+        ['anna', 'anna@example.invalid', 'Geheim123', 'user'],
+        ['bram', 'bram@example.invalid', 'Geheim123', 'organizer'],
+        ['Anna', 'anna2@example.invalid', 'Geheim123', 'user'],
+        ['cees', 'geen-email', 'Geheim123', 'user'],
+    ])
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['import', 'users', users, '--workers', '1'])
+    assert result.exit_code == 1
+    assert "Regel 4: gebruikersnaam 'Anna' staat al eerder in het bestand" in result.output
+    assert "Regel 5: ongeldig e-mailadres 'geen-email'" in result.output
+    assert User.query.filter_by(username='anna').one().check_password('Geheim123')
+
+    db.session.add(Activity(name='Proeverij', date=app_module.datetime.date(2030, 1, 1), max_participants=1))
+    db.session.commit()
+    signups = write_csv(tmp_path / 'signups.csv', ['activity_id', 'username'],
+                        [[1, 'anna'], [1, 'bram'], [2, 'anna'], [1, 'onbekend']])
+    result = runner.invoke(args=['import', 'signups', signups])
+    assert "Regel 3: activiteit 1 is vol" in result.output
+    assert "Regel 4: activiteit 2 bestaat niet" in result.output
+    assert "Regel 5: gebruiker 'onbekend' bestaat niet" in result.output
+    assert [(s.activity_id, s.user.username) for s in Signup.query] == [(1, 'anna')]
+
+    exported = tmp_path / 'users.jsonl'
+    assert runner.invoke(args=['export', 'users', str(exported)]).exit_code == 0
+    rows = [json.loads(line) for line in exported.read_text(encoding='utf-8').splitlines()]
+    assert [row['username'] for row in rows] == ['anna', 'bram']
+    assert all('password_hash' not in row for row in rows)
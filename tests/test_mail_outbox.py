@@ -0,0 +1,166 @@
+"""De mailwachtrij en `flask mail-worker` tegen een nagebootste SMTP-server.
+
+`smtplib.SMTP` wordt vervangen, zodat Flask-Mail echt verbindt, verstuurt en
+afsluit, maar er geen netwerk nodig is.
+"""
+import datetime
+import smtplib
+
+import pytest
+
+from app import MailOutbox, db, enqueue_mails, has_due_mail, send_mail_batch
+
+
+class FakeSMTPServer:
+    """Houdt de verbindingen en verstuurde mails bij.
+
+    `errors` koppelt een ontvanger aan de fouten die de volgende pogingen geven.
+    """
+
+    def __init__(self):
+        self.connections = []
+        self.errors = {}
+
+    @property
+    def sent(self):
+        return [message for connection in self.connections for message in connection.sent]
+
+    def connect(self, host, port):
+        connection = FakeSMTP(self)
+        self.connections.append(connection)
+        return connection
+
+
+class FakeSMTP:
+    def __init__(self, server):
+        self.server = server
+        self.sent = []
+        self.closed = False
+
+    def set_debuglevel(self, level):
+        pass
+
+    def sendmail(self, sender, recipients, message, mail_options=(), rcpt_options=()):
+        errors = self.server.errors.get(recipients[0])
+        if errors:
+            raise errors.pop(0)
+        self.sent.append(recipients)
+
+    def quit(self):
+        self.closed = True
+
+
+@pytest.fixture
+def app_config(app_config):
+    return {**app_config, 'MAIL_SERVER': 'smtp.example.invalid', 'MAIL_USE_TLS': False,
+            'MAIL_DEFAULT_SENDER': 'noreply@example.invalid',
+            'MAIL_OUTBOX_MAX_ATTEMPTS': 3, 'MAIL_OUTBOX_BACKOFF': 60, 'MAIL_OUTBOX_MAX_BACKOFF': 90}
+
+
+@pytest.fixture
+def smtp(app, monkeypatch):
+    server = FakeSMTPServer()
+    monkeypatch.setattr(smtplib, 'SMTP', server.connect)
+    return server
+
+
+def queue(*recipients):
+    enqueue_mails([(f'Mail voor {to}', [to], 'Hallo!') for to in recipients])
+    db.session.commit()
+
+
+def outbox():
+    db.session.expire_all()
+    return MailOutbox.query.order_by(MailOutbox.id).all()
+
+
+def run_worker(app):
+    result = app.test_cli_runner().invoke(args=['mail-worker', '--once'])
+    assert result.exit_code == 0, result.output
+    return result
+
+
+def make_due(items):
+    for item in items:
+        item.next_attempt_at = datetime.datetime.now()
+    db.session.commit()
+
+
+def test_worker_sends_batch_over_one_connection(app, smtp):
+    queue('a@example.invalid', 'b@example.invalid', 'c@example.invalid')
+
+    result = run_worker(app)
+
+    assert 'Mail: 3 verstuurd, 0 mislukt.' in result.output
+    assert len(smtp.connections) == 1
+    assert smtp.connections[0].closed
+    assert smtp.sent == [['a@example.invalid'], ['b@example.invalid'], ['c@example.invalid']]
+    assert {item.status for item in outbox()} == {'sent'}
+    assert not has_due_mail()
+
+
+def test_smtp_error_is_retried_with_backoff(app, smtp):
+    queue('a@example.invalid', 'b@example.invalid')
+    smtp.errors['a@example.invalid'] = [smtplib.SMTPDataError(451, b'Probeer het later opnieuw')] * 2
+
+    for attempts, delay in ((1, 60), (2, 90)): # 60 * 2 = 120, begrensd op 90
+        before = datetime.datetime.now()
+        run_worker(app)
+        first = outbox()[0]
+        assert (first.status, first.attempts) == ('pending', attempts)
+        assert 'SMTPDataError' in first.last_error
+        assert before + datetime.timedelta(seconds=delay) <= first.next_attempt_at
+        assert first.next_attempt_at <= datetime.datetime.now() + datetime.timedelta(seconds=delay)
+        # De rest van de batch gaat gewoon door
+        assert outbox()[1].status == 'sent'
+        assert not has_due_mail()
+        make_due([first])
+
+    run_worker(app)
+    assert [item.status for item in outbox()] == ['sent', 'sent']
+    assert smtp.sent == [['b@example.invalid'], ['a@example.invalid']]
+
+
+def test_dropped_connection_is_reopened(app, smtp):
+    queue('a@example.invalid', 'b@example.invalid')
+    smtp.errors['a@example.invalid'] = [smtplib.SMTPServerDisconnected('Verbinding verbroken')]
+
+    result = run_worker(app)
+    assert 'SMTP-fout, verbinding wordt opnieuw opgebouwd' in result.output
+    make_due(outbox())
+    run_worker(app)
+
+    assert [item.status for item in outbox()] == ['sent', 'sent']
+    assert len(smtp.connections) == 2
+
+
+def test_mail_is_dead_lettered_after_max_attempts(app, smtp):
+    queue('a@example.invalid')
+    smtp.errors['a@example.invalid'] = [smtplib.SMTPDataError(451, b'Probeer het later opnieuw')] * 3
+
+    for _ in range(3):
+        with app.extensions['mail'].connect() as connection:
+            assert send_mail_batch(connection) == (0, 1)
+        make_due(outbox())
+
+    item = outbox()[0]
+    assert (item.status, item.attempts) == ('dead', 3)
+    assert not has_due_mail()
+
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['mail-dead-letters', '--requeue'])
+    assert f'#{item.id} | a@example.invalid | Mail voor a@example.invalid | 3 pogingen' in result.output
+    item = outbox()[0]
+    assert (item.status, item.attempts) == ('pending', 0)
+    run_worker(app)
+    assert outbox()[0].status == 'sent'
+
+
+def test_refused_recipient_is_dead_lettered_at_once(app, smtp):
+    queue('weg@example.invalid')
+    smtp.errors['weg@example.invalid'] = [smtplib.SMTPRecipientsRefused({'weg@example.invalid': (550, b'Onbekende ontvanger')})]
+
+    run_worker(app)
+
+    item = outbox()[0]
+    assert (item.status, item.attempts) == ('dead', 1)
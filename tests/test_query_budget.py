@@ -0,0 +1,86 @@
+"""Strikte SQL-modus: de belangrijkste routes blijven binnen het querybudget.
+
+Met SQL_STRICT gooit een request QueryBudgetExceeded zodra het meer dan
+SQL_QUERY_BUDGET queries doet of dezelfde query SQL_REPEAT_LIMIT keer herhaalt.
+De dataset heeft genoeg activiteiten, aanmeldingen en betalingen om een N+1 te
+laten opvallen.
+"""
+import datetime
+
+import pytest
+
+from app import Activity, Payment, QueryBudgetExceeded, Signup, User, db
+
+ACTIVITIES = 12
+MEMBERS = 15
+
+
+@pytest.fixture
+def app_config(app_config):
+    # TESTING: fouten uit een request komen als exceptie in de test terecht i.p.v. als 500
+    return {**app_config, 'TESTING': True, 'SQL_STRICT': True}
+
+
+@pytest.fixture
+def users(app):
+    admin = User(username='admin', email='admin@example.invalid', password_hash='!', role='admin')
+    members = [User(username=f'lid-{i}', email=f'lid-{i}@example.invalid', password_hash='!')
+               for i in range(MEMBERS)]
+    newcomer = User(username='nieuw', email='nieuw@example.invalid', password_hash='!')
+    db.session.add_all([admin, newcomer, *members])
+    db.session.flush()
+    for day in range(ACTIVITIES):
+        activity = Activity(name=f'Activiteit {day}', date=datetime.date.today() + datetime.timedelta(days=day),
+                            cost=5.0, max_participants=MEMBERS + 5, is_public=day % 2 == 0, organizer=admin)
+        db.session.add(activity)
+        db.session.flush()
+        for member in members:
+            db.session.add(Signup(activity_id=activity.id, user_id=member.id, participant_name=member.username))
+            db.session.add(Payment(activity_id=activity.id, user_id=member.id, status='pending_verification'))
+    db.session.commit()
+    users = {'admin': admin, 'member': members[0], 'newcomer': newcomer}
+    for user in users.values():
+        db.session.refresh(user)
+    # De requests delen de sessie van de test; een lege identity map telt elke query mee
+    db.session.expunge_all()
+    return users
+
+
+@pytest.fixture
+def activity_id(users):
+    return db.session.scalar(db.select(Activity.id).order_by(Activity.id).limit(1))
+
+
+@pytest.mark.parametrize('role', ['admin', 'member'])
+def test_activity_list_within_budget(client, login, users, role):
+    assert login(client, users[role]).get('/activiteiten').status_code == 200
+
+
+@pytest.mark.parametrize('role', ['admin', 'member', None])
+def test_view_activity_within_budget(client, login, users, activity_id, role):
+    if role:
+        login(client, users[role])
+    assert client.get(f'/activity/{activity_id}').status_code == 200
+
+
+def test_confirm_payment_within_budget(client, login, users, activity_id):
+    login(client, users['newcomer'])
+    response = client.post(f'/confirm_payment/{activity_id}', follow_redirects=True)
+    assert response.status_code == 200
+    assert Payment.query.filter_by(activity_id=activity_id, user_id=users['newcomer'].id).one()
+
+
+def test_exceeding_query_budget_raises(app, client, login, users):
+    app.config['SQL_QUERY_BUDGET'] = 1
+    with pytest.raises(QueryBudgetExceeded, match='meer dan 1 queries'):
+        login(client, users['member']).get('/activiteiten')
+
+
+def test_repeated_query_raises(app, client, users):
+    @app.route('/n-plus-een')
+    def n_plus_one():
+        # Bewust één query per activiteit
+        return str(sum(Signup.query.filter_by(activity_id=activity.id).count() for activity in Activity.query))
+
+    with pytest.raises(QueryBudgetExceeded, match='N\\+1'):
+        client.get('/n-plus-een')
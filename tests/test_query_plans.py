@@ -0,0 +1,13 @@
+"""`flask check-query-plans` moet slagen op het schema van de modellen.
+
+De allowlist van bewuste table scans (ALLOWED_SCANS) staat in app.py naast het
+commando; een nieuwe scan in een hot route laat deze test falen.
+"""
+
+
+def test_hot_routes_use_indexes(app):
+    result = app.test_cli_runner().invoke(args=['check-query-plans'])
+
+    assert result.exit_code == 0, result.output
+    assert 'Alle queries gebruiken een index.' in result.output
+    assert '[FOUT]' not in result.output
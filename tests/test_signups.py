@@ -0,0 +1,82 @@
+"""Gelijktijdige aanmeldingen: de capaciteit en de unieke index houden stand.
+
+Dezelfde aanpak als `flask stress-signups`: honderden POSTs naar /confirm_payment
+vanuit een threadpool op één activiteit, tegen een SQLite-bestand met het
+productieprofiel (WAL, busy_timeout).
+"""
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import func
+
+from app import Activity, Signup, User, db, reserve_signup
+
+CAPACITY = 25
+USERS = 150
+
+
+@pytest.fixture
+def app_config(app_config):
+    return {**app_config, 'DATABASE_PROFILE': 'production'}
+
+
+@pytest.fixture
+def activity(app):
+    activity = Activity(name='Stresstest', date=datetime.date.today(), max_participants=CAPACITY)
+    db.session.add(activity)
+    db.session.add_all(User(username=f'stress-{i}', email=f'stress-{i}@example.invalid', password_hash='!')
+                       for i in range(USERS))
+    db.session.commit()
+    return activity
+
+
+def assert_capacity_held(activity):
+    db.session.expire_all()
+    assert Signup.query.filter_by(activity_id=activity.id).count() == CAPACITY
+    duplicates = (db.session.query(Signup.activity_id, Signup.user_id)
+                  .group_by(Signup.activity_id, Signup.user_id)
+                  .having(func.count() > 1)
+                  .all())
+    assert duplicates == []
+
+
+def test_concurrent_confirm_payment_respects_capacity(app, activity, login):
+    users = User.query.all()
+    url = f'/confirm_payment/{activity.id}'
+
+    def sign_up(user):
+        return login(app.test_client(), user).post(url).status_code
+
+    # Elke gebruiker klikt twee keer, zodat ook dubbele aanmeldingen tegelijk binnenkomen
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        statuses = list(pool.map(sign_up, users * 2))
+
+    assert len(statuses) == 2 * USERS
+    assert set(statuses) == {302}
+    assert_capacity_held(activity)
+
+
+def test_concurrent_reserve_signup_respects_capacity(app, activity):
+    users = User.query.all()
+    activity_id = activity.id
+
+    def reserve(user):
+        with app.app_context():
+            added = reserve_signup(activity_id, user)
+            db.session.commit()
+            return added
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        added = list(pool.map(reserve, users * 2))
+
+    assert added.count(True) == CAPACITY
+    assert_capacity_held(activity)
+
+
+def test_stress_signups_command(app):
+    result = app.test_cli_runner().invoke(args=['stress-signups', '--users', '60', '--capacity', '10',
+                                                '--workers', '8'])
+
+    assert result.exit_code == 0, result.output
+    assert 'Aangemeld: 10 (capaciteit 10)' in result.output
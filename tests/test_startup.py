@@ -0,0 +1,41 @@
+"""Opstarttest: `import app; app.create_app()` mag de zware bibliotheken niet laden.
+
+De Google API-client, Pillow en Brotli horen pas bij de eerste Calendar-actie of bij
+`flask build-assets` geladen te worden. De test draait in een apart proces met
+`python -X importtime`, zodat modules die de testsuite zelf al geladen heeft niet
+meetellen. Het tijdsbudget is ruim en in te stellen met STARTUP_BUDGET_MS.
+"""
+import os
+import subprocess
+import sys
+
+from app import LAZY_MODULES
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STARTUP_BUDGET_MS = int(os.getenv('STARTUP_BUDGET_MS', '5000'))
+
+
+def import_app():
+    """Start de app in een nieuw proces; geeft {module: cumulatieve importtijd in µs}."""
+    env = dict(os.environ, SECRET_KEY='test', PAGE_CACHE_TYPE='memory')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app; app.create_app()'],
+                            cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    imported = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        imported[name.strip()] = int(cumulative)
+    return imported
+
+
+def test_startup_skips_heavy_modules():
+    imported = import_app()
+    assert 'app' in imported
+    assert sorted(name for name in imported if name.startswith(LAZY_MODULES)) == []
+
+
+def test_startup_within_budget():
+    imported = import_app()
+    assert imported['app'] / 1000 < STARTUP_BUDGET_MS